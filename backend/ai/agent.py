@@ -1,4 +1,3 @@
-
 """
 ApyHub AI Agent - Opus 4.1 Powered Yield Strategy Advisor
 Advanced DeFi yield optimization with cross-chain intelligence
@@ -7,38 +6,38 @@ Advanced DeFi yield optimization with cross-chain intelligence
 import os
 import json
 import asyncio
+import importlib.util
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple, Union
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-import numpy as np
 from enum import Enum
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the application, not on import
 logger = logging.getLogger(__name__)
 
-# Try to import optional dependencies
-try:
-    import openai
-    HAS_OPENAI = True
-except ImportError:
-    HAS_OPENAI = False
-    logger.warning("OpenAI package not installed. Using fallback responses.")
-
-try:
-    import anthropic
-    HAS_ANTHROPIC = True
-except ImportError:
-    HAS_ANTHROPIC = False
-    logger.warning("Anthropic package not installed. Using fallback responses.")
+# Optional dependencies are located here and imported on first use, so
+# importing the agent stays cheap (see benchmarks/bench_startup.py)
+HAS_REDIS = importlib.util.find_spec("redis") is not None
+HAS_YAML = importlib.util.find_spec("yaml") is not None
 
-try:
-    import redis
-    HAS_REDIS = True
-except ImportError:
-    HAS_REDIS = False
-    logger.info("Redis not available. Using in-memory cache.")
+from backend.ai.agent_helpers import AgentHelpers, StrategyBuilder, OpportunityFinder
+from backend.ai import codec
+from backend.ai.cache import LRUCache, RedisCache, ResponseCache, TieredCache, bucket_value
+from backend.ai.metrics import REGISTRY, cache_samples, span
+from backend.ai.screening import StrategyUniverse
+from backend.ai.batch_analysis import PortfolioBatch
+from backend.ai.positions import PositionTable
+from backend.ai.risk import RiskEngine
+from backend.ai.timeseries import DEFAULT_ROOT as HISTORY_ROOT, SeriesStore
+from backend.ai.monitor import (
+    DEFAULT_HYSTERESIS, IncrementalMonitor, PositionMonitor, RuleTable
+)
+from backend.ai.providers import (
+    HAS_ANTHROPIC, HAS_OPENAI, AnthropicProvider, CircuitBreaker, CircuitOpen,
+    OpenAIProvider, HedgedRequest, ProviderTimeout
+)
 
 class RiskLevel(Enum):
     """Risk levels for yield strategies"""
@@ -81,12 +80,12 @@ class Portfolio:
     """User portfolio data"""
     address: str
     total_value_usd: float
-    positions: List[Dict[str, Any]]
+    positions: Union[List[Dict[str, Any]], PositionTable]
     chains: List[str]
     risk_tolerance: RiskLevel
     preferred_protocols: List[str]
 
-class OpusAIAgent:
+class OpusAIAgent(AgentHelpers):
     """
     Main AI Agent powered by Opus 4.1 (Claude) or GPT-4
     Provides advanced yield strategy recommendations
@@ -148,56 +147,254 @@ class OpusAIAgent:
         self,
         openai_api_key: Optional[str] = None,
         anthropic_api_key: Optional[str] = None,
-        cache_ttl: int = 3600
+        cache_ttl: int = 3600,
+        max_concurrency: Optional[int] = None,
+        request_timeout: Optional[float] = None
     ):
         """Initialize the AI Agent"""
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         self.anthropic_api_key = anthropic_api_key or os.getenv("ANTHROPIC_API_KEY")
         self.cache_ttl = cache_ttl
+        self.config = self._load_model_config()
         
-        # Initialize clients
-        self._init_ai_clients()
+        # Per-provider limits: explicit args > env > model_config.yaml
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("AI_MAX_CONCURRENCY", self.config["max_concurrency"])
+        )
+        self.request_timeout = request_timeout or float(
+            os.getenv("AI_REQUEST_TIMEOUT", self.config["request_timeout"])
+        )
+        
+        # LLM clients are built on first use; Redis connects in the background
+        self._clients_lock = threading.Lock()
+        self._clients_ready = False
         self._init_cache()
         
-        # Knowledge base
-        self.knowledge_base = self._load_knowledge_base()
+        # Knowledge base and retrieval indexes are loaded on first use
+        self._knowledge_base: Optional[Dict[str, Any]] = None
+        self._retriever: Optional[Any] = None
+        self._retriever_loaded = False
+        self._dense_index: Optional[Any] = None
+        self._dense_loaded = False
+        # Estimated prompt tokens per template: calls, total, last, truncated
+        self.prompt_stats: Dict[str, Dict[str, int]] = {}
+        self.strategy_skeletons = StrategyBuilder.precompute_skeletons(
+            self.STRATEGY_TEMPLATES
+        )
+        self.strategy_universe = StrategyUniverse.from_skeletons(self.strategy_skeletons)
+        
+        # Monte Carlo risk simulation settings (n_paths, horizon_days, ...)
+        self.risk_engine = RiskEngine(**self.config["risk_engine"])
+        
+        # Historical APY per pool / strategy, memory-mapped on demand
+        self.apy_history = SeriesStore(self.config["history_root"] or HISTORY_ROOT)
+        
+        # Alert thresholds: defaults plus per chain/protocol/type overrides
+        monitor_rules = RuleTable.from_config(self.config["monitor_rules"])
+        self.position_monitor = PositionMonitor(monitor_rules)
+        self.alert_monitor = IncrementalMonitor(
+            monitor_rules,
+            hysteresis={**DEFAULT_HYSTERESIS, **(self.config["monitor_hysteresis"] or {})}
+        )
+        
+        # Cache counters are sampled when /metrics is scraped (see metrics.py)
+        REGISTRY.add_collector(self._collect_metrics)
         
         logger.info("OpusAIAgent initialized successfully")
     
+    def _load_model_config(self) -> Dict[str, Any]:
+        """Load model settings from model_config.yaml"""
+        config = {
+            "model": "claude-3-opus-20240229",
+            "provider": "anthropic",
+            "temperature": 0.7,
+            "max_tokens": 1000,
+            "fallback_model": "gpt-4",
+            "max_concurrency": 32,
+            "request_timeout": 30.0,
+            "timeout_quantile": 0.99,
+            "timeout_multiplier": 2.0,
+            "min_timeout": 2.0,
+            "circuit_breaker": {},
+            "hedge_requests": False,
+            "hedge_delay": None,
+            "response_cache_size": 1024,
+            "memory_cache_max_entries": 10000,
+            "memory_cache_max_bytes": 64 * 1024 * 1024,
+            "redis_max_connections": 32,
+            "redis_timeout": 0.5,
+            "redis_retry_after": 5.0,
+            "monitor_rules": [],
+            "monitor_hysteresis": {},
+            "risk_engine": {},
+            "history_root": None,
+            "history_window_days": 90,
+            "history_min_samples": 30,
+            "retrieval_index": None,
+            "retrieval_top_k": 3,
+            "retrieval_max_chars": 800,
+            "dense_index": None,
+            "dense_n_probe": 4,
+            "prompt_budgets": {
+                "explain_prompt": 700,
+                "advisor_prompt": 1500,
+                "summarizer_prompt": 1200,
+            },
+        }
+        
+        config_file = os.path.join(os.path.dirname(__file__), "model_config.yaml")
+        if HAS_YAML and os.path.exists(config_file):
+            import yaml
+            with open(config_file, 'r') as f:
+                config.update(yaml.safe_load(f) or {})
+        
+        return config
+    
     def _init_ai_clients(self):
-        """Initialize AI model clients"""
-        self.openai_client = None
-        self.anthropic_client = None
+        """Initialize AI model clients (first use of providers/hedger)"""
+        with self._clients_lock:
+            if self._clients_ready:
+                return
+            self._build_ai_clients()
+            self._clients_ready = True
+    
+    def _build_ai_clients(self):
+        self._openai_client = None
+        self._anthropic_client = None
+        
+        limits = {
+            "max_tokens": self.config["max_tokens"],
+            "temperature": self.config["temperature"],
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.request_timeout,
+            "timeout_quantile": self.config["timeout_quantile"],
+            "timeout_multiplier": self.config["timeout_multiplier"],
+            "min_timeout": self.config["min_timeout"],
+        }
+        breaker = self.config["circuit_breaker"] or {}
         
-        if HAS_ANTHROPIC and self.anthropic_api_key:
-            self.anthropic_client = anthropic.Anthropic(api_key=self.anthropic_api_key)
+        if not HAS_ANTHROPIC:
+            logger.warning("Anthropic package not installed. Using fallback responses.")
+        elif self.anthropic_api_key:
+            self._anthropic_client = AnthropicProvider(
+                self.anthropic_api_key, self.config["model"],
+                breaker=CircuitBreaker(**breaker), **limits
+            )
             logger.info("Anthropic Claude (Opus 4.1) client initialized")
         
-        if HAS_OPENAI and self.openai_api_key:
-            openai.api_key = self.openai_api_key
-            self.openai_client = openai
+        if not HAS_OPENAI:
+            logger.warning("OpenAI package not installed. Using fallback responses.")
+        elif self.openai_api_key:
+            self._openai_client = OpenAIProvider(
+                self.openai_api_key, self.config["fallback_model"],
+                breaker=CircuitBreaker(**breaker), **limits
+            )
             logger.info("OpenAI GPT-4 client initialized")
+        
+        # Providers in the order explain_strategy tries them
+        self._providers = [
+            client for client in (self._anthropic_client, self._openai_client)
+            if client is not None
+        ]
+        
+        # Optional hedging of the primary with the fallback model
+        self._hedger = None
+        if self.config["hedge_requests"] and len(self._providers) > 1:
+            self._hedger = HedgedRequest(
+                self._providers[0],
+                self._providers[1],
+                delay=self.config["hedge_delay"]
+            )
+            logger.info("Hedged LLM requests enabled")
+    
+    @property
+    def providers(self) -> List[Any]:
+        self._init_ai_clients()
+        return self._providers
+    
+    @property
+    def hedger(self) -> Optional[HedgedRequest]:
+        self._init_ai_clients()
+        return self._hedger
+    
+    @property
+    def anthropic_client(self) -> Optional[AnthropicProvider]:
+        self._init_ai_clients()
+        return self._anthropic_client
+    
+    @property
+    def openai_client(self) -> Optional[OpenAIProvider]:
+        self._init_ai_clients()
+        return self._openai_client
     
     def _init_cache(self):
         """Initialize caching layer"""
-        self.cache = None
-        if HAS_REDIS:
-            try:
-                self.cache = redis.Redis(
-                    host=os.getenv("REDIS_HOST", "localhost"),
-                    port=int(os.getenv("REDIS_PORT", 6379)),
-                    decode_responses=True,
-                    socket_connect_timeout=2
-                )
-                self.cache.ping()
-                logger.info("Redis cache initialized")
-            except:
-                self.cache = None
-                logger.info("Redis unavailable, using memory cache")
+        # Local tiers serve until (and unless) Redis connects
+        self.cache: Optional[RedisCache] = None
+        self.memory_cache = LRUCache(
+            max_entries=self.config["memory_cache_max_entries"],
+            max_bytes=self.config["memory_cache_max_bytes"],
+            ttl=self.cache_ttl
+        )
+        # Strategy results: memory cache in front of Redis, codec payloads in Redis
+        self.result_cache = TieredCache(
+            self.memory_cache,
+            ttl=self.cache_ttl,
+            encode=codec.encode,
+            decode=codec.decode
+        )
         
-        # Fallback to memory cache
-        if not self.cache:
-            self.memory_cache = {}
+        # LLM responses: in-process LRU in front of Redis
+        self.response_cache = ResponseCache(
+            None,
+            max_entries=self.config["response_cache_size"],
+            ttl=self.cache_ttl
+        )
+        
+        self.cache_ready = threading.Event()
+        if not HAS_REDIS:
+            logger.info("Redis not available. Using in-memory cache.")
+            self.cache_ready.set()
+            return
+        threading.Thread(
+            target=self._connect_cache, name="redis-connect", daemon=True
+        ).start()
+    
+    def _connect_cache(self):
+        """Check Redis off the constructing thread; swap in the pooled client once it answers"""
+        import redis
+        host = os.getenv("REDIS_HOST", "localhost")
+        port = int(os.getenv("REDIS_PORT", 6379))
+        try:
+            probe = redis.Redis(host=host, port=port, socket_connect_timeout=2)
+            probe.ping()
+            probe.close()
+        except (redis.RedisError, OSError) as e:
+            logger.info(f"Redis unavailable ({e}), using memory cache")
+        else:
+            self.cache = RedisCache(
+                host,
+                port,
+                max_connections=self.config["redis_max_connections"],
+                timeout=self.config["redis_timeout"],
+                retry_after=self.config["redis_retry_after"]
+            )
+            self.result_cache.redis = self.cache
+            self.response_cache.redis = self.cache
+            logger.info("Redis cache initialized")
+        finally:
+            self.cache_ready.set()
+    
+    def wait_for_cache(self, timeout: Optional[float] = None) -> bool:
+        """Block until the Redis connection attempt has finished"""
+        return self.cache_ready.wait(timeout)
+    
+    @property
+    def knowledge_base(self) -> Dict[str, Any]:
+        """DeFi knowledge base, read from disk on first use"""
+        if self._knowledge_base is None:
+            self._knowledge_base = self._load_knowledge_base()
+        return self._knowledge_base
     
     def _load_knowledge_base(self) -> Dict[str, Any]:
         """Load DeFi knowledge base for RAG"""
@@ -234,6 +431,10 @@ class OpusAIAgent:
         """
         Analyze user portfolio and provide insights
         """
+        with span("analyze"):
+            return await self._analyze_portfolio(portfolio)
+    
+    async def _analyze_portfolio(self, portfolio: Portfolio) -> Dict[str, Any]:
         analysis = {
             "total_value": portfolio.total_value_usd,
             "risk_score": self._calculate_risk_score(portfolio),
@@ -250,13 +451,33 @@ class OpusAIAgent:
         
         if opportunities:
             best_opportunity = opportunities[0]
-            potential_apy = best_opportunity.expected_apy
+            potential_apy = best_opportunity["expected_apy"]
+            # Prefer the realized APY of the suggested protocol when recorded
+            history = self._apy_history(
+                best_opportunity.get("to_protocol") or best_opportunity.get("suggested_protocol")
+            )
+            if history:
+                potential_apy = history["mean"]
             analysis["optimization_potential"] = potential_apy - current_apy
         
         analysis["recommendations"] = opportunities[:3]
         
         return analysis
     
+    async def analyze_portfolios(self, portfolios: List[Portfolio]) -> List[Dict[str, Any]]:
+        """
+        Analyze many portfolios at once (results in input order)
+        """
+        with span("analyze_batch", portfolios=len(portfolios)):
+            # Same realized-APY preference as _analyze_portfolio
+            upgrade = self._apy_history(OpportunityFinder.UPGRADE_PROTOCOL)
+            deploy = self._apy_history(OpportunityFinder.DEPLOY_PROTOCOL)
+            return PortfolioBatch.analyze_all(
+                portfolios,
+                upgrade_apy=upgrade and upgrade["mean"],
+                deploy_apy=deploy and deploy["mean"]
+            )
+    
     async def get_strategy_recommendation(
         self,
         portfolio: Portfolio,
@@ -266,32 +487,73 @@ class OpusAIAgent:
         """
         Get personalized yield strategy recommendations
         """
-        # Check cache first
-        cache_key = f"strategy:{portfolio.address}:{target_apy}:{max_gas_usd}"
-        cached = self._get_cached(cache_key)
-        if cached:
-            return cached
-        
-        # Generate recommendations
-        strategies = []
-        
-        # Filter strategies based on user preferences
-        for template_key, template in self.STRATEGY_TEMPLATES.items():
-            if self._matches_criteria(template, portfolio, target_apy, max_gas_usd):
-                strategy = await self._build_strategy(
-                    template,
-                    portfolio,
-                    template_key
-                )
-                strategies.append(strategy)
-        
-        # Sort by expected APY
-        strategies.sort(key=lambda s: s.expected_apy, reverse=True)
-        
-        # Cache results
-        self._set_cached(cache_key, strategies[:5])
-        
-        return strategies[:5]
+        with span("recommend"):
+            # Check cache first
+            cache_key = self._strategy_cache_key(portfolio, target_apy, max_gas_usd)
+            with span("cache_lookup"):
+                cached = await self._get_cached(cache_key)
+            if cached:
+                return cached
+            
+            # Screen the strategy universe and materialize only the top 5
+            strategies = self.strategy_universe.recommend(
+                portfolio,
+                target_apy=target_apy,
+                max_gas_usd=max_gas_usd,
+                k=5
+            )
+            
+            # Cache results
+            with span("cache_store"):
+                await self._set_cached(cache_key, strategies)
+            
+            return strategies
+    
+    async def get_strategy_recommendations(
+        self,
+        portfolios: List[Portfolio],
+        target_apy: Optional[float] = None,
+        max_gas_usd: float = 100.0
+    ) -> List[List[YieldStrategy]]:
+        """
+        Recommendations for many portfolios (results in input order); cache
+        lookups and writes each take one pipelined Redis round trip
+        """
+        keys = [
+            self._strategy_cache_key(portfolio, target_apy, max_gas_usd)
+            for portfolio in portfolios
+        ]
+        with span("recommend_batch", portfolios=len(portfolios)):
+            with span("cache_lookup"):
+                results = await self.result_cache.get_many(keys)
+            fresh = {}
+            for i, portfolio in enumerate(portfolios):
+                if not results[i]:
+                    results[i] = self.strategy_universe.recommend(
+                        portfolio,
+                        target_apy=target_apy,
+                        max_gas_usd=max_gas_usd,
+                        k=5
+                    )
+                    fresh[keys[i]] = results[i]
+            with span("cache_store"):
+                await self.result_cache.set_many(fresh)
+            return results
+    
+    @staticmethod
+    def _strategy_cache_key(
+        portfolio: Portfolio,
+        target_apy: Optional[float],
+        max_gas_usd: float
+    ) -> str:
+        """
+        Recommendation cache key: screening depends on the risk tolerance and
+        confidence on the (bucketed) portfolio value, not only the address
+        """
+        return (
+            f"strategy:{portfolio.address}:{portfolio.risk_tolerance.value}:"
+            f"{bucket_value(portfolio.total_value_usd):.0f}:{target_apy}:{max_gas_usd}"
+        )
     
     async def explain_strategy(
         self,
@@ -301,145 +563,464 @@ class OpusAIAgent:
         """
         Generate detailed explanation of a yield strategy
         """
-        prompt = f"""
-        Explain this DeFi yield strategy for a user with ${portfolio.total_value_usd} portfolio:
-        
-        Strategy: {strategy.name}
-        Type: {strategy.type.value}
-        Protocol: {strategy.protocol}
-        Chain: {strategy.chain}
-        Expected APY: {strategy.expected_apy}%
-        Risk Level: {strategy.risk_level.value}
-        IL Exposure: {strategy.il_exposure}%
+        with span("explain"):
+            # Keyed on the prompt's inputs, so hits skip retrieval and packing
+            cache_key = self._explain_cache_key(strategy, portfolio)
+            with span("cache_lookup"):
+                cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            with span("prompt_build"):
+                prompt = self._build_explain_prompt(strategy, portfolio)
+            explanation = await self._complete_prompt(prompt)
+            if explanation is None:
+                # Fallback explanation (not cached, so providers are retried)
+                with span("fallback"):
+                    return self._generate_fallback_explanation(strategy, portfolio)
+            
+            with span("cache_store"):
+                await self.response_cache.set(cache_key, explanation)
+            return explanation
+    
+    async def _complete_prompt(self, prompt: str) -> Optional[str]:
+        """Run the prompt through the configured providers, None if all fail"""
+        if self.hedger:
+            try:
+                with span("llm_call", provider="hedged"):
+                    return await self.hedger.complete(prompt)
+            except CircuitOpen as e:
+                logger.debug(f"Skipping hedged call: {e}")
+            except Exception as e:
+                logger.error(f"Hedged API error: {e}")
+            return None
         
-        Steps:
-        {chr(10).join(f"{i+1}. {step}" for i, step in enumerate(strategy.steps))}
+        # Providers with an open circuit raise CircuitOpen at once, so an
+        # outage costs nothing until the breaker lets a probe through
+        for provider in self.providers:
+            try:
+                with span("llm_call", provider=provider.name):
+                    return await provider.complete(prompt)
+            except CircuitOpen as e:
+                logger.debug(f"Skipping provider: {e}")
+            except ProviderTimeout as e:
+                logger.error(f"{provider.name} API timeout: {e}")
+            except Exception as e:
+                logger.error(f"{provider.name} API error: {e}")
         
-        Provide a clear, concise explanation covering:
-        1. How the strategy works
-        2. Main risks and how to mitigate them
-        3. Exit strategy
-        4. Why it's suitable for this user
+        return None
+    
+    async def explain_strategy_stream(
+        self,
+        strategy: YieldStrategy,
+        portfolio: Portfolio,
+        fallback_chunk_size: int = 64
+    ) -> AsyncIterator[str]:
         """
+        Stream the explanation of a yield strategy chunk by chunk
+        """
+        # No spans here: a generator suspends at every yield, so a span
+        # would time the consumer too (provider.stream records LLM metrics)
+        cache_key = self._explain_cache_key(strategy, portfolio)
+        cached = await self.response_cache.get(cache_key)
+        if cached is not None:
+            for i in range(0, len(cached), fallback_chunk_size):
+                yield cached[i:i + fallback_chunk_size]
+            return
+        
+        prompt = self._build_explain_prompt(strategy, portfolio)
         
-        # Try Anthropic Claude first
-        if self.anthropic_client:
+        for provider in self.providers:
+            chunks = []
             try:
-                response = self.anthropic_client.messages.create(
-                    model="claude-3-opus-20240229",
-                    max_tokens=1000,
-                    temperature=0.7,
-                    messages=[{"role": "user", "content": prompt}]
-                )
-                return response.content[0].text
+                async for chunk in provider.stream(prompt):
+                    chunks.append(chunk)
+                    yield chunk
+                await self.response_cache.set(cache_key, "".join(chunks))
+                return
+            except CircuitOpen as e:
+                logger.debug(f"Skipping provider: {e}")
             except Exception as e:
-                logger.error(f"Anthropic API error: {e}")
+                logger.error(f"{provider.name} streaming error: {e}")
+                # Text already reached the caller; switching providers would garble it
+                if chunks:
+                    return
         
-        # Fallback to OpenAI
-        if self.openai_client:
+        # Fallback explanation, chunked like a provider stream
+        text = self._generate_fallback_explanation(strategy, portfolio)
+        for i in range(0, len(text), fallback_chunk_size):
+            yield text[i:i + fallback_chunk_size]
+    
+    def _response_cache_key(self, prompt: str) -> str:
+        """Response cache key for a prompt under the configured model"""
+        return self.response_cache.key(
+            prompt, self.config["model"], self.config["temperature"]
+        )
+    
+    def _explain_cache_key(self, strategy: YieldStrategy, portfolio: Portfolio) -> str:
+        """
+        Response cache key from everything _build_explain_prompt depends on:
+        the strategy fields it renders (retrieval queries the same fields),
+        the bucketed portfolio value and the prompt budget
+        """
+        material = "\x00".join([
+            "explain_prompt",
+            str(self.config["prompt_budgets"]["explain_prompt"]),
+            f"{bucket_value(portfolio.total_value_usd):,.0f}",
+            strategy.name, strategy.type.value, strategy.protocol, strategy.chain,
+            repr(strategy.expected_apy), strategy.risk_level.value, repr(strategy.il_exposure),
+            *strategy.steps,
+        ])
+        return self._response_cache_key(material)
+    
+    def _load_retriever(self) -> Optional[Any]:
+        """Memory-map the prebuilt BM25 index over backend/data/training"""
+        from backend.ai.retrieval import DEFAULT_INDEX, BM25Index
+        try:
+            return BM25Index.open(self.config["retrieval_index"] or DEFAULT_INDEX)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Retrieval index unavailable: {e}")
+            return None
+    
+    @property
+    def retriever(self) -> Optional[Any]:
+        """The prebuilt BM25 index (backend.ai.retrieval), loaded on first use"""
+        if not self._retriever_loaded:
+            self._retriever_loaded = True
+            self._retriever = self._load_retriever()
+        return self._retriever
+    
+    @property
+    def dense_index(self) -> Optional[Any]:
+        """The prebuilt dense index (backend.ai.dense), loaded on first use"""
+        if not self._dense_loaded:
+            self._dense_loaded = True
+            from backend.ai.dense import DEFAULT_INDEX, DenseIndex
             try:
-                response = self.openai_client.ChatCompletion.create(
-                    model="gpt-4",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=1000,
-                    temperature=0.7
+                self._dense_index = DenseIndex.open(
+                    self.config["dense_index"] or DEFAULT_INDEX,
+                    n_probe=self.config["dense_n_probe"]
                 )
-                return response.choices[0].message.content
-            except Exception as e:
-                logger.error(f"OpenAI API error: {e}")
-        
-        # Fallback explanation
-        return self._generate_fallback_explanation(strategy, portfolio)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dense index unavailable: {e}")
+        return self._dense_index
+    
+    def _retrieve_knowledge(self, strategy: YieldStrategy) -> List[str]:
+        """Corpus passages relevant to a strategy, best first, numbered for the prompt"""
+        query = " ".join([strategy.name, strategy.protocol, strategy.type.value, *strategy.steps])
+        k = self.config["retrieval_top_k"]
+        rankings = [
+            index.search(query, k)
+            for index in (self.retriever, self.dense_index) if index is not None
+        ]
+        # Reciprocal rank fusion of the lexical and dense rankings
+        fused: Dict[str, float] = {}
+        for ranking in rankings:
+            for rank, passage in enumerate(ranking):
+                fused[passage["text"]] = fused.get(passage["text"], 0.0) + 1 / (60 + rank)
+        limit = self.config["retrieval_max_chars"]
+        return [
+            f"[{i + 1}] {' '.join(text[:limit].split())}"
+            for i, text in enumerate(sorted(fused, key=fused.get, reverse=True)[:k])
+        ]
+    
+    def _build_prompt(self, template: str, sections: List[Any]) -> str:
+        """Pack sections into the template's token budget and record its size"""
+        from backend.ai.prompt_builder import build_prompt
+        prompt = build_prompt(template, sections, self.config["prompt_budgets"][template])
+        stats = self.prompt_stats.setdefault(
+            template, {"calls": 0, "tokens": 0, "last_tokens": 0, "truncated": 0}
+        )
+        stats["calls"] += 1
+        stats["tokens"] += prompt.tokens
+        stats["last_tokens"] = prompt.tokens
+        stats["truncated"] += bool(prompt.truncated)
+        logger.debug(
+            f"{template}: {prompt.tokens} prompt tokens"
+            + (f", truncated {', '.join(prompt.truncated)}" if prompt.truncated else "")
+        )
+        return prompt.text
+    
+    def _build_explain_prompt(self, strategy: YieldStrategy, portfolio: Portfolio) -> str:
+        """Build the LLM prompt for explain_strategy"""
+        from backend.ai.prompt_builder import Section
+        # Bucketed so portfolios of similar size share cached explanations
+        portfolio_value = f"{bucket_value(portfolio.total_value_usd):,.0f}"
+        knowledge = self._retrieve_knowledge(strategy)
+        return self._build_prompt("explain_prompt", [
+            Section("portfolio_value", [portfolio_value]),
+            Section("strategy", [
+                f"Strategy: {strategy.name}",
+                f"Type: {strategy.type.value}",
+                f"Protocol: {strategy.protocol} on {strategy.chain}",
+                f"Expected APY: {strategy.expected_apy}%, risk {strategy.risk_level.value}, "
+                f"IL exposure {strategy.il_exposure}%",
+            ]),
+            Section("steps", [f"{i + 1}. {step}" for i, step in enumerate(strategy.steps)], 1),
+            Section("knowledge", ["\nRelevant knowledge:", *knowledge] if knowledge else [], 2),
+        ])
+    
+    def _build_advisor_prompt(self, portfolio: Portfolio, market_data: Dict[str, Any]) -> str:
+        """Build the LLM prompt for advise_portfolio"""
+        from backend.ai.prompt_builder import Section, compact_mapping, compact_positions
+        positions = compact_positions(portfolio.positions)
+        return self._build_prompt("advisor_prompt", [
+            Section("portfolio_data", [
+                f"${bucket_value(portfolio.total_value_usd):,.0f} on {', '.join(portfolio.chains)}, "
+                f"{portfolio.risk_tolerance.value} risk tolerance",
+                *positions[:1],
+            ]),
+            Section("market_data", compact_mapping(market_data), 1),
+            # Largest positions first, so the smallest are dropped when over budget
+            Section("portfolio_data", positions[1:], 2),
+        ])
+    
+    def _build_summary_prompt(
+        self,
+        positions: Union[List[Dict[str, Any]], PositionTable]
+    ) -> str:
+        """Build the LLM prompt for summarize_positions"""
+        from backend.ai.prompt_builder import Section, compact_positions
+        return self._build_prompt("summarizer_prompt", [
+            Section("positions", compact_positions(positions)),
+        ])
+    
+    async def advise_portfolio(
+        self,
+        portfolio: Portfolio,
+        market_data: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        Strategy advice for a portfolio under current market conditions
+        (prompts/advisor_prompt.txt); None if no provider answers
+        """
+        with span("advise"):
+            with span("prompt_build"):
+                prompt = self._build_advisor_prompt(portfolio, market_data)
+            return await self._complete_cached(prompt)
+    
+    async def summarize_positions(
+        self,
+        positions: Union[List[Dict[str, Any]], PositionTable]
+    ) -> Optional[str]:
+        """
+        Short summary of a set of positions (prompts/summarizer_prompt.txt);
+        None if no provider answers
+        """
+        with span("summarize"):
+            with span("prompt_build"):
+                prompt = self._build_summary_prompt(positions)
+            return await self._complete_cached(prompt)
+    
+    async def _complete_cached(self, prompt: str) -> Optional[str]:
+        cache_key = self._response_cache_key(prompt)
+        with span("cache_lookup"):
+            cached = await self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        response = await self._complete_prompt(prompt)
+        if response is not None:
+            with span("cache_store"):
+                await self.response_cache.set(cache_key, response)
+        return response
     
     async def calculate_risk_metrics(
         self,
         strategy: YieldStrategy,
-        investment_amount: float
+        investment_amount: float,
+        confidence: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Calculate detailed risk metrics for a strategy
         """
-        metrics = {
-            "var_95": 0.0,  # Value at Risk (95% confidence)
-            "max_drawdown": 0.0,
-            "sharpe_ratio": 0.0,
-            "liquidation_risk": 0.0,
-            "protocol_risk_score": 0.0,
-            "time_to_breakeven_days": 0
-        }
-        
-        # Calculate VaR based on historical volatility
-        if strategy.type == StrategyType.LP:
-            # Higher VaR for LP strategies due to IL
-            metrics["var_95"] = investment_amount * 0.15
-            metrics["max_drawdown"] = 0.25
-        elif strategy.type == StrategyType.LENDING:
-            metrics["var_95"] = investment_amount * 0.05
-            metrics["max_drawdown"] = 0.10
-        elif strategy.type == StrategyType.LOOPING:
-            metrics["var_95"] = investment_amount * 0.20
-            metrics["max_drawdown"] = 0.35
-            metrics["liquidation_risk"] = 0.15
-        
-        # Calculate Sharpe ratio (simplified)
-        risk_free_rate = 4.0  # US Treasury rate
-        excess_return = strategy.expected_apy - risk_free_rate
-        volatility = metrics["max_drawdown"] * 100
-        metrics["sharpe_ratio"] = excess_return / volatility if volatility > 0 else 0
-        
-        # Protocol risk score (0-100, lower is better)
-        metrics["protocol_risk_score"] = self._calculate_protocol_risk(
-            strategy.protocol
+        metrics = await self.calculate_risk_metrics_batch(
+            [strategy], [investment_amount], confidence
         )
+        return metrics[0][0]
+    
+    async def calculate_risk_metrics_batch(
+        self,
+        strategies: List[YieldStrategy],
+        investment_amounts: List[float],
+        confidence: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Risk metrics for every strategy at every investment amount, from one
+        Monte Carlo pass; indexed [strategy][amount]
+        """
+        with span("risk", strategies=len(strategies)):
+            # Recorded APY history, when there is enough, sets the yield volatility
+            histories = [self._apy_history(s.id, s.protocol) for s in strategies]
+            simulated = self.risk_engine.metrics(
+                strategies,
+                investment_amounts,
+                confidence,
+                yield_vols=[history and history["std"] for history in histories]
+            )
         
+        return [
+            [
+                self._risk_row(strategy, history, amount, sim)
+                for amount, sim in zip(investment_amounts, per_amount)
+            ]
+            for strategy, history, per_amount in zip(strategies, histories, simulated)
+        ]
+    
+    async def calculate_risk_metrics_pairs(
+        self,
+        strategies: List[YieldStrategy],
+        investment_amounts: List[float],
+        confidence: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Risk metrics for strategies[i] at investment_amounts[i], from one
+        Monte Carlo pass over the distinct simulation parameters
+        """
+        with span("risk", strategies=len(strategies)):
+            histories = [self._apy_history(s.id, s.protocol) for s in strategies]
+            simulated = self.risk_engine.pair_metrics(
+                strategies,
+                investment_amounts,
+                confidence,
+                yield_vols=[history and history["std"] for history in histories]
+            )
+        return [
+            self._risk_row(strategy, history, amount, sim)
+            for strategy, history, amount, sim in zip(
+                strategies, histories, investment_amounts, simulated
+            )
+        ]
+    
+    def _risk_row(
+        self,
+        strategy: YieldStrategy,
+        history: Optional[Dict[str, Any]],
+        investment_amount: float,
+        sim: Dict[str, float]
+    ) -> Dict[str, Any]:
         # Time to breakeven (accounting for gas costs)
         daily_yield = (investment_amount * strategy.expected_apy / 100) / 365
-        metrics["time_to_breakeven_days"] = int(
-            strategy.gas_cost_usd / daily_yield
-        ) if daily_yield > 0 else 999
-        
-        return metrics
+        return {
+            "var": sim["var"],  # Value at Risk at sim["confidence"]
+            # Previous name, kept for existing callers: VaR at 95% only
+            "var_95": sim["var"] if sim["confidence"] == 0.95 else None,
+            "cvar": sim["cvar"],
+            "confidence": sim["confidence"],
+            "horizon_days": sim["horizon_days"],
+            "max_drawdown": sim["max_drawdown"],
+            "volatility": sim["volatility"],
+            "sharpe_ratio": sim["sharpe_ratio"],
+            "liquidation_risk": sim["liquidation_risk"],
+            "impermanent_loss": sim["impermanent_loss"],
+            "historical_apy": history,
+            # Protocol risk score (0-100, lower is better)
+            "protocol_risk_score": self._calculate_protocol_risk(strategy.protocol),
+            "time_to_breakeven_days": int(
+                strategy.gas_cost_usd / daily_yield
+            ) if daily_yield > 0 else 999
+        }
+    
+    def _apy_history(self, *keys: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Trailing APY stats for the first key with enough recorded history"""
+        window = int(self.config["history_window_days"] * 86400)
+        for key in keys:
+            if key is None or key not in self.apy_history:
+                continue
+            stats = self.apy_history.trailing_stats(key, window)
+            if stats and stats["count"] >= self.config["history_min_samples"]:
+                return stats
+        return None
     
     async def monitor_positions(
         self,
-        positions: List[Dict[str, Any]]
+        positions: Union[List[Dict[str, Any]], PositionTable]
     ) -> List[Dict[str, Any]]:
         """
         Monitor existing positions and generate alerts
         """
-        alerts = []
-        
-        for position in positions:
-            # Check for IL threshold
-            if position.get("il_percentage", 0) > 5:
-                alerts.append({
-                    "type": "HIGH_IL",
-                    "severity": "warning",
-                    "position_id": position["id"],
-                    "message": f"High impermanent loss detected: {position['il_percentage']}%",
-                    "action": "Consider rebalancing or exiting position"
-                })
-            
-            # Check for low APY
-            if position.get("current_apy", 0) < 5:
-                alerts.append({
-                    "type": "LOW_APY",
-                    "severity": "info",
-                    "position_id": position["id"],
-                    "message": f"Low APY detected: {position['current_apy']}%",
-                    "action": "Consider migrating to higher yield opportunity"
-                })
-            
-            # Check health factor for leveraged positions
-            if position.get("health_factor", 999) < 1.5:
-                alerts.append({
-                    "type": "LIQUIDATION_RISK",
-                    "severity": "critical",
-                    "position_id": position["id"],
-                    "message": f"Liquidation risk! Health factor: {position['health_factor']}",
-                    "action": "Add collateral immediately or reduce debt"
-                })
-        
-        return alerts
+        with span("monitor", positions=len(positions)):
+            return self.position_monitor.evaluate(positions)
+    
+    async def monitor_position_stream(
+        self,
+        batches: AsyncIterator[Union[List[Dict[str, Any]], PositionTable]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Monitor a stream of position batches, yielding alerts as they are found
+        """
+        async for alert in self.position_monitor.stream(batches):
+            yield alert
+    
+    async def monitor_position_updates(
+        self,
+        changed: Union[List[Dict[str, Any]], PositionTable],
+        removed: Optional[List[Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-check only changed positions and return raised/cleared alert
+        transitions; alert state persists via alert_monitor.snapshot()/restore()
+        """
+        with span("monitor_update", positions=len(changed)):
+            return self.alert_monitor.update(changed, removed or ())
+    
+    @property
+    def hedge_stats(self) -> Dict[str, int]:
+        """How often hedged requests fired and how often the hedge won"""
+        return dict(self.hedger.stats) if self.hedger else {}
+    
+    def _collect_metrics(self) -> List[tuple]:
+        """Cache counters for metrics.REGISTRY, read at scrape time"""
+        samples = [
+            *cache_samples("strategy", self.memory_cache.stats()),
+            *cache_samples("response", self.response_cache.local.stats()),
+            *cache_samples("risk", self.risk_engine.cache.stats()),
+        ]
+        if self.cache is not None:
+            samples.extend(cache_samples("redis", self.cache.stats()))
+        # Only once the clients exist; scraping shouldn't build them
+        states = [CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN]
+        for provider in self._providers if self._clients_ready else ():
+            breaker = provider.breaker
+            labels = {"provider": provider.name}
+            samples.append((
+                "apyhub_llm_circuit_state", "gauge",
+                "Provider circuit breaker state (0 closed, 1 half-open, 2 open)",
+                labels, states.index(breaker.state)
+            ))
+            samples.append((
+                "apyhub_llm_circuit_opened_total", "counter",
+                "Times the provider circuit breaker opened", labels, breaker.stats["opened"]
+            ))
+            samples.append((
+                "apyhub_llm_timeout_seconds", "gauge",
+                "Current adaptive completion timeout", labels, provider.call_timeout()
+            ))
+        return samples
+    
+    # Helper wiring
+    
+    async def _get_cached(self, key: str) -> Optional[Any]:
+        """Get value from the in-memory cache or Redis"""
+        return await self.result_cache.get(key)
+    
+    async def _set_cached(self, key: str, value: Any):
+        """Set value in the in-memory cache and Redis"""
+        await self.result_cache.set(key, value)
+    
+    async def _build_strategy(
+        self,
+        template: Dict,
+        portfolio: Portfolio,
+        strategy_key: str
+    ) -> YieldStrategy:
+        """Build a complete strategy from a template"""
+        return await StrategyBuilder.build_strategy(
+            template,
+            portfolio,
+            strategy_key,
+            self.strategy_skeletons.get(strategy_key)
+        )
     
-    #
\ No newline at end of file
+    async def _find_opportunities(self, portfolio: Portfolio) -> List[Any]:
+        """Find optimization opportunities for a portfolio"""
+        return await OpportunityFinder.find_opportunities(portfolio)
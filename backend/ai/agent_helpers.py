@@ -4,13 +4,66 @@ Separated for better organization
 """
 
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from dataclasses import dataclass
 import json
 import hashlib
 
+import numpy as np
+
+from backend.ai.positions import PositionTable
+
+@dataclass
+class StrategySkeleton:
+    """Portfolio-independent YieldStrategy fields precomputed from a template"""
+    key: str
+    fields: Dict[str, Any]
+    base_confidence: float
+    
+    # Held as tuples here; every YieldStrategy gets its own lists
+    LIST_FIELDS = ("steps", "required_tokens", "exit_options")
+    
+    def strategy_fields(self) -> Dict[str, Any]:
+        """YieldStrategy keyword arguments, list fields copied"""
+        fields = dict(self.fields)
+        for key in self.LIST_FIELDS:
+            fields[key] = list(fields[key])
+        return fields
+
+
 class AgentHelpers:
     """Helper methods for AI Agent"""
     
+    # Position alert type -> (severity, message template, suggested action)
+    POSITION_ALERTS = {
+        "HIGH_IL": (
+            "warning",
+            "High impermanent loss detected: {value}%",
+            "Consider rebalancing or exiting position"
+        ),
+        "LOW_APY": (
+            "info",
+            "Low APY detected: {value}%",
+            "Consider migrating to higher yield opportunity"
+        ),
+        "LIQUIDATION_RISK": (
+            "critical",
+            "Liquidation risk! Health factor: {value}",
+            "Add collateral immediately or reduce debt"
+        ),
+    }
+    
+    @staticmethod
+    def _position_alert(alert_type: str, position_id: Any, value: Any) -> Dict[str, Any]:
+        """Build a monitor_positions alert"""
+        severity, message, action = AgentHelpers.POSITION_ALERTS[alert_type]
+        return {
+            "type": alert_type,
+            "severity": severity,
+            "position_id": position_id,
+            "message": message.format(value=value),
+            "action": action
+        }
+    
     @staticmethod
     def _calculate_risk_score(portfolio: Any) -> float:
         """Calculate portfolio risk score (0-100)"""
@@ -39,29 +92,42 @@ class AgentHelpers:
     @staticmethod
     def _calculate_diversification(portfolio: Any) -> float:
         """Calculate diversification score (0-100)"""
-        if not portfolio.positions:
+        positions = portfolio.positions
+        if not len(positions):
             return 0
         
         # Protocol diversity
-        protocols = set(p.get("protocol") for p in portfolio.positions)
-        protocol_score = min(len(protocols) * 20, 60)
+        if isinstance(positions, PositionTable):
+            n_protocols = positions.distinct("protocol")
+        else:
+            n_protocols = len(set(p.get("protocol") for p in positions))
+        protocol_score = min(n_protocols * 20, 60)
         
         # Chain diversity
         chains = len(portfolio.chains)
         chain_score = min(chains * 10, 30)
         
         # Asset type diversity
-        asset_types = set(p.get("type") for p in portfolio.positions)
-        type_score = min(len(asset_types) * 5, 10)
+        if isinstance(positions, PositionTable):
+            n_types = positions.distinct("type")
+        else:
+            n_types = len(set(p.get("type") for p in positions))
+        type_score = min(n_types * 5, 10)
         
         return protocol_score + chain_score + type_score
     
     @staticmethod
     def _calculate_weighted_apy(positions: List[Dict]) -> float:
         """Calculate portfolio weighted average APY"""
-        if not positions:
+        if not len(positions):
             return 0
         
+        if isinstance(positions, PositionTable):
+            total_value = positions.value_usd.sum()
+            if total_value == 0:
+                return 0
+            return float(positions.apy @ positions.value_usd / total_value)
+        
         total_value = sum(p.get("value_usd", 0) for p in positions)
         if total_value == 0:
             return 0
@@ -125,31 +191,6 @@ class AgentHelpers:
         
         return True
     
-    @staticmethod
-    def _get_cached(cache: Any, key: str) -> Optional[Any]:
-        """Get value from cache"""
-        if hasattr(cache, 'get'):
-            try:
-                value = cache.get(key)
-                if value:
-                    return json.loads(value)
-            except:
-                pass
-        elif hasattr(cache, 'memory_cache'):
-            return cache.memory_cache.get(key)
-        return None
-    
-    @staticmethod
-    def _set_cached(cache: Any, key: str, value: Any, ttl: int = 3600):
-        """Set value in cache"""
-        if hasattr(cache, 'setex'):
-            try:
-                cache.setex(key, ttl, json.dumps(value, default=str))
-            except:
-                pass
-        elif hasattr(cache, 'memory_cache'):
-            cache.memory_cache[key] = value
-    
     @staticmethod
     def _generate_fallback_explanation(strategy: Any, portfolio: Any) -> str:
         """Generate fallback explanation when AI is not available"""
@@ -186,187 +227,231 @@ Always monitor your positions regularly and be prepared to exit if market condit
 class StrategyBuilder:
     """Build detailed strategies from templates"""
     
+    # Template key -> StrategyType value
+    TYPE_MAPPING = {
+        "eth_basis_trade": "basis_trade",
+        "bold_looping": "looping",
+        "stable_lp_concentrated": "liquidity_provision",
+        "pendle_pt": "principal_token_yield_token",
+        "lrt_maximizer": "staking",
+        "delta_neutral_farming": "delta_neutral",
+    }
+    
+    STEPS_MAP = {
+        "eth_basis_trade": [
+            "Buy spot ETH on Uniswap or 1inch",
+            "Open short position on GMX/Vertex/Drift",
+            "Monitor funding rates daily",
+            "Rebalance if funding goes negative",
+            "Close positions when funding normalizes"
+        ],
+        "bold_looping": [
+            "Deposit wstETH as collateral in Liquity V2",
+            "Borrow BOLD stablecoin at 0.5% rate",
+            "Convert BOLD to more wstETH via DEX",
+            "Repeat loop 3-4 times for leverage",
+            "Monitor health factor (keep above 1.5)"
+        ],
+        "stable_lp_concentrated": [
+            "Analyze current price range on Uniswap V3",
+            "Set tight range (0.995-1.005 for stables)",
+            "Provide liquidity equally in both tokens",
+            "Monitor position daily for range exits",
+            "Rebalance if price moves outside range"
+        ],
+        "pendle_pt": [
+            "Navigate to Pendle Finance",
+            "Select desired maturity date",
+            "Buy PT tokens at discount to face value",
+            "Hold until maturity for guaranteed yield",
+            "Redeem at maturity for underlying asset"
+        ],
+        "lrt_maximizer": [
+            "Stake ETH for stETH/rETH",
+            "Restake via EigenLayer",
+            "Deposit into Renzo/Kelp for ezETH/rsETH",
+            "Earn triple rewards (staking + restaking + LRT)",
+            "Compound rewards monthly"
+        ],
+        "delta_neutral_farming": [
+            "Deposit assets in high-APY farm",
+            "Borrow against position",
+            "Short equivalent amount on perp DEX",
+            "Maintain delta neutrality daily",
+            "Harvest and compound rewards"
+        ]
+    }
+    
+    TOKENS_MAP = {
+        "eth_basis_trade": ["ETH", "USDC"],
+        "bold_looping": ["wstETH", "BOLD"],
+        "stable_lp_concentrated": ["USDC", "USDT"],
+        "pendle_pt": ["USDC", "PT-TOKEN"],
+        "lrt_maximizer": ["ETH"],
+        "delta_neutral_farming": ["USDC", "ETH"]
+    }
+    
+    EXIT_MAP = {
+        "eth_basis_trade": [
+            "Close short position first",
+            "Sell spot ETH on DEX",
+            "Emergency exit via flashloan if needed"
+        ],
+        "bold_looping": [
+            "Unwind loops in reverse order",
+            "Repay BOLD debt",
+            "Withdraw wstETH collateral"
+        ],
+        "stable_lp_concentrated": [
+            "Remove liquidity from pool",
+            "Claim accumulated fees",
+            "Swap back to preferred stablecoin"
+        ],
+        "pendle_pt": [
+            "Wait for maturity (recommended)",
+            "Sell PT on secondary market (may incur loss)",
+            "Use PT as collateral elsewhere"
+        ],
+        "lrt_maximizer": [
+            "Unstake from LRT protocol",
+            "Wait for unbonding period",
+            "Withdraw ETH or swap LRT token"
+        ],
+        "delta_neutral_farming": [
+            "Close hedge positions",
+            "Withdraw from farm",
+            "Repay any borrowings"
+        ]
+    }
+    
+    CHAIN_MAP = {
+        "GMX": "Arbitrum",
+        "Vertex": "Arbitrum",
+        "Drift": "Solana",
+        "Liquity V2": "Ethereum",
+        "Fluid": "Ethereum",
+        "Uniswap V3": "Ethereum",
+        "Curve": "Ethereum",
+        "Pendle": "Arbitrum",
+        "EigenLayer": "Ethereum",
+        "Renzo": "Ethereum",
+        "Kelp": "Ethereum",
+        "Alpaca": "BSC",
+        "Francium": "Solana",
+        "Kamino": "Solana"
+    }
+    
+    REPUTABLE_PROTOCOLS = ["Aave V3", "Uniswap V3", "Curve"]
+    
+    @staticmethod
+    def precompute_skeletons(templates: Dict[str, Dict]) -> Dict[str, "StrategySkeleton"]:
+        """Precompute the portfolio-independent part of every template"""
+        return {
+            key: StrategyBuilder.build_skeleton(template, key)
+            for key, template in templates.items()
+        }
+    
+    @staticmethod
+    def build_skeleton(template: Dict, strategy_key: str) -> "StrategySkeleton":
+        """Derive steps, tokens, exits, chain, type and a content-addressed ID"""
+        from backend.ai.agent import StrategyType
+        
+        protocol = template["protocols"][0]
+        fields = {
+            "name": template["name"],
+            "type": StrategyType(StrategyBuilder.TYPE_MAPPING.get(strategy_key, "liquidity_provision")),
+            "protocol": protocol,
+            "chain": StrategyBuilder._get_chain_for_protocol(protocol),
+            "expected_apy": template["expected_apy"],
+            "risk_level": template["risk"],
+            "minimum_investment": 1000.0,  # Default
+            "gas_cost_usd": 50.0,  # Estimate
+            "il_exposure": template["il_exposure"],
+            "steps": tuple(StrategyBuilder._generate_steps(strategy_key, template)),
+            "required_tokens": tuple(StrategyBuilder._get_required_tokens(strategy_key)),
+            "exit_options": tuple(StrategyBuilder._get_exit_options(strategy_key)),
+        }
+        
+        # Same template content -> same ID, so results can be deduplicated
+        content = json.dumps(
+            {"key": strategy_key, **fields},
+            sort_keys=True,
+            default=lambda value: value.value
+        )
+        fields["id"] = hashlib.sha256(content.encode()).hexdigest()[:16]
+        
+        return StrategySkeleton(
+            key=strategy_key,
+            fields=fields,
+            base_confidence=StrategyBuilder._base_confidence(template)
+        )
+    
     @staticmethod
     async def build_strategy(
         template: Dict,
         portfolio: Any,
-        strategy_key: str
+        strategy_key: str,
+        skeleton: Optional["StrategySkeleton"] = None
     ) -> Any:
         """Build a complete strategy from template"""
-        from backend.ai.agent import YieldStrategy, StrategyType
-        
-        # Map template to strategy type
-        type_mapping = {
-            "eth_basis_trade": StrategyType.BASIS_TRADE,
-            "bold_looping": StrategyType.LOOPING,
-            "stable_lp_concentrated": StrategyType.LP,
-            "pendle_pt": StrategyType.PT_YT,
-            "lrt_maximizer": StrategyType.STAKING,
-            "delta_neutral_farming": StrategyType.DELTA_NEUTRAL,
-        }
-        
-        # Generate unique ID
-        strategy_id = hashlib.md5(
-            f"{strategy_key}:{portfolio.address}:{datetime.now().isoformat()}".encode()
-        ).hexdigest()[:8]
-        
-        # Build steps based on strategy type
-        steps = StrategyBuilder._generate_steps(strategy_key, template)
+        from backend.ai.agent import YieldStrategy
         
-        # Determine required tokens
-        required_tokens = StrategyBuilder._get_required_tokens(strategy_key)
-        
-        # Define exit options
-        exit_options = StrategyBuilder._get_exit_options(strategy_key)
-        
-        # Calculate confidence score
-        confidence = StrategyBuilder._calculate_confidence(template, portfolio)
+        if skeleton is None:
+            skeleton = StrategyBuilder.build_skeleton(template, strategy_key)
         
+        # Only the confidence score depends on the portfolio
         return YieldStrategy(
-            id=strategy_id,
-            name=template["name"],
-            type=type_mapping.get(strategy_key, StrategyType.LP),
-            protocol=template["protocols"][0],
-            chain=StrategyBuilder._get_chain_for_protocol(template["protocols"][0]),
-            expected_apy=template["expected_apy"],
-            risk_level=template["risk"],
-            minimum_investment=1000.0,  # Default
-            gas_cost_usd=50.0,  # Estimate
-            il_exposure=template["il_exposure"],
-            steps=steps,
-            required_tokens=required_tokens,
-            exit_options=exit_options,
-            confidence_score=confidence
+            **skeleton.strategy_fields(),
+            confidence_score=StrategyBuilder._calculate_confidence(
+                template, portfolio, skeleton.base_confidence
+            )
         )
     
     @staticmethod
     def _generate_steps(strategy_key: str, template: Dict) -> List[str]:
         """Generate detailed execution steps"""
-        steps_map = {
-            "eth_basis_trade": [
-                "Buy spot ETH on Uniswap or 1inch",
-                "Open short position on GMX/Vertex/Drift",
-                "Monitor funding rates daily",
-                "Rebalance if funding goes negative",
-                "Close positions when funding normalizes"
-            ],
-            "bold_looping": [
-                "Deposit wstETH as collateral in Liquity V2",
-                "Borrow BOLD stablecoin at 0.5% rate",
-                "Convert BOLD to more wstETH via DEX",
-                "Repeat loop 3-4 times for leverage",
-                "Monitor health factor (keep above 1.5)"
-            ],
-            "stable_lp_concentrated": [
-                "Analyze current price range on Uniswap V3",
-                "Set tight range (0.995-1.005 for stables)",
-                "Provide liquidity equally in both tokens",
-                "Monitor position daily for range exits",
-                "Rebalance if price moves outside range"
-            ],
-            "pendle_pt": [
-                "Navigate to Pendle Finance",
-                "Select desired maturity date",
-                "Buy PT tokens at discount to face value",
-                "Hold until maturity for guaranteed yield",
-                "Redeem at maturity for underlying asset"
-            ],
-            "lrt_maximizer": [
-                "Stake ETH for stETH/rETH",
-                "Restake via EigenLayer",
-                "Deposit into Renzo/Kelp for ezETH/rsETH",
-                "Earn triple rewards (staking + restaking + LRT)",
-                "Compound rewards monthly"
-            ],
-            "delta_neutral_farming": [
-                "Deposit assets in high-APY farm",
-                "Borrow against position",
-                "Short equivalent amount on perp DEX",
-                "Maintain delta neutrality daily",
-                "Harvest and compound rewards"
-            ]
-        }
-        
-        return steps_map.get(strategy_key, ["Execute strategy as per protocol documentation"])
+        return StrategyBuilder.STEPS_MAP.get(
+            strategy_key, ["Execute strategy as per protocol documentation"]
+        )
     
     @staticmethod
     def _get_required_tokens(strategy_key: str) -> List[str]:
         """Get required tokens for strategy"""
-        tokens_map = {
-            "eth_basis_trade": ["ETH", "USDC"],
-            "bold_looping": ["wstETH", "BOLD"],
-            "stable_lp_concentrated": ["USDC", "USDT"],
-            "pendle_pt": ["USDC", "PT-TOKEN"],
-            "lrt_maximizer": ["ETH"],
-            "delta_neutral_farming": ["USDC", "ETH"]
-        }
-        
-        return tokens_map.get(strategy_key, ["USDC"])
+        return StrategyBuilder.TOKENS_MAP.get(strategy_key, ["USDC"])
     
     @staticmethod
     def _get_exit_options(strategy_key: str) -> List[str]:
         """Get exit strategy options"""
-        exit_map = {
-            "eth_basis_trade": [
-                "Close short position first",
-                "Sell spot ETH on DEX",
-                "Emergency exit via flashloan if needed"
-            ],
-            "bold_looping": [
-                "Unwind loops in reverse order",
-                "Repay BOLD debt",
-                "Withdraw wstETH collateral"
-            ],
-            "stable_lp_concentrated": [
-                "Remove liquidity from pool",
-                "Claim accumulated fees",
-                "Swap back to preferred stablecoin"
-            ],
-            "pendle_pt": [
-                "Wait for maturity (recommended)",
-                "Sell PT on secondary market (may incur loss)",
-                "Use PT as collateral elsewhere"
-            ],
-            "lrt_maximizer": [
-                "Unstake from LRT protocol",
-                "Wait for unbonding period",
-                "Withdraw ETH or swap LRT token"
-            ],
-            "delta_neutral_farming": [
-                "Close hedge positions",
-                "Withdraw from farm",
-                "Repay any borrowings"
-            ]
-        }
-        
-        return exit_map.get(strategy_key, ["Withdraw from protocol", "Swap to stablecoin"])
+        return StrategyBuilder.EXIT_MAP.get(
+            strategy_key, ["Withdraw from protocol", "Swap to stablecoin"]
+        )
     
     @staticmethod
     def _get_chain_for_protocol(protocol: str) -> str:
         """Map protocol to primary chain"""
-        chain_map = {
-            "GMX": "Arbitrum",
-            "Vertex": "Arbitrum",
-            "Drift": "Solana",
-            "Liquity V2": "Ethereum",
-            "Fluid": "Ethereum",
-            "Uniswap V3": "Ethereum",
-            "Curve": "Ethereum",
-            "Pendle": "Arbitrum",
-            "EigenLayer": "Ethereum",
-            "Renzo": "Ethereum",
-            "Kelp": "Ethereum",
-            "Alpaca": "BSC",
-            "Francium": "Solana",
-            "Kamino": "Solana"
-        }
+        return StrategyBuilder.CHAIN_MAP.get(protocol, "Ethereum")
+    
+    @staticmethod
+    def _base_confidence(template: Dict) -> float:
+        """Portfolio-independent part of the confidence score"""
+        confidence = 70.0  # Base confidence
         
-        return chain_map.get(protocol, "Ethereum")
+        # Adjust based on protocol reputation
+        if template["protocols"][0] in StrategyBuilder.REPUTABLE_PROTOCOLS:
+            confidence += 15
+        
+        return confidence
     
     @staticmethod
-    def _calculate_confidence(template: Dict, portfolio: Any) -> float:
+    def _calculate_confidence(
+        template: Dict,
+        portfolio: Any,
+        base_confidence: Optional[float] = None
+    ) -> float:
         """Calculate strategy confidence score"""
-        confidence = 70.0  # Base confidence
+        if base_confidence is None:
+            base_confidence = StrategyBuilder._base_confidence(template)
+        confidence = base_confidence
         
         # Adjust based on risk match
         if template["risk"] == portfolio.risk_tolerance:
@@ -378,48 +463,88 @@ class StrategyBuilder:
         elif portfolio.total_value_usd < 1000:
             confidence -= 10
         
-        # Adjust based on protocol reputation
-        if template["protocols"][0] in ["Aave V3", "Uniswap V3", "Curve"]:
-            confidence += 15
-        
         return min(100, max(0, confidence))
 
 
 class OpportunityFinder:
     """Find yield opportunities based on portfolio"""
     
+    # Positions below this APY get an upgrade suggestion
+    UPGRADE_APY_THRESHOLD = 10
+    UPGRADE_PROTOCOL = "Pendle"
+    UPGRADE_APY = 15.0
+    
+    # Where idle capital gets deployed
+    DEPLOY_PROTOCOL = "Liquity V2"
+    DEPLOY_APY = 21.0
+    
     @staticmethod
     async def find_opportunities(portfolio: Any) -> List[Any]:
         """Find optimization opportunities for portfolio"""
         opportunities = []
         
+        if isinstance(portfolio.positions, PositionTable):
+            return OpportunityFinder._find_in_table(portfolio)
+        
         # Analyze current positions
         for position in portfolio.positions:
             current_apy = position.get("apy", 0)
             
             # Look for better alternatives
-            if current_apy < 10:
+            if current_apy < OpportunityFinder.UPGRADE_APY_THRESHOLD:
                 # Suggest upgrade opportunities
-                opportunity = {
-                    "action": "upgrade",
-                    "from_protocol": position.get("protocol"),
-                    "to_protocol": "Pendle",
-                    "expected_apy": 15.0,
-                    "improvement": 15.0 - current_apy,
-                    "description": f"Migrate from {position.get('protocol')} to higher yield"
-                }
-                opportunities.append(opportunity)
+                opportunities.append(OpportunityFinder.upgrade_opportunity(
+                    position.get("protocol"), current_apy
+                ))
         
         # Suggest new positions for idle capital
-        if portfolio.total_value_usd > sum(p.get("value_usd", 0) for p in portfolio.positions):
-            idle_capital = portfolio.total_value_usd - sum(p.get("value_usd", 0) for p in portfolio.positions)
-            opportunity = {
-                "action": "deploy",
-                "amount": idle_capital,
-                "suggested_protocol": "Liquity V2",
-                "expected_apy": 21.0,
-                "description": f"Deploy ${idle_capital:,.0f} idle capital for yield"
-            }
-            opportunities.append(opportunity)
-        
-        return opportunities
\ No newline at end of file
+        invested = sum(p.get("value_usd", 0) for p in portfolio.positions)
+        if portfolio.total_value_usd > invested:
+            opportunities.append(OpportunityFinder.deploy_opportunity(
+                portfolio.total_value_usd - invested
+            ))
+        
+        return opportunities
+    
+    @staticmethod
+    def _find_in_table(portfolio: Any) -> List[Any]:
+        """find_opportunities over a PositionTable"""
+        table = portfolio.positions
+        low = np.flatnonzero(table.apy < OpportunityFinder.UPGRADE_APY_THRESHOLD)
+        protocols = table.pool.values
+        opportunities = [
+            OpportunityFinder.upgrade_opportunity(protocols[code], apy)
+            for code, apy in zip(table.protocol[low].tolist(), table.apy[low].tolist())
+        ]
+        
+        # Sequential sum, same rounding as the List[Dict] path
+        invested = sum(table.value_usd.tolist())
+        if portfolio.total_value_usd > invested:
+            opportunities.append(OpportunityFinder.deploy_opportunity(
+                portfolio.total_value_usd - invested
+            ))
+        
+        return opportunities
+    
+    @staticmethod
+    def upgrade_opportunity(protocol: Optional[str], current_apy: float) -> Dict[str, Any]:
+        """Suggestion to migrate a low-yield position"""
+        return {
+            "action": "upgrade",
+            "from_protocol": protocol,
+            "to_protocol": OpportunityFinder.UPGRADE_PROTOCOL,
+            "expected_apy": OpportunityFinder.UPGRADE_APY,
+            "improvement": OpportunityFinder.UPGRADE_APY - current_apy,
+            "description": f"Migrate from {protocol} to higher yield"
+        }
+    
+    @staticmethod
+    def deploy_opportunity(idle_capital: float) -> Dict[str, Any]:
+        """Suggestion to put idle capital to work"""
+        return {
+            "action": "deploy",
+            "amount": idle_capital,
+            "suggested_protocol": OpportunityFinder.DEPLOY_PROTOCOL,
+            "expected_apy": OpportunityFinder.DEPLOY_APY,
+            "description": f"Deploy ${idle_capital:,.0f} idle capital for yield"
+        }
@@ -0,0 +1,226 @@
+"""
+Batch portfolio analysis for OpusAIAgent
+Risk, diversification and weighted APY for many portfolios in columnar form
+"""
+
+import gc
+from contextlib import contextmanager
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.ai.agent_helpers import OpportunityFinder
+from backend.ai.positions import PositionTable
+
+# RiskLevel value -> risk score adjustment (see AgentHelpers._calculate_risk_score)
+_TOLERANCE_ADJUSTMENT = {"high": 10.0, "low": -20.0}
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """
+    Pause the cyclic collector while allocating large numbers of acyclic
+    objects (result dicts); otherwise it re-scans them over and over
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class PortfolioBatch:
+    """
+    Many portfolios flattened into per-portfolio and per-position columns.
+    Positions are grouped by owner through an integer portfolio index.
+    """
+
+    def __init__(self, portfolios: Sequence[Any]):
+        self.portfolios = portfolios
+        n = len(portfolios)
+
+        # Per-portfolio columns (a table's row count read off its ids array,
+        # skipping PositionTable.__len__)
+        tables = [p.positions for p in portfolios]
+        columnar = bool(tables) and all(isinstance(t, PositionTable) for t in tables)
+        counts = np.fromiter(map(len, [t.ids for t in tables] if columnar else tables), np.int64, n)
+        self.n_chains = np.fromiter((len(p.chains) for p in portfolios), np.int64, n)
+        self.tolerance = np.fromiter(
+            (_TOLERANCE_ADJUSTMENT.get(p.risk_tolerance.value, 0.0) for p in portfolios),
+            np.float64, n
+        )
+        self.total_value = np.fromiter(
+            (p.total_value_usd for p in portfolios), np.float64, n
+        )
+
+        # Per-position columns; owner links each row to its portfolio
+        self.owner = np.repeat(np.arange(n, dtype=np.int64), counts)
+        if columnar:
+            self._from_tables(tables)
+        else:
+            self._from_dicts(tables)
+
+        self.size = n
+        self.counts = counts
+
+    def _from_tables(self, tables: List[PositionTable]):
+        """Position columns from PositionTables: concatenation, no per-row work"""
+        merged = PositionTable.concat(tables, keys=("value_usd", "apy", "protocol", "type"))
+        self.value_usd = merged.value_usd
+        self.apy = merged.apy
+        self.protocol = merged.protocol.astype(np.int64)
+        self.type = merged.type.astype(np.int64)
+        self.protocol_names = merged.pool.values
+
+    def _from_dicts(self, position_lists: List[Any]):
+        """Position columns from List[Dict] (or mixed) positions"""
+        flat = list(chain.from_iterable(position_lists))
+        m = len(flat)
+        self.value_usd = np.fromiter((p.get("value_usd", 0) for p in flat), np.float64, m)
+        self.apy = np.fromiter((p.get("apy", 0) for p in flat), np.float64, m)
+
+        # Interned codes for protocols and position types (None included)
+        self.protocol, self.protocol_names = self._intern([p.get("protocol") for p in flat])
+        self.type, _ = self._intern([p.get("type") for p in flat])
+
+    @staticmethod
+    def _intern(values: List[Any]) -> Tuple[np.ndarray, List[Any]]:
+        """Integer codes (in first-seen order) and the distinct values they index"""
+        names = list(dict.fromkeys(values))
+        codes = {name: code for code, name in enumerate(names)}
+        return np.fromiter(map(codes.__getitem__, values), np.int64, len(values)), names
+
+    def _distinct_per_portfolio(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Number of distinct codes held by each portfolio: distinct
+        (owner, code) pairs, counted per owner
+        """
+        if not len(codes):
+            return np.zeros(self.size, dtype=np.int64)
+        # Sized by the codes present, not the pool they came from
+        n_codes = int(codes.max()) + 1
+        # Rows are already grouped by owner, so a stable (run-merging) sort
+        # only has to order codes within each portfolio
+        pairs = np.sort(self.owner * n_codes + codes, kind="stable")
+        first = np.empty(len(pairs), dtype=bool)
+        first[0] = True
+        np.not_equal(pairs[1:], pairs[:-1], out=first[1:])
+        return np.bincount(pairs[first] // n_codes, minlength=self.size)
+
+    def risk_scores(self) -> np.ndarray:
+        """Vectorized AgentHelpers._calculate_risk_score"""
+        score = np.full(self.size, 50.0)
+        score += np.where(self.counts < 3, 20.0, np.where(self.counts > 10, -10.0, 0.0))
+        score += np.where(self.n_chains == 1, 15.0, np.where(self.n_chains > 3, -15.0, 0.0))
+        score += self.tolerance
+        return np.clip(score, 0, 100)
+
+    def diversification_scores(self) -> np.ndarray:
+        """Vectorized AgentHelpers._calculate_diversification"""
+        protocols = self._distinct_per_portfolio(self.protocol)
+        types = self._distinct_per_portfolio(self.type)
+        score = (
+            np.minimum(protocols * 20, 60)
+            + np.minimum(self.n_chains * 10, 30)
+            + np.minimum(types * 5, 10)
+        )
+        return np.where(self.counts > 0, score, 0)
+
+    def invested_value(self) -> np.ndarray:
+        return np.bincount(self.owner, weights=self.value_usd, minlength=self.size)
+
+    def weighted_apys(self) -> np.ndarray:
+        """Vectorized AgentHelpers._calculate_weighted_apy"""
+        invested = self.invested_value()
+        weighted = np.bincount(
+            self.owner, weights=self.apy * self.value_usd, minlength=self.size
+        )
+        safe = np.where(invested != 0, invested, 1.0)
+        return np.where(invested != 0, weighted / safe, 0.0)
+
+    @classmethod
+    def analyze_all(
+        cls,
+        portfolios: Sequence[Any],
+        max_recommendations: int = 3,
+        upgrade_apy: Optional[float] = None,
+        deploy_apy: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Build the batch and analyze it with the collector paused"""
+        with gc_paused():
+            return cls(portfolios).analyze(max_recommendations, upgrade_apy, deploy_apy)
+
+    def analyze(
+        self,
+        max_recommendations: int = 3,
+        upgrade_apy: Optional[float] = None,
+        deploy_apy: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        analyze_portfolio results for every portfolio, in input order.
+        upgrade_apy / deploy_apy replace the expected APY of an upgrade or
+        deploy opportunity in optimization_potential (recorded APY history).
+        """
+        risk = self.risk_scores()
+        diversification = self.diversification_scores()
+        current_apy = self.weighted_apys()
+        idle = self.total_value - self.invested_value()
+
+        # Upgrade candidates, ranked by position order within each portfolio
+        low = self.apy < OpportunityFinder.UPGRADE_APY_THRESHOLD
+        low_rows = np.flatnonzero(low)
+        low_owner = self.owner[low_rows]
+        n_low = np.bincount(low_owner, minlength=self.size)
+        first_low = np.concatenate([[0], np.cumsum(n_low)[:-1]])
+        rank = np.arange(len(low_rows)) - first_low[low_owner]
+        shown = low_rows[rank < max_recommendations]
+
+        # optimization_potential compares against the first opportunity
+        if upgrade_apy is None:
+            upgrade_apy = OpportunityFinder.UPGRADE_APY
+        if deploy_apy is None:
+            deploy_apy = OpportunityFinder.DEPLOY_APY
+        best_apy = np.where(
+            n_low > 0,
+            upgrade_apy,
+            np.where(idle > 0, deploy_apy, np.nan)
+        )
+        potential = np.where(np.isnan(best_apy), 0.0, best_apy - current_apy)
+
+        # Upgrade suggestions differ per protocol only in "improvement", so
+        # each one is a copy of a per-protocol template (no f-string per row)
+        templates = [
+            OpportunityFinder.upgrade_opportunity(name, 0.0) for name in self.protocol_names
+        ]
+        upgrades = []
+        for protocol, apy in zip(self.protocol[shown].tolist(), self.apy[shown].tolist()):
+            upgrade = templates[protocol].copy()
+            upgrade["improvement"] -= apy
+            upgrades.append(upgrade)
+
+        # shown rows are grouped by owner: slice each portfolio's share
+        bounds = np.concatenate([[0], np.cumsum(np.minimum(n_low, max_recommendations))]).tolist()
+        recommendations = [upgrades[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        deploying = np.flatnonzero((idle > 0) & (n_low < max_recommendations))
+        for owner, capital in zip(deploying.tolist(), idle[deploying].tolist()):
+            recommendations[owner].append(OpportunityFinder.deploy_opportunity(capital))
+
+        return [
+            {
+                "total_value": portfolio.total_value_usd,
+                "risk_score": score,
+                "diversification_score": div,
+                "optimization_potential": gain,
+                "recommendations": recs
+            }
+            for portfolio, score, div, gain, recs in zip(
+                self.portfolios,
+                risk.tolist(),
+                diversification.tolist(),
+                potential.tolist(),
+                recommendations
+            )
+        ]
@@ -0,0 +1,97 @@
+"""
+Batch analysis benchmark: analyze_portfolios vs one analyze_portfolio coroutine per wallet
+
+Portfolios held as PositionTable slices clear 10x at 100k wallets. List[Dict]
+positions land around 7-8x: reading four keys from every position dict and
+building the result dicts are per-object Python work that both paths share.
+
+Run from the repository root:
+    python -m backend.ai.benchmarks.bench_batch_analysis --portfolios 100000
+"""
+
+import argparse
+import asyncio
+import math
+import tempfile
+import time
+
+from backend.ai.agent import OpusAIAgent
+from backend.ai.agent_helpers import OpportunityFinder
+from backend.ai.batch_analysis import PortfolioBatch, gc_paused
+from backend.ai.benchmarks.synthetic import generate_portfolios
+from backend.ai.timeseries import SeriesStore
+
+
+def _close(a, b) -> bool:
+    """Equal up to float rounding, with identical types throughout"""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_close(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_close(x, y) for x, y in zip(a, b))
+    if isinstance(a, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+async def _run(n: int):
+    agent = OpusAIAgent()
+    portfolios = generate_portfolios(n, as_dicts=True)
+
+    started = time.perf_counter()
+    single = await asyncio.gather(*(agent.analyze_portfolio(p) for p in portfolios))
+    single_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = await agent.analyze_portfolios(portfolios)
+    batch_seconds = time.perf_counter() - started
+
+    # Where the batch time goes: dict ingestion vs vectorized analysis
+    with gc_paused():
+        started = time.perf_counter()
+        columns = PortfolioBatch(portfolios)
+        ingest_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        columns.analyze()
+        analyze_seconds = time.perf_counter() - started
+
+    # Same portfolios with positions held as slice views of one PositionTable
+    tabled = generate_portfolios(n)
+    started = time.perf_counter()
+    table_batch = await agent.analyze_portfolios(tabled)
+    table_seconds = time.perf_counter() - started
+
+    assert _close(single, batch), "batch results differ from analyze_portfolio"
+    assert _close(single, table_batch), "PositionTable results differ from analyze_portfolio"
+
+    # Both paths prefer the recorded APY of the suggested protocol
+    with tempfile.TemporaryDirectory() as root:
+        agent.apy_history = SeriesStore(root)
+        for day in range(agent.config["history_min_samples"]):
+            agent.apy_history.append(OpportunityFinder.UPGRADE_PROTOCOL, day * 86400, 12.0 + day % 3)
+            agent.apy_history.append(OpportunityFinder.DEPLOY_PROTOCOL, day * 86400, 18.0 - day % 5)
+        sample = portfolios[:1000]
+        single = await asyncio.gather(*(agent.analyze_portfolio(p) for p in sample))
+        batch = await agent.analyze_portfolios(sample)
+        agent.apy_history.close()
+    assert _close(single, batch), "batch results ignore the APY history"
+    print(f"{n} portfolios, {sum(len(p.positions) for p in portfolios)} positions")
+    print(f"  analyze_portfolio x{n}: {single_seconds:8.3f} s  ({n / single_seconds:,.0f}/s)")
+    print(f"  analyze_portfolios:    {batch_seconds:8.3f} s  ({n / batch_seconds:,.0f}/s)")
+    print(f"  speedup: {single_seconds / batch_seconds:.1f}x")
+    print(f"    dict -> columns:     {ingest_seconds:8.3f} s")
+    print(f"    vectorized analyze:  {analyze_seconds:8.3f} s")
+    print(f"  analyze_portfolios (PositionTable): {table_seconds:8.3f} s  "
+          f"({n / table_seconds:,.0f}/s, {single_seconds / table_seconds:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--portfolios", type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(_run(args.portfolios))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Cache codec benchmark: binary codec vs the previous json.dumps(default=str) path
+
+The previous path stored dataclasses as their repr strings, so its decode
+time is for one string, not the objects. "typed json" is the JSON round
+trip that does rebuild them: fields as JSON, then dataclasses and enums.
+
+Run from the repository root:
+    python -m backend.ai.benchmarks.bench_codec
+"""
+
+import argparse
+import asyncio
+import json
+import timeit
+from dataclasses import fields, is_dataclass
+from enum import Enum
+
+from backend.ai import codec
+from backend.ai.agent import OpusAIAgent, Portfolio, RiskLevel, StrategyType, YieldStrategy
+
+
+def _legacy_encode(value):
+    return json.dumps(value, default=str)
+
+
+def _plain(value):
+    if is_dataclass(value):
+        return {field.name: getattr(value, field.name) for field in fields(value)}
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(type(value))
+
+
+def _typed_encode(value):
+    return json.dumps(value, separators=(",", ":"), default=_plain)
+
+
+def _strategies_decode(text):
+    return [
+        YieldStrategy(**{
+            **fields_,
+            "type": StrategyType(fields_["type"]),
+            "risk_level": RiskLevel(fields_["risk_level"])
+        })
+        for fields_ in json.loads(text)
+    ]
+
+
+def _portfolio_decode(text):
+    fields_ = json.loads(text)
+    return Portfolio(**{**fields_, "risk_tolerance": RiskLevel(fields_["risk_tolerance"])})
+
+
+def _sample_strategies():
+    agent = OpusAIAgent()
+    portfolio = Portfolio(
+        address="0xbench",
+        total_value_usd=25000.0,
+        positions=[],
+        chains=["Ethereum", "Arbitrum"],
+        risk_tolerance=RiskLevel.MEDIUM,
+        preferred_protocols=["Aave V3"]
+    )
+    return asyncio.run(agent.get_strategy_recommendation(portfolio))
+
+
+def _sample_portfolio(n_positions: int) -> Portfolio:
+    protocols = ["Aave V3", "Uniswap V3", "Curve", "Pendle", "GMX"]
+    chains = ["Ethereum", "Arbitrum", "Base"]
+    positions = [
+        {
+            "id": f"pos-{i}",
+            "protocol": protocols[i % len(protocols)],
+            "chain": chains[i % len(chains)],
+            "type": "lp" if i % 2 else "lending",
+            "value_usd": 1000.0 + i,
+            "apy": 3.5 + (i % 17),
+            "il_percentage": (i % 7) * 0.8,
+            "health_factor": 1.2 + (i % 5) * 0.3,
+        }
+        for i in range(n_positions)
+    ]
+    return Portfolio(
+        address="0xbench",
+        total_value_usd=sum(p["value_usd"] for p in positions),
+        positions=positions,
+        chains=chains,
+        risk_tolerance=RiskLevel.HIGH,
+        preferred_protocols=protocols[:2]
+    )
+
+
+def _bench(label: str, value, typed_decode, number: int):
+    legacy = _legacy_encode(value)
+    typed = _typed_encode(value)
+    binary = codec.encode(value)
+    assert codec.decode(binary) == value, f"{label}: codec round trip mismatch"
+    assert typed_decode(typed) == value, f"{label}: typed json round trip mismatch"
+
+    rows = [
+        ("json encode", timeit.timeit(lambda: _legacy_encode(value), number=number)),
+        ("json decode", timeit.timeit(lambda: json.loads(legacy), number=number)),
+        ("typed json enc", timeit.timeit(lambda: _typed_encode(value), number=number)),
+        ("typed json dec", timeit.timeit(lambda: typed_decode(typed), number=number)),
+        ("codec encode", timeit.timeit(lambda: codec.encode(value), number=number)),
+        ("codec decode", timeit.timeit(lambda: codec.decode(binary), number=number)),
+    ]
+    print(f"\n{label}")
+    print(f"  payload: json {len(legacy.encode())} B, typed json {len(typed.encode())} B, "
+          f"codec {len(binary)} B ({len(binary) / len(legacy.encode()):.0%} of json)")
+    for name, seconds in rows:
+        print(f"  {name:<15} {seconds / number * 1e6:9.2f} us/op")
+    # The legacy path cannot rebuild dataclasses/enums from a Redis hit
+    print(f"  json round trip exact: {json.loads(legacy) == value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--positions", type=int, default=200)
+    args = parser.parse_args()
+
+    _bench("YieldStrategy list (top 5)", _sample_strategies(), _strategies_decode, args.number)
+    _bench(f"Portfolio ({args.positions} positions)",
+           _sample_portfolio(args.positions), _portfolio_decode, max(1, args.number // 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Startup benchmark: time to import backend.ai.agent and construct OpusAIAgent
+
+Each run is a fresh interpreter, so module caches never hide import cost.
+With budgets set, exits non-zero when the median exceeds them (usable in CI).
+
+Run from the repository root:
+    python -m backend.ai.benchmarks.bench_startup --import-budget-ms 400 --construct-budget-ms 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_PROBE = """
+import json, time
+started = time.perf_counter()
+from backend.ai.agent import OpusAIAgent
+imported = time.perf_counter()
+agent = OpusAIAgent()
+constructed = time.perf_counter()
+agent.providers
+first_use = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1e3,
+    "construct_ms": (constructed - imported) * 1e3,
+    "providers_ms": (first_use - constructed) * 1e3,
+}))
+"""
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+
+def run_once() -> dict:
+    """Timings from one fresh interpreter"""
+    env = dict(os.environ, PYTHONPATH=_ROOT)
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=_ROOT, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--import-budget-ms", type=float, default=None)
+    parser.add_argument("--construct-budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    # The first run warms the bytecode cache and the OS page cache
+    run_once()
+    samples = [run_once() for _ in range(args.runs)]
+    medians = {
+        name: statistics.median(sample[name] for sample in samples)
+        for name in samples[0]
+    }
+    for name, value in medians.items():
+        print(f"  {name:<13} {value:9.2f} ms (median of {args.runs})")
+
+    failures = [
+        f"{name} {medians[name]:.2f} ms > budget {budget:.2f} ms"
+        for name, budget in (
+            ("import_ms", args.import_budget_ms),
+            ("construct_ms", args.construct_budget_ms),
+        )
+        if budget is not None and medians[name] > budget
+    ]
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Hot-path benchmark suite: seeded synthetic data, simulated LLM providers, JSON results
+
+Run from the repository root:
+    python -m backend.ai.benchmarks.bench_suite --output bench.json
+    python -m backend.ai.benchmarks.bench_suite --compare bench.json --tolerance 0.25
+
+With --compare, exits non-zero when any p50 regresses by more than the tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+import numpy as np
+
+from backend.ai.agent import OpusAIAgent, Portfolio, RiskLevel
+from backend.ai.benchmarks.fake_provider import FakeProvider, install
+from backend.ai.benchmarks.synthetic import generate_portfolios, generate_positions
+
+RESULTS_VERSION = 1
+
+
+def latency_stats(seconds: Sequence[float]) -> Dict[str, float]:
+    """Per-call latency summary in milliseconds"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1e3
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "max_ms": float(ms.max()),
+    }
+
+
+async def _timed(call: Callable[[], Awaitable[Any]], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def bench_recommend(agent: OpusAIAgent, n: int, seed: int) -> Dict[str, Any]:
+    portfolios = generate_portfolios(n, seed=seed)
+    results = {}
+    # Cold: every address misses the cache
+    samples = []
+    for portfolio in portfolios:
+        started = time.perf_counter()
+        await agent.get_strategy_recommendation(portfolio)
+        samples.append(time.perf_counter() - started)
+    results["get_strategy_recommendation.cold"] = latency_stats(samples)
+    warm = portfolios[0]
+    results["get_strategy_recommendation.warm"] = latency_stats(
+        await _timed(lambda: agent.get_strategy_recommendation(warm), n)
+    )
+
+    fresh = generate_portfolios(n, seed=seed + 1000)
+    started = time.perf_counter()
+    await agent.get_strategy_recommendations(fresh)
+    results["get_strategy_recommendations.batch"] = {
+        "n": n, "total_ms": (time.perf_counter() - started) * 1e3,
+    }
+    return results
+
+
+async def bench_analyze(
+    agent: OpusAIAgent,
+    scales: Sequence[int],
+    repeat: int,
+    seed: int
+) -> Dict[str, Any]:
+    results = {}
+    for n in scales:
+        positions = generate_positions(n, seed)
+        portfolio = Portfolio(
+            address=f"0xanalyze{n}",
+            total_value_usd=float(positions.value_usd.sum()) + 5000.0,
+            positions=positions,
+            chains=["Ethereum", "Arbitrum"],
+            risk_tolerance=RiskLevel.MEDIUM,
+            preferred_protocols=[]
+        )
+        results[f"analyze_portfolio.positions_{n}"] = latency_stats(
+            await _timed(lambda: agent.analyze_portfolio(portfolio), _repeat_for(n, repeat))
+        )
+
+    portfolios = generate_portfolios(10000, seed=seed)
+    results["analyze_portfolios.portfolios_10000"] = latency_stats(
+        await _timed(lambda: agent.analyze_portfolios(portfolios), max(1, repeat // 10))
+    )
+    return results
+
+
+async def bench_monitor(
+    agent: OpusAIAgent,
+    scales: Sequence[int],
+    repeat: int,
+    seed: int
+) -> Dict[str, Any]:
+    results = {}
+    for n in scales:
+        table = generate_positions(n, seed)
+        results[f"monitor_positions.positions_{n}"] = latency_stats(
+            await _timed(lambda: agent.monitor_positions(table), _repeat_for(n, repeat))
+        )
+    return results
+
+
+async def bench_risk(agent: OpusAIAgent, repeat: int, seed: int) -> Dict[str, Any]:
+    portfolio = generate_portfolios(1, seed=seed)[0]
+    strategies = await agent.get_strategy_recommendation(portfolio)
+    engine = agent.risk_engine
+
+    async def cold():
+        # Drop cached summaries and shocks so every call simulates
+        engine.cache.clear()
+        engine._shocks = None
+        await agent.calculate_risk_metrics(strategies[0], 10000.0)
+
+    results = {"calculate_risk_metrics.cold": latency_stats(await _timed(cold, max(3, repeat // 4)))}
+    results["calculate_risk_metrics.warm"] = latency_stats(await _timed(
+        lambda: agent.calculate_risk_metrics(strategies[0], 10000.0), repeat
+    ))
+
+    async def batch_cold():
+        engine.cache.clear()
+        await agent.calculate_risk_metrics_batch(strategies, [1000.0, 10000.0, 100000.0])
+
+    results[f"calculate_risk_metrics_batch.cold_{len(strategies)}x3"] = latency_stats(
+        await _timed(batch_cold, max(3, repeat // 4))
+    )
+    return results
+
+
+async def bench_explain(
+    agent: OpusAIAgent,
+    concurrency: Sequence[int],
+    time_scale: float,
+    seed: int
+) -> Dict[str, Any]:
+    """explain_strategy throughput against simulated providers, cache cleared per level"""
+    install(agent, [
+        FakeProvider("anthropic", time_scale=time_scale, seed=seed),
+        FakeProvider("openai", time_scale=time_scale, seed=seed + 1),
+    ])
+    portfolio = generate_portfolios(1, seed=seed)[0]
+    strategies = await agent.get_strategy_recommendation(portfolio)
+    results = {}
+    for level in concurrency:
+        agent.response_cache.local.clear()
+        samples: List[float] = []
+
+        async def one(i: int):
+            started = time.perf_counter()
+            await agent.explain_strategy(strategies[i % len(strategies)], portfolio)
+            samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(level)))
+        wall = time.perf_counter() - started
+        results[f"explain_strategy.concurrency_{level}"] = {
+            **latency_stats(samples),
+            "wall_ms": wall * 1e3,
+            "calls_per_second": level / wall,
+        }
+
+        agent.response_cache.local.clear()
+        first_chunk: List[float] = []
+
+        async def stream(i: int):
+            started = time.perf_counter()
+            async for _ in agent.explain_strategy_stream(strategies[i % len(strategies)], portfolio):
+                if len(first_chunk) < level:
+                    first_chunk.append(time.perf_counter() - started)
+                break
+
+        await asyncio.gather(*(stream(i) for i in range(level)))
+        results[f"explain_strategy_stream.first_chunk.concurrency_{level}"] = latency_stats(first_chunk)
+    results["explain_strategy.time_scale"] = time_scale
+    return results
+
+
+def _repeat_for(n: int, repeat: int) -> int:
+    # Fewer repeats at large scales keep the suite's runtime bounded
+    return max(3, min(repeat, int(repeat * 1000 / max(n, 1000))))
+
+
+def _metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "version": RESULTS_VERSION,
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Benchmarks whose p50 grew by more than tolerance (a fraction) since baseline"""
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not isinstance(result, dict) or not isinstance(before, dict):
+            continue
+        if "p50_ms" not in result or "p50_ms" not in before:
+            continue
+        ratio = result["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 1.0
+        marker = "REGRESSED" if ratio > 1 + tolerance else ""
+        print(f"  {name:<58} {before['p50_ms']:10.3f} -> {result['p50_ms']:10.3f} ms "
+              f"({ratio:5.2f}x) {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    agent = OpusAIAgent()
+    scales = [int(s) for s in args.scales.split(",")]
+    suites = {
+        "recommend": lambda: bench_recommend(agent, args.portfolios, args.seed),
+        "analyze": lambda: bench_analyze(agent, scales, args.repeat, args.seed),
+        "monitor": lambda: bench_monitor(agent, scales, args.repeat, args.seed),
+        "risk": lambda: bench_risk(agent, args.repeat, args.seed),
+        "explain": lambda: bench_explain(
+            agent, [int(c) for c in args.concurrency.split(",")], args.time_scale, args.seed
+        ),
+    }
+    results: Dict[str, Any] = {}
+    for name in args.only.split(",") if args.only else suites:
+        started = time.perf_counter()
+        results.update(await suites[name]())
+        print(f"{name}: {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return {"meta": _metadata(args), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", default="10,1000,100000",
+                        help="position counts for analyze/monitor, e.g. 10,1000,100000,1000000")
+    parser.add_argument("--portfolios", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", default="1,16,64,256")
+    parser.add_argument("--time-scale", type=float, default=0.05,
+                        help="factor applied to simulated provider latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", default=None, help="comma-separated: recommend,analyze,monitor,risk,explain")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    for name, result in report["results"].items():
+        if isinstance(result, dict) and "p50_ms" in result:
+            print(f"  {name:<58} p50 {result['p50_ms']:10.3f} ms  p95 {result['p95_ms']:10.3f} ms")
+        else:
+            print(f"  {name:<58} {result}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        print(f"\nvs {baseline['meta'].get('commit')}:")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the Anthropic/OpenAI providers in benchmarks
+Sleeps through a sampled time-to-first-token and per-token generation time, no network
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List
+
+from backend.ai.providers import LLMProvider
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    """Lognormal time to first token plus a lognormal output rate"""
+    ttft_median: float
+    ttft_sigma: float
+    tokens_per_second: float
+    rate_sigma: float
+
+
+# Rough shapes of hosted-API latency for ~300-token answers: a long,
+# right-skewed wait for the first token, then steady streaming
+LATENCY_PROFILES = {
+    "anthropic": LatencyProfile(ttft_median=0.9, ttft_sigma=0.45, tokens_per_second=55.0, rate_sigma=0.2),
+    "openai": LatencyProfile(ttft_median=0.6, ttft_sigma=0.6, tokens_per_second=70.0, rate_sigma=0.3),
+}
+
+_VOCABULARY = (
+    "yield collateral liquidity position risk protocol vault leverage hedge "
+    "rebalance exit APY fees gas bridge oracle funding rate stablecoin"
+).split()
+
+
+class FakeProviderError(Exception):
+    """Injected provider failure"""
+
+
+class FakeProvider(LLMProvider):
+    """
+    LLMProvider whose calls take as long as the profile says. time_scale
+    shrinks every delay (0.01 runs a 1s call in 10ms); error_rate fails
+    that fraction of calls after their time-to-first-token.
+    """
+
+    def __init__(
+        self,
+        profile: str = "anthropic",
+        output_tokens: int = 300,
+        time_scale: float = 1.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        **kwargs: Any
+    ):
+        super().__init__(f"fake-{profile}", **kwargs)
+        self.name = profile
+        self.profile = LATENCY_PROFILES[profile]
+        self.output_tokens = output_tokens
+        self.time_scale = time_scale
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def _sample(self):
+        """(time to first token, seconds per token, fails) for one call"""
+        profile = self.profile
+        ttft = self._rng.lognormvariate(0.0, profile.ttft_sigma) * profile.ttft_median
+        rate = self._rng.lognormvariate(0.0, profile.rate_sigma) * profile.tokens_per_second
+        return ttft * self.time_scale, self.time_scale / rate, self._rng.random() < self.error_rate
+
+    def _words(self) -> List[str]:
+        return [self._rng.choice(_VOCABULARY) for _ in range(self.output_tokens)]
+
+    async def _complete(self, prompt: str) -> str:
+        self.calls += 1
+        ttft, per_token, fails = self._sample()
+        await asyncio.sleep(ttft)
+        if fails:
+            raise FakeProviderError(f"{self.name} injected failure")
+        await asyncio.sleep(per_token * self.output_tokens)
+        return " ".join(self._words())
+
+    async def _stream(self, prompt: str, chunk_tokens: int = 8) -> AsyncIterator[str]:
+        self.calls += 1
+        ttft, per_token, fails = self._sample()
+        await asyncio.sleep(ttft)
+        if fails:
+            raise FakeProviderError(f"{self.name} injected failure")
+        words = self._words()
+        for start in range(0, len(words), chunk_tokens):
+            if start:
+                await asyncio.sleep(per_token * chunk_tokens)
+            yield " ".join(words[start:start + chunk_tokens]) + " "
+
+
+def install(agent: Any, providers: List[LLMProvider]):
+    """Make agent use providers (first is primary) instead of the real clients"""
+    with agent._clients_lock:
+        agent._providers = list(providers)
+        agent._anthropic_client = None
+        agent._openai_client = None
+        agent._hedger = None
+        agent._clients_ready = True
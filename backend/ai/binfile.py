@@ -0,0 +1,72 @@
+"""
+Aligned binary section files for OpusAIAgent's on-disk indexes
+A fixed header followed by 8-byte aligned NumPy arrays, read back as mmap views
+"""
+
+import os
+import struct
+from typing import Any, Sequence, Tuple
+
+import numpy as np
+
+_ALIGN = 8
+
+
+def write_sections(path: str, header: bytes, sections: Sequence[np.ndarray]):
+    """Write header and arrays to path atomically (readers never see a partial file)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for section in sections:
+            f.write(b"\0" * (-f.tell() % _ALIGN))
+            f.write(np.ascontiguousarray(section).tobytes())
+    os.replace(tmp, path)
+
+
+def pack_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(uint64 offsets with a leading 0, uint8 UTF-8 blob)"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+class SectionReader:
+    """Walks the sections of a file written by write_sections"""
+
+    def __init__(self, path: str, header: struct.Struct):
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        self.header: Tuple[Any, ...] = header.unpack_from(self.data, 0)
+        self.offset = header.size
+
+    def section(self, dtype: Any, count: int) -> np.ndarray:
+        """Next section as a zero-copy view"""
+        self.offset += -self.offset % _ALIGN
+        dtype = np.dtype(dtype)
+        view = self.data[self.offset:self.offset + count * dtype.itemsize].view(dtype)
+        self.offset += view.nbytes
+        return view
+
+    def strings(self, count: int) -> "StringSection":
+        """Next pack_strings pair"""
+        offsets = self.section(np.uint64, count + 1)
+        return StringSection(offsets, self.section(np.uint8, int(offsets[-1])))
+
+
+class StringSection:
+    """Lazily decoded strings over a packed blob"""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __getitem__(self, index: int) -> str:
+        start, stop = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self.blob[start:stop].tobytes().decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def tolist(self):
+        return [self[i] for i in range(len(self))]
@@ -0,0 +1,372 @@
+"""
+Caching primitives for OpusAIAgent
+Bounded in-process LRU, a pooled async Redis client and two-tier (LRU + Redis) caches
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class LRUCache:
+    """
+    Bounded in-process cache: LRU eviction over max_entries and an
+    approximate max_bytes budget, per-entry TTL, and hit/miss/eviction stats
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # key -> (expires_at, size, value)
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str, default: Any = None) -> Optional[Any]:
+        """Return the value for key, or default if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, _, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store value, evicting least recently used entries over the limits"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        size = approximate_size(value)
+        if key in self._data:
+            self._remove(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Would evict everything and still not fit
+            self.evictions += 1
+            return
+        self._data[key] = (expires_at, size, value)
+        self.bytes += size
+        while len(self._data) > self.max_entries or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def delete(self, key: str):
+        if key in self._data:
+            self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters and current occupancy"""
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: str):
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and (entry[0] is None or entry[0] > time.monotonic())
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self.set(key, value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISSING = object()
+
+
+def approximate_size(value: Any, _depth: int = 0) -> int:
+    """Rough deep size of a cached value in bytes"""
+    size = sys.getsizeof(value)
+    if _depth > 4:
+        return size
+    if isinstance(value, dict):
+        size += sum(
+            approximate_size(k, _depth + 1) + approximate_size(v, _depth + 1)
+            for k, v in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, _depth + 1) for item in value)
+    elif is_dataclass(value) and not isinstance(value, type):
+        size += sum(
+            approximate_size(getattr(value, f.name), _depth + 1) for f in fields(value)
+        )
+    return size
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting differences share a cache entry"""
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def bucket_value(value: float, significant: int = 2) -> float:
+    """Round a USD amount to a few significant figures (5,123 -> 5,100)"""
+    if value <= 0:
+        return 0.0
+    digits = significant - 1 - int(math.floor(math.log10(value)))
+    return float(round(value, digits))
+
+
+class RedisCache:
+    """
+    Async Redis behind a bounded connection pool. Multi-key reads and writes
+    go out as one pipelined round trip. A failed call is logged with its
+    latency and suspends Redis for retry_after seconds, during which calls
+    miss immediately and callers fall back to their local tier.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        max_connections: int = 32,
+        timeout: float = 0.5,
+        connect_timeout: float = 2.0,
+        retry_after: float = 5.0,
+        slow_call: float = 0.05
+    ):
+        import redis.asyncio
+        self._redis = redis.asyncio
+        self._errors = (redis.RedisError, OSError, asyncio.TimeoutError)
+        self.pool_args = {
+            "host": host,
+            "port": port,
+            "max_connections": max_connections,
+            "socket_timeout": timeout,
+            "socket_connect_timeout": connect_timeout,
+        }
+        self.retry_after = retry_after
+        self.slow_call = slow_call
+        self.calls = 0
+        self.errors = 0
+        self.skipped = 0
+        self.slow_calls = 0
+        self._down_until = 0.0
+        # Pooled connections belong to the event loop that opened them
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[Any] = None
+        self._closing: set = set()
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def client(self) -> Any:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                self._close_stale(self._client.connection_pool, self._loop)
+            pool = self._redis.ConnectionPool(**self.pool_args)
+            self._client = self._redis.Redis(connection_pool=pool)
+            self._loop = loop
+        return self._client
+
+    def _close_stale(self, pool: Any, loop: asyncio.AbstractEventLoop):
+        """
+        Disconnect a pool opened on a previous event loop: on that loop if it
+        still runs in another thread, otherwise from the current one
+        """
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(pool.disconnect(), loop)
+            return
+        task = asyncio.get_running_loop().create_task(self._disconnect(pool))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _disconnect(self, pool: Any):
+        try:
+            await pool.disconnect()
+        except (RuntimeError, *self._errors) as e:
+            # A closed loop cannot finish the shutdown; the sockets are
+            # released with the dropped connections
+            logger.debug(f"Stale Redis pool disconnect: {e}")
+
+    async def _call(self, operation: str, run: Callable, default: Any) -> Any:
+        if not self.available:
+            self.skipped += 1
+            return default
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            result = await run(self.client())
+        except self._errors as e:
+            self.errors += 1
+            self._down_until = time.monotonic() + self.retry_after
+            logger.warning(
+                f"Redis {operation} failed after {(time.perf_counter() - started) * 1e3:.1f}ms, "
+                f"using local cache for {self.retry_after}s: {e}"
+            )
+            return default
+        elapsed = time.perf_counter() - started
+        if elapsed > self.slow_call:
+            self.slow_calls += 1
+            logger.info(f"Slow Redis {operation}: {elapsed * 1e3:.1f}ms")
+        return result
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        """Values for keys (None where missing) in one round trip"""
+        if not keys:
+            return []
+        return await self._call("MGET", lambda client: client.mget(keys), [None] * len(keys))
+
+    async def set_many(self, items: Dict[str, bytes], ttl: int):
+        """Store items with a TTL in one pipelined round trip"""
+        if not items:
+            return
+
+        async def run(client):
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, value)
+                await pipe.execute()
+
+        await self._call("SETEX pipeline", run, None)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_many([key]))[0]
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.set_many({key: value}, ttl)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "slow_calls": self.slow_calls,
+        }
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+class TieredCache:
+    """
+    Async two-tier cache: an in-process LRU answers repeats in
+    microseconds, a RedisCache (when connected) shares entries across
+    workers. Values are encoded to bytes only on the way to Redis.
+    """
+
+    def __init__(
+        self,
+        local: LRUCache,
+        redis: Optional[RedisCache] = None,
+        ttl: int = 3600,
+        encode: Callable[[Any], bytes] = _identity,
+        decode: Callable[[bytes], Any] = _identity
+    ):
+        self.local = local
+        self.redis = redis
+        self.ttl = ttl
+        self.encode = encode
+        self.decode = decode
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        """Values for keys, None for misses; local misses share one Redis round trip"""
+        values = [self.local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing or self.redis is None:
+            return values
+        shared = await self.redis.get_many([keys[i] for i in missing])
+        for i, payload in zip(missing, shared):
+            if payload is None:
+                continue
+            try:
+                value = self.decode(payload)
+            except ValueError as e:
+                logger.warning(f"Undecodable cache entry {keys[i]}: {e}")
+                continue
+            # Promote shared hits into the local tier
+            self.local.set(keys[i], value)
+            values[i] = value
+        return values
+
+    async def set_many(self, items: Dict[str, Any]):
+        for key, value in items.items():
+            self.local.set(key, value)
+        if self.redis is not None:
+            await self.redis.set_many(
+                {key: self.encode(value) for key, value in items.items()}, self.ttl
+            )
+
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.get_many([key]))[0]
+
+    async def set(self, key: str, value: Any):
+        await self.set_many({key: value})
+
+
+def _decode_text(payload: Any) -> str:
+    return payload.decode("utf-8") if isinstance(payload, bytes) else payload
+
+
+class ResponseCache(TieredCache):
+    """Two-tier LLM response cache keyed by normalized prompt, model and temperature"""
+
+    def __init__(
+        self,
+        redis_client: Optional[RedisCache] = None,
+        max_entries: int = 1024,
+        ttl: int = 3600,
+        prefix: str = "llm:",
+        max_bytes: Optional[int] = None
+    ):
+        super().__init__(
+            LRUCache(max_entries=max_entries, ttl=ttl, max_bytes=max_bytes),
+            redis_client,
+            ttl=ttl,
+            encode=lambda text: text.encode("utf-8"),
+            decode=_decode_text
+        )
+        self.prefix = prefix
+
+    def key(self, prompt: str, model: str, temperature: float) -> str:
+        """Cache key from the normalized prompt, model and temperature"""
+        material = f"{model}\x00{temperature}\x00{normalize_prompt(prompt)}"
+        return self.prefix + hashlib.sha256(material.encode()).hexdigest()
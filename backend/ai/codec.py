@@ -0,0 +1,400 @@
+"""
+Binary cache codec for OpusAIAgent
+Versioned, compact encoding that round-trips YieldStrategy and Portfolio exactly
+"""
+
+import json
+import struct
+from functools import lru_cache
+from itertools import accumulate, repeat
+from typing import Any, Dict, List, Tuple
+
+from backend.ai.positions import CODE_COLUMNS, NUMERIC_COLUMNS, PositionTable
+
+MAGIC = b"AHC"
+# Only this version decodes; payloads of any other version are cache misses
+VERSION = 3
+
+# Payload kinds
+KIND_STRATEGIES = b"S"
+KIND_PORTFOLIO = b"P"
+KIND_JSON = b"J"
+
+# n_items, n_strings, n_ints, n_doubles
+_HEADER = struct.Struct("<IIII")
+_PREFIX_LEN = len(MAGIC) + 2
+
+
+class CodecError(ValueError):
+    """Raised for payloads this codec cannot decode"""
+
+
+# Portfolio position layouts: free-form dicts (grouped by key/type shape,
+# one column per key) or PositionTable columns
+POSITIONS_DICTS = 0
+POSITIONS_TABLE = 1
+
+# Position field tags, packed with the key's string index as (index << 3) | tag
+T_STR, T_FLOAT, T_INT, T_TRUE, T_FALSE, T_NONE, T_JSON = range(7)
+_MAX_EXACT_INT = 2 ** 53
+_TYPE_TAGS = {str: T_STR, float: T_FLOAT, int: T_INT, bool: T_TRUE, type(None): T_NONE}
+_CONSTANTS = {T_TRUE: True, T_FALSE: False, T_NONE: None}
+
+
+def _tag(value: Any) -> int:
+    tag = _TYPE_TAGS.get(type(value), T_JSON)
+    if tag == T_INT and not -_MAX_EXACT_INT < value < _MAX_EXACT_INT:
+        return T_JSON
+    if tag == T_TRUE and not value:
+        return T_FALSE
+    return tag
+
+
+@lru_cache(maxsize=None)
+def _models() -> Tuple[Any, Any, Any, Any]:
+    # Imported lazily: agent.py imports the helpers that import this module
+    from backend.ai.agent import YieldStrategy, Portfolio, StrategyType, RiskLevel
+    return YieldStrategy, Portfolio, StrategyType, RiskLevel
+
+
+class _Writer:
+    """Accumulates an interned string table plus flat int and double columns"""
+
+    def __init__(self):
+        self.string_index: Dict[str, int] = {}
+        self.strings: List[str] = []
+        self.ints: List[int] = []
+        self.doubles: List[float] = []
+
+    def string(self, value: str):
+        self.ints.append(self._intern(value))
+
+    def string_list(self, values: List[str]):
+        self.ints.append(len(values))
+        for value in values:
+            self.string(value)
+
+    def optional_string(self, value: Any):
+        # 0 encodes None, otherwise string index + 1
+        self.ints.append(0 if value is None else self._intern(value) + 1)
+
+    def records(self, records: List[Dict[str, Any]]):
+        """
+        Free-form dicts grouped by shape (keys and value tags, in order);
+        each shape is written as its field codes, record indexes and one
+        value column per field
+        """
+        shapes: Dict[Tuple, List[int]] = {}
+        for index, record in enumerate(records):
+            shape = tuple((key, _tag(value)) for key, value in record.items())
+            shapes.setdefault(shape, []).append(index)
+
+        ints, doubles, intern = self.ints, self.doubles, self._intern
+        ints.append(len(shapes))
+        for shape, indexes in shapes.items():
+            ints.extend((len(indexes), len(shape)))
+            ints.extend((intern(key) << 3) | tag for key, tag in shape)
+            ints.extend(indexes)
+            for key, tag in shape:
+                if tag == T_STR:
+                    ints.extend(intern(records[j][key]) for j in indexes)
+                elif tag == T_FLOAT or tag == T_INT:
+                    doubles.extend(records[j][key] for j in indexes)
+                elif tag == T_JSON:
+                    ints.extend(
+                        intern(json.dumps(records[j][key], separators=(",", ":"), default=str))
+                        for j in indexes
+                    )
+
+    def _intern(self, value: str) -> int:
+        index = self.string_index.get(value)
+        if index is None:
+            index = self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def pack(self, kind: bytes, n_items: int) -> bytes:
+        encoded = [s.encode("utf-8") for s in self.strings]
+        return b"".join((
+            MAGIC,
+            bytes((VERSION,)),
+            kind,
+            _HEADER.pack(n_items, len(encoded), len(self.ints), len(self.doubles)),
+            struct.pack(f"<{len(encoded)}I", *map(len, encoded)),
+            b"".join(encoded),
+            struct.pack(f"<{len(self.ints)}I", *self.ints),
+            struct.pack(f"<{len(self.doubles)}d", *self.doubles),
+        ))
+
+
+class _Reader:
+    """Walks the columns written by _Writer"""
+
+    def __init__(self, payload: bytes):
+        offset = _PREFIX_LEN
+        n_items, n_strings, n_ints, n_doubles = _HEADER.unpack_from(payload, offset)
+        offset += _HEADER.size
+        lengths = struct.unpack_from(f"<{n_strings}I", payload, offset)
+        offset += 4 * n_strings
+        size = sum(lengths)
+        blob = payload[offset:offset + size]
+        bounds = list(accumulate(lengths, initial=0))
+        if blob.isascii():
+            # One decode; byte offsets are character offsets
+            text = blob.decode("ascii")
+            strings = [text[a:b] for a, b in zip(bounds, bounds[1:])]
+        else:
+            strings = [blob[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+        offset += size
+        self.n_items = n_items
+        self.strings = strings
+        self.ints = struct.unpack_from(f"<{n_ints}I", payload, offset)
+        offset += 4 * n_ints
+        self.doubles = struct.unpack_from(f"<{n_doubles}d", payload, offset)
+        self.i = 0
+        self.d = 0
+
+    def int(self) -> int:
+        value = self.ints[self.i]
+        self.i += 1
+        return value
+
+    def double(self) -> float:
+        value = self.doubles[self.d]
+        self.d += 1
+        return value
+
+    def string(self) -> str:
+        return self.strings[self.int()]
+
+    def optional_string(self) -> Any:
+        code = self.int()
+        return None if code == 0 else self.strings[code - 1]
+
+    def string_list(self) -> List[str]:
+        count = self.int()
+        start = self.i
+        self.i += count
+        strings = self.strings
+        return [strings[index] for index in self.ints[start:self.i]]
+
+    def strings_at(self, count: int) -> List[str]:
+        """The next count string indexes, resolved"""
+        start = self.i
+        self.i += count
+        strings = self.strings
+        return [strings[index] for index in self.ints[start:self.i]]
+
+    def records(self, count: int) -> List[Dict[str, Any]]:
+        """count dicts written by _Writer.records, in their original order"""
+        ints, doubles, strings = self.ints, self.doubles, self.strings
+        # Every record has its index in the int column; a larger count is corrupt
+        if count > len(ints):
+            raise CodecError(f"Position count {count} exceeds payload")
+        n_shapes = ints[self.i]
+        i, d = self.i + 1, self.d
+        records: List[Any] = [None] * count
+        for _ in range(n_shapes):
+            n_records, n_fields = ints[i], ints[i + 1]
+            i += 2
+            codes = ints[i:i + n_fields]
+            i += n_fields
+            indexes = ints[i:i + n_records]
+            i += n_records
+            keys, columns = [strings[code >> 3] for code in codes], []
+            for code in codes:
+                tag = code & 7
+                if tag == T_STR:
+                    columns.append([strings[k] for k in ints[i:i + n_records]])
+                    i += n_records
+                elif tag == T_FLOAT:
+                    columns.append(doubles[d:d + n_records])
+                    d += n_records
+                elif tag == T_INT:
+                    columns.append(list(map(int, doubles[d:d + n_records])))
+                    d += n_records
+                elif tag == T_JSON:
+                    columns.append([json.loads(strings[k]) for k in ints[i:i + n_records]])
+                    i += n_records
+                elif tag in _CONSTANTS:
+                    columns.append(repeat(_CONSTANTS[tag], n_records))
+                else:
+                    raise CodecError(f"Unknown position field tag {tag}")
+            rows = zip(*columns) if columns else repeat((), n_records)
+            for index, row in zip(indexes, rows):
+                records[index] = dict(zip(keys, row))
+        self.i, self.d = i, d
+        return records
+
+
+@lru_cache(maxsize=None)
+def _enum_codes(enum_cls: Any) -> Tuple[Dict[Any, int], List[Any]]:
+    # Codes follow declaration order; reordering members needs a VERSION bump
+    members = list(enum_cls)
+    return {member: code for code, member in enumerate(members)}, members
+
+
+def _encode_strategies(strategies: List[Any]) -> bytes:
+    _, _, StrategyType, RiskLevel = _models()
+    type_codes, _ = _enum_codes(StrategyType)
+    risk_codes, _ = _enum_codes(RiskLevel)
+    writer = _Writer()
+    for s in strategies:
+        writer.string(s.id)
+        writer.string(s.name)
+        writer.string(s.protocol)
+        writer.string(s.chain)
+        writer.ints.append(type_codes[s.type])
+        writer.ints.append(risk_codes[s.risk_level])
+        writer.string_list(s.steps)
+        writer.string_list(s.required_tokens)
+        writer.string_list(s.exit_options)
+        writer.doubles.extend((
+            s.expected_apy, s.minimum_investment, s.gas_cost_usd,
+            s.il_exposure, s.confidence_score
+        ))
+    return writer.pack(KIND_STRATEGIES, len(strategies))
+
+
+def _decode_strategies(reader: _Reader) -> List[Any]:
+    YieldStrategy, _, StrategyType, RiskLevel = _models()
+    _, types = _enum_codes(StrategyType)
+    _, risks = _enum_codes(RiskLevel)
+    strategies = []
+    ints, doubles, strings = reader.ints, reader.doubles, reader.strings
+    for _ in range(reader.n_items):
+        i = reader.i
+        id_, name, protocol, chain, type_code, risk_code = ints[i:i + 6]
+        reader.i = i + 6
+        steps = reader.string_list()
+        tokens = reader.string_list()
+        exits = reader.string_list()
+        apy, minimum, gas, il, confidence = doubles[reader.d:reader.d + 5]
+        reader.d += 5
+        strategies.append(YieldStrategy(
+            id=strings[id_],
+            name=strings[name],
+            type=types[type_code],
+            protocol=strings[protocol],
+            chain=strings[chain],
+            expected_apy=apy,
+            risk_level=risks[risk_code],
+            minimum_investment=minimum,
+            gas_cost_usd=gas,
+            il_exposure=il,
+            steps=steps,
+            required_tokens=tokens,
+            exit_options=exits,
+            confidence_score=confidence
+        ))
+    return strategies
+
+
+def _encode_portfolio(portfolio: Any) -> bytes:
+    _, _, _, RiskLevel = _models()
+    risk_codes, _ = _enum_codes(RiskLevel)
+    writer = _Writer()
+    writer.string(portfolio.address)
+    writer.ints.append(risk_codes[portfolio.risk_tolerance])
+    writer.string_list(portfolio.chains)
+    writer.string_list(portfolio.preferred_protocols)
+    writer.doubles.append(portfolio.total_value_usd)
+    positions = portfolio.positions
+    if isinstance(positions, PositionTable):
+        writer.ints.append(POSITIONS_TABLE)
+        writer.ints.append(len(positions))
+        for position_id in positions.ids.tolist():
+            writer.string(position_id)
+        for key in CODE_COLUMNS:
+            for name in positions.names(key):
+                writer.optional_string(name)
+        for key in NUMERIC_COLUMNS:
+            writer.doubles.extend(positions.columns[key].tolist())
+    else:
+        # Free-form dicts; repeated keys and values share the string table
+        writer.ints.append(POSITIONS_DICTS)
+        writer.ints.append(len(positions))
+        writer.records(positions)
+    return writer.pack(KIND_PORTFOLIO, 1)
+
+
+def _decode_portfolio(reader: _Reader) -> Any:
+    _, Portfolio, _, RiskLevel = _models()
+    _, risks = _enum_codes(RiskLevel)
+    address = reader.string()
+    risk = risks[reader.int()]
+    chains = reader.string_list()
+    preferred = reader.string_list()
+    total_value = reader.double()
+    layout = reader.int()
+    count = reader.int()
+    if layout == POSITIONS_TABLE:
+        ids = reader.strings_at(count)
+        names = {}
+        # Optional strings: code 0 is None, others are string index + 1
+        lookup = [None, *reader.strings]
+        for key in CODE_COLUMNS:
+            start = reader.i
+            reader.i += count
+            names[key] = [lookup[code] for code in reader.ints[start:reader.i]]
+        numeric = {}
+        for key in NUMERIC_COLUMNS:
+            numeric[key] = reader.doubles[reader.d:reader.d + count]
+            reader.d += count
+        positions = PositionTable.from_columns(ids, **names, **numeric)
+    elif layout == POSITIONS_DICTS:
+        positions = reader.records(count)
+    else:
+        raise CodecError(f"Unknown position layout {layout}")
+    return Portfolio(
+        address=address,
+        total_value_usd=total_value,
+        positions=positions,
+        chains=chains,
+        risk_tolerance=risk,
+        preferred_protocols=preferred
+    )
+
+
+def encode(value: Any) -> bytes:
+    """Encode a cache value; YieldStrategy lists and Portfolios get typed layouts"""
+    YieldStrategy, Portfolio, _, _ = _models()
+    if isinstance(value, list) and value and all(
+        isinstance(item, YieldStrategy) for item in value
+    ):
+        return _encode_strategies(value)
+    if isinstance(value, Portfolio):
+        return _encode_portfolio(value)
+    body = json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+    return MAGIC + bytes((VERSION,)) + KIND_JSON + body
+
+
+def decode(payload: Any) -> Any:
+    """
+    Decode a cache value; plain JSON written before this codec still loads.
+    Truncated or corrupt payloads raise CodecError (a ValueError).
+    """
+    try:
+        return _decode(payload)
+    except (struct.error, IndexError, KeyError, TypeError, OverflowError, UnicodeDecodeError) as e:
+        raise CodecError(f"Corrupt cache payload: {e}") from e
+
+
+def _decode(payload: Any) -> Any:
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if not payload.startswith(MAGIC):
+        return json.loads(payload)
+
+    version = payload[len(MAGIC)]
+    if version != VERSION:
+        raise CodecError(f"Unsupported cache codec version {version}")
+
+    kind = payload[len(MAGIC) + 1:_PREFIX_LEN]
+    if kind == KIND_JSON:
+        return json.loads(payload[_PREFIX_LEN:])
+    if kind == KIND_STRATEGIES:
+        return _decode_strategies(_Reader(payload))
+    if kind == KIND_PORTFOLIO:
+        return _decode_portfolio(_Reader(payload))
+    raise CodecError(f"Unknown cache payload kind {kind!r}")
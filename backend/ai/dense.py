@@ -0,0 +1,260 @@
+"""
+Dense-vector retrieval for OpusAIAgent
+Local hashed n-gram embeddings, int8/float16 mmap storage and an IVF index; no network needed
+
+Build with: python -m backend.ai.dense
+"""
+
+import argparse
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from backend.ai.binfile import SectionReader, pack_strings, write_sections
+from backend.ai.ingest import CHUNK_DIR, TRAINING_DIR, Chunk
+from backend.ai.retrieval import INDEX_DIR, load_passages
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AHDV"
+VERSION = 1
+DEFAULT_INDEX = os.path.join(INDEX_DIR, "dense.idx")
+
+# n_vectors, dim, n_lists, n_sources, storage code, embedder name
+_HEADER = struct.Struct("<4sHxxIIIIB31s")
+STORAGE_DTYPES = {0: np.int8, 1: np.float16}
+STORAGE_CODES = {"int8": 0, "float16": 1}
+
+
+class HashedNgramEmbedder:
+    """
+    Feature-hashed bag of words plus character n-grams, log-scaled and
+    L2-normalized. Deterministic and dependency-free; any object with
+    name, dim and embed(texts) can stand in for it (e.g. a local model).
+    """
+
+    def __init__(self, dim: int = 512, ngrams: Sequence[int] = (3, 4, 5)):
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+        self.name = f"hashed-ngram-{dim}-{'.'.join(map(str, self.ngrams))}"
+
+    def features(self, text: str) -> List[int]:
+        """Signed hashed feature ids (sign in the lowest bit)"""
+        features = []
+        for word in text.lower().split():
+            word = word.strip(".,;:!?()[]\"'")
+            if not word:
+                continue
+            features.append(zlib.crc32(word.encode("utf-8")))
+            padded = f"<{word}>"
+            for n in self.ngrams:
+                for i in range(len(padded) - n + 1):
+                    features.append(zlib.crc32(padded[i:i + n].encode("utf-8")))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), dim) float32 unit vectors"""
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self.features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(features)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        columns = (hashes >> np.uint64(1)) % np.uint64(self.dim)
+        signs = np.where(hashes & np.uint64(1), 1.0, -1.0)
+        counts = np.zeros((len(texts), self.dim), dtype=np.float64)
+        np.add.at(counts, (np.asarray(rows, dtype=np.int64), columns.astype(np.int64)), signs)
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+
+def _spherical_kmeans(
+    vectors: np.ndarray,
+    k: int,
+    iterations: int = 12,
+    seed: int = 0
+) -> np.ndarray:
+    """Unit-norm centroids maximizing cosine similarity to their members"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignment == c]
+            # Re-seed empty lists from a random vector
+            centroid = members.sum(axis=0) if len(members) else vectors[rng.integers(len(vectors))]
+            norm = np.linalg.norm(centroid)
+            centroids[c] = centroid / norm if norm > 0 else centroid
+    return centroids
+
+
+def _quantize(vectors: np.ndarray, storage: str):
+    """(stored matrix, per-row float32 scales)"""
+    if storage == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales
+
+
+def build_index(
+    passages: Iterable[Chunk],
+    path: str = DEFAULT_INDEX,
+    embedder: Optional[Any] = None,
+    storage: str = "int8",
+    n_lists: Optional[int] = None,
+    batch_size: int = 256
+) -> int:
+    """
+    Embed passages and write an IVF index: rows grouped by nearest
+    centroid so each inverted list is one contiguous slice of the matrix.
+    Returns the number of passages indexed.
+    """
+    embedder = embedder or HashedNgramEmbedder()
+    passages = list(passages)
+    texts = [p.text for p in passages]
+    vectors = np.concatenate([
+        embedder.embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)
+    ]) if texts else np.zeros((0, embedder.dim), dtype=np.float32)
+
+    n = len(vectors)
+    n_lists = max(1, min(n_lists or int(np.sqrt(n)), n))
+    centroids = (
+        _spherical_kmeans(vectors, n_lists) if n else np.zeros((1, embedder.dim), np.float32)
+    )
+    assignment = np.argmax(vectors @ centroids.T, axis=1) if n else np.zeros(0, np.int64)
+    order = np.argsort(assignment, kind="stable")
+    list_offsets = np.zeros(len(centroids) + 1, dtype=np.uint32)
+    list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+
+    matrix, scales = _quantize(vectors[order], storage)
+    sources: Dict[str, int] = {}
+    source_codes = np.array(
+        [sources.setdefault(passages[i].source, len(sources)) for i in order.tolist()],
+        dtype=np.uint32
+    )
+    write_sections(
+        path,
+        _HEADER.pack(
+            MAGIC, VERSION, n, embedder.dim, len(centroids), len(sources),
+            STORAGE_CODES[storage], embedder.name.encode("utf-8")
+        ),
+        [
+            centroids.astype(np.float32),
+            list_offsets,
+            matrix,
+            scales,
+            source_codes,
+            *pack_strings(list(sources)),
+            *pack_strings([texts[i] for i in order.tolist()]),
+        ]
+    )
+    return n
+
+
+class DenseIndex:
+    """Read-only, memory-mapped IVF index written by build_index"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_INDEX,
+        embedder: Optional[Any] = None,
+        n_probe: int = 4
+    ):
+        self.path = path
+        reader = SectionReader(path, _HEADER)
+        magic, version, n, dim, n_lists, n_sources, storage, name = reader.header
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} dense index: {path}")
+        self.embedder = embedder or HashedNgramEmbedder(dim)
+        name = name.rstrip(b"\0").decode("utf-8")
+        if self.embedder.name[:31] != name or self.embedder.dim != dim:
+            raise ValueError(f"Index built with {name}, not {self.embedder.name}")
+        self.size = n
+        self.n_probe = n_probe
+        self.centroids = reader.section(np.float32, n_lists * dim).reshape(n_lists, dim)
+        self.list_offsets = reader.section(np.uint32, n_lists + 1)
+        self.matrix = reader.section(STORAGE_DTYPES[storage], n * dim).reshape(n, dim)
+        self.scales = reader.section(np.float32, n)
+        self.source_codes = reader.section(np.uint32, n)
+        self.sources = reader.strings(n_sources).tolist()
+        self.texts = reader.strings(n)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _candidates(self, centroid_scores: np.ndarray) -> np.ndarray:
+        """Row indices of the n_probe closest inverted lists"""
+        n_probe = min(self.n_probe, len(centroid_scores))
+        lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        offsets = self.list_offsets
+        return np.concatenate([
+            np.arange(offsets[c], offsets[c + 1], dtype=np.int64) for c in lists.tolist()
+        ])
+
+    def search_batch(self, queries: Sequence[str], k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Top-k passages per query, best first, by cosine similarity"""
+        if not self.size:
+            return [[] for _ in queries]
+        vectors = self.embedder.embed(queries)
+        centroid_scores = vectors @ self.centroids.T
+        results = []
+        for vector, scores in zip(vectors, centroid_scores):
+            rows = self._candidates(scores)
+            if not len(rows):
+                results.append([])
+                continue
+            # Dequantize on the fly: int8 dot product times the row scale
+            similarity = (self.matrix[rows].astype(np.float32) @ vector) * self.scales[rows]
+            top = min(k, len(rows))
+            best = np.argpartition(-similarity, top - 1)[:top]
+            best = best[np.lexsort((rows[best], -similarity[best]))]
+            results.append([
+                {
+                    "score": float(similarity[i]),
+                    "source": self.sources[self.source_codes[rows[i]]],
+                    "text": self.texts[int(rows[i])],
+                }
+                for i in best.tolist()
+            ])
+        return results
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        return self.search_batch([query], k)[0]
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_INDEX, **kwargs: Any) -> Optional["DenseIndex"]:
+        """The index at path, or None if it hasn't been built"""
+        if not os.path.exists(path):
+            logger.info(f"No dense index at {path}; run python -m backend.ai.dense")
+            return None
+        return cls(path, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the dense retrieval index")
+    parser.add_argument("--corpus", default=TRAINING_DIR)
+    parser.add_argument("--chunks", default=CHUNK_DIR)
+    parser.add_argument("--output", default=DEFAULT_INDEX)
+    parser.add_argument("--storage", choices=sorted(STORAGE_CODES), default="int8")
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists (default sqrt(n))")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = build_index(
+        load_passages(args.corpus, args.chunks), args.output,
+        storage=args.storage, n_lists=args.lists
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {count} passages into {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.0f} KB) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Fine-tuning dataset preparation for OpusAIAgent
+Streams the training corpus, tokenizes in a process pool and packs fixed-length
+sequences into sharded, memory-mapped token files
+
+Build with: python -m backend.ai.fine_tune.dataset
+"""
+
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from backend.ai.ingest import TRAINING_DIR, read_rag_documents
+
+try:
+    import tiktoken
+    HAS_TIKTOKEN = True
+except ImportError:
+    HAS_TIKTOKEN = False
+
+DATASET_DIR = os.path.join(os.path.dirname(__file__), "data", "packed")
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+
+QA_FILES = ("training_qa.jsonl", "defi_qa_pairs.jsonl")
+RAG_FILE = "rag_documents.jsonl"
+
+
+class ByteTokenizer:
+    """UTF-8 bytes as tokens plus an end-of-text token; needs no vocabulary file"""
+
+    name = "bytes"
+    vocab_size = 257
+    eos_id = 256
+
+    def encode(self, text: str) -> np.ndarray:
+        return np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint32)
+
+
+class TiktokenTokenizer:
+    """BPE tokens from tiktoken, when installed"""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._encoding = tiktoken.get_encoding(encoding)
+        self.name = f"tiktoken:{encoding}"
+        self.eos_id = self._encoding.eot_token
+        self.vocab_size = self._encoding.n_vocab
+
+    def encode(self, text: str) -> np.ndarray:
+        return np.asarray(self._encoding.encode_ordinary(text), dtype=np.uint32)
+
+
+def get_tokenizer(name: str = "auto") -> Any:
+    if name == "bytes" or (name == "auto" and not HAS_TIKTOKEN):
+        return ByteTokenizer()
+    if not HAS_TIKTOKEN:
+        raise ValueError(f"Tokenizer {name} needs the tiktoken package")
+    return TiktokenTokenizer("cl100k_base" if name == "auto" else name.split(":", 1)[-1])
+
+
+def iter_examples(corpus: str = TRAINING_DIR, include_documents: bool = True) -> Iterator[str]:
+    """Training texts, read one line at a time"""
+    for name in QA_FILES:
+        path = os.path.join(corpus, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    pair = json.loads(line)
+                    yield (
+                        f"### Question:\n{pair['prompt'].strip()}\n"
+                        f"### Answer:\n{pair['response'].strip()}"
+                    )
+
+    path = os.path.join(corpus, RAG_FILE)
+    if include_documents and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for _, words in read_rag_documents(f):
+                yield " ".join(words)
+
+
+# Process pool workers build their own tokenizer once
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer_name: str):
+    global _worker_tokenizer
+    _worker_tokenizer = get_tokenizer(tokenizer_name)
+
+
+def _encode(text: str) -> np.ndarray:
+    tokens = _worker_tokenizer.encode(text)
+    return np.append(tokens, np.uint32(_worker_tokenizer.eos_id))
+
+
+class _ShardWriter:
+    """Packs a token stream into (n, seq_len) rows, cutting a new file every shard_sequences"""
+
+    def __init__(
+        self,
+        output: str,
+        seq_len: int,
+        shard_sequences: int,
+        dtype: np.dtype,
+        pad_id: int
+    ):
+        self.output = output
+        self.seq_len = seq_len
+        self.shard_sequences = shard_sequences
+        self.dtype = dtype
+        self.pad_id = pad_id
+        self.pending: List[np.ndarray] = []
+        self.pending_tokens = 0
+        self.shards: List[Dict[str, Any]] = []
+        self.rows: List[np.ndarray] = []
+        self.tokens = 0
+
+    def add(self, tokens: np.ndarray):
+        self.pending.append(tokens)
+        self.pending_tokens += len(tokens)
+        self.tokens += len(tokens)
+        if self.pending_tokens >= self.seq_len:
+            stream = np.concatenate(self.pending)
+            whole = len(stream) // self.seq_len * self.seq_len
+            for row in stream[:whole].reshape(-1, self.seq_len):
+                self._row(row)
+            self.pending = [stream[whole:]]
+            self.pending_tokens = len(stream) - whole
+
+    def _row(self, row: np.ndarray):
+        self.rows.append(row.astype(self.dtype))
+        if len(self.rows) == self.shard_sequences:
+            self._flush()
+
+    def _flush(self):
+        if not self.rows:
+            return
+        name = f"shard-{len(self.shards):05d}.bin"
+        np.stack(self.rows).tofile(os.path.join(self.output, name))
+        self.shards.append({"file": name, "sequences": len(self.rows)})
+        self.rows = []
+
+    def close(self):
+        # The final partial sequence is padded rather than dropped
+        if self.pending_tokens:
+            tail = np.concatenate(self.pending)
+            row = np.full(self.seq_len, self.pad_id, dtype=np.uint32)
+            row[:len(tail)] = tail
+            self._row(row)
+        self._flush()
+
+
+def build_dataset(
+    corpus: str = TRAINING_DIR,
+    output: str = DATASET_DIR,
+    seq_len: int = 1024,
+    shard_sequences: int = 4096,
+    tokenizer: str = "auto",
+    workers: Optional[int] = None,
+    include_documents: bool = True
+) -> Dict[str, Any]:
+    """
+    Tokenize and pack the corpus into output/shard-*.bin plus index.json.
+    Examples are separated by the end-of-text token. Returns the index.
+    """
+    tokenizer_info = get_tokenizer(tokenizer)
+    dtype = np.dtype(np.uint16 if tokenizer_info.vocab_size <= 1 << 16 else np.uint32)
+    os.makedirs(output, exist_ok=True)
+    for name in os.listdir(output):
+        if name.startswith("shard-") and name.endswith(".bin"):
+            os.remove(os.path.join(output, name))
+
+    writer = _ShardWriter(output, seq_len, shard_sequences, dtype, tokenizer_info.eos_id)
+    examples = 0
+    with Pool(workers, initializer=_init_worker, initargs=(tokenizer_info.name,)) as pool:
+        # imap keeps corpus order while workers tokenize ahead
+        for tokens in pool.imap(_encode, iter_examples(corpus, include_documents), chunksize=16):
+            writer.add(tokens)
+            examples += 1
+    writer.close()
+
+    index = {
+        "version": FORMAT_VERSION,
+        "tokenizer": tokenizer_info.name,
+        "vocab_size": tokenizer_info.vocab_size,
+        "eos_id": tokenizer_info.eos_id,
+        "dtype": dtype.name,
+        "seq_len": seq_len,
+        "examples": examples,
+        "tokens": writer.tokens,
+        "shards": writer.shards,
+    }
+    with open(os.path.join(output, INDEX_FILE + ".tmp"), "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(os.path.join(output, INDEX_FILE + ".tmp"), os.path.join(output, INDEX_FILE))
+    return index
+
+
+class PackedDataset:
+    """Read-only view of a packed dataset; rows are memory-mapped, never parsed"""
+
+    def __init__(self, path: str = DATASET_DIR):
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            self.index = json.load(f)
+        if self.index["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dataset version {self.index['version']}")
+        self.seq_len = self.index["seq_len"]
+        dtype = np.dtype(self.index["dtype"])
+        self.shards = [
+            np.memmap(
+                os.path.join(path, shard["file"]), dtype=dtype, mode="r",
+                shape=(shard["sequences"], self.seq_len)
+            )
+            for shard in self.index["shards"]
+        ]
+        counts = [len(shard) for shard in self.shards]
+        self.starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    def __len__(self) -> int:
+        return int(self.starts[-1])
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        shard = int(np.searchsorted(self.starts, row, side="right")) - 1
+        return self.shards[shard][row - self.starts[shard]]
+
+    def batches(self, batch_size: int, seed: Optional[int] = None) -> Iterator[np.ndarray]:
+        """(batch_size, seq_len) batches for one epoch, shuffled when seeded"""
+        order = np.arange(len(self))
+        if seed is not None:
+            np.random.default_rng(seed).shuffle(order)
+        for start in range(0, len(order), batch_size):
+            yield np.stack([self[row] for row in order[start:start + batch_size].tolist()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the packed fine-tuning dataset")
+    parser.add_argument("--corpus", default=TRAINING_DIR)
+    parser.add_argument("--output", default=DATASET_DIR)
+    parser.add_argument("--seq-len", type=int, default=1024)
+    parser.add_argument("--shard-sequences", type=int, default=4096)
+    parser.add_argument("--tokenizer", default="auto", help="auto, bytes or tiktoken:<encoding>")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-documents", action="store_true", help="Q&A pairs only")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_dataset(
+        args.corpus, args.output, args.seq_len, args.shard_sequences,
+        args.tokenizer, args.workers, not args.no_documents
+    )
+    elapsed = time.perf_counter() - start
+    sequences = sum(shard["sequences"] for shard in index["shards"])
+    print(f"Packed {index['examples']} examples ({index['tokens']} {index['tokenizer']} tokens) "
+          f"into {sequences} x {index['seq_len']} sequences, "
+          f"{len(index['shards'])} shards, in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
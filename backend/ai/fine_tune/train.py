@@ -1,11 +1,32 @@
 # Simple training script stub
-import json
+# Run as `python train.py` from this directory or as
+# `python -m backend.ai.fine_tune.train` from the repository root
+import argparse
+import os
+import sys
 
-def train_model(data_path):
-    with open(data_path, 'r') as f:
-        data = json.load(f)
-    print(f"Training on {len(data)} examples")
-    # Add actual training code here
+if not __package__:
+    # Started as a script: make the repository root importable
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from backend.ai.fine_tune.dataset import DATASET_DIR, INDEX_FILE, PackedDataset, build_dataset
+
+
+def train_model(data_path=DATASET_DIR, batch_size=8, epochs=1, seed=0):
+    # Packed shards are built once by the data-prep stage and reused
+    if not os.path.exists(os.path.join(data_path, INDEX_FILE)):
+        build_dataset(output=data_path)
+    dataset = PackedDataset(data_path)
+    print(f"Training on {dataset.index['examples']} examples "
+          f"({len(dataset)} sequences of {dataset.seq_len} tokens)")
+    for epoch in range(epochs):
+        for batch in dataset.batches(batch_size, seed=seed + epoch):
+            pass  # Add actual training code here
 
 if __name__ == "__main__":
-    train_model('data/yield_strategies.json')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default=DATASET_DIR)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--epochs", type=int, default=1)
+    args = parser.parse_args()
+    train_model(args.data, args.batch_size, args.epochs)
@@ -0,0 +1,335 @@
+"""
+Corpus ingestion for OpusAIAgent retrieval
+Streams backend/data/training, normalizes, chunks and de-duplicates into a compact chunk store
+
+Build with: python -m backend.ai.ingest
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backend.ai.binfile import SectionReader, StringSection, pack_strings, write_sections
+
+TRAINING_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "training")
+CHUNK_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "index", "chunks")
+
+# Bump when chunking or dedup changes so cached sources are reprocessed
+PIPELINE_VERSION = 1
+
+CHUNK_MIN_TOKENS = 64
+CHUNK_MAX_TOKENS = 256
+# Content-defined boundaries: after CHUNK_MIN_TOKENS, cut after any word
+# whose hash has these bits clear, so shifted copies of a text chunk alike
+BOUNDARY_MASK = 0x1F
+
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_JACCARD = 0.8
+_MERSENNE = np.uint64((1 << 61) - 1)
+
+MAGIC = b"AHCK"
+VERSION = 1
+# n_chunks, n_sources
+_HEADER = struct.Struct("<4sHxxII")
+
+
+def estimate_tokens(word: str) -> int:
+    """Rough BPE token count of one whitespace-delimited word"""
+    return len(word) // 4 + 1
+
+
+@dataclass
+class Chunk:
+    """A normalized, token-bounded piece of one source document"""
+    source: str
+    text: str
+
+
+# Source readers: each yields (document id, word iterator) from a file,
+# reading it line by line
+
+def _words(lines: Iterable[str]) -> Iterator[str]:
+    # Splitting on any whitespace also undoes the PDF "word\n \n" layout
+    for line in lines:
+        yield from line.split()
+
+
+def read_text(f) -> Iterator[Tuple[str, Iterator[str]]]:
+    yield "", _words(f)
+
+
+def read_rag_documents(f) -> Iterator[Tuple[str, Iterator[str]]]:
+    for line in f:
+        if line.strip():
+            document = json.loads(line)
+            yield document["id"], iter(document["text"].split())
+
+
+def read_qa_pairs(f) -> Iterator[Tuple[str, Iterator[str]]]:
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            pair = json.loads(line)
+            yield str(number), _words(("Q:", pair["prompt"], "A:", pair["response"]))
+
+
+def read_markdown_sections(f) -> Iterator[Tuple[str, Iterator[str]]]:
+    """One document per "## " section"""
+    title, lines = None, []
+    for line in f:
+        if line.startswith("## "):
+            if title is not None:
+                yield title, _words(lines)
+            title, lines = line[3:].strip(), []
+        if title is not None:
+            lines.append(line)
+    if title is not None:
+        yield title, _words(lines)
+
+
+# Processed in this order; earlier sources win when chunks are duplicates,
+# so curated files come before the raw PDF dumps
+SOURCES: Dict[str, Callable] = {
+    "defi_rag_corpus.md": read_markdown_sections,
+    "defi_qa_pairs.jsonl": read_qa_pairs,
+    "training_qa.jsonl": read_qa_pairs,
+    "rag_documents.jsonl": read_rag_documents,
+    "strategies_pdf_text.txt": read_text,
+    "defi_corpus_combined.txt": read_text,
+}
+
+
+def chunk_words(
+    words: Iterable[str],
+    min_tokens: int = CHUNK_MIN_TOKENS,
+    max_tokens: int = CHUNK_MAX_TOKENS
+) -> Iterator[str]:
+    """Group a word stream into chunks of at most max_tokens estimated tokens"""
+    chunk: List[str] = []
+    tokens = 0
+    for word in words:
+        cost = estimate_tokens(word)
+        if chunk and tokens + cost > max_tokens:
+            yield " ".join(chunk)
+            chunk, tokens = [], 0
+        chunk.append(word)
+        tokens += cost
+        if tokens >= min_tokens and not zlib.crc32(word.encode("utf-8")) & BOUNDARY_MASK:
+            yield " ".join(chunk)
+            chunk, tokens = [], 0
+    if chunk:
+        yield " ".join(chunk)
+
+
+def _permutations() -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(PIPELINE_VERSION)
+    a = rng.integers(1, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+    return a, b
+
+
+_PERMUTATIONS = _permutations()
+
+
+def minhash(text: str) -> np.ndarray:
+    """MINHASH_PERMUTATIONS-wide signature over lowercased word shingles"""
+    words = text.lower().split()
+    width = min(SHINGLE_WORDS, len(words)) or 1
+    shingles = {
+        zlib.crc32(" ".join(words[i:i + width]).encode("utf-8"))
+        for i in range(max(len(words) - width + 1, 1))
+    }
+    values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    a, b = _PERMUTATIONS
+    # a * x fits in uint64 for 32-bit a and x
+    hashed = (values[:, None] * a[None, :] + b[None, :]) % _MERSENNE
+    return hashed.min(axis=0).astype(np.uint64)
+
+
+def exact_key(text: str) -> bytes:
+    return hashlib.sha1(text.lower().encode("utf-8")).digest()[:8]
+
+
+class Deduplicator:
+    """Drops exact repeats (content hash) and near-duplicates (MinHash LSH)"""
+
+    def __init__(self, threshold: float = NEAR_DUPLICATE_JACCARD):
+        self.threshold = threshold
+        self.rows = MINHASH_PERMUTATIONS // LSH_BANDS
+        self.exact: set = set()
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.signatures: List[np.ndarray] = []
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def add(self, key: bytes, signature: np.ndarray) -> bool:
+        """Record a chunk; False if it duplicates one already kept"""
+        if key in self.exact:
+            self.exact_duplicates += 1
+            return False
+        bands = [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(LSH_BANDS)
+        ]
+        candidates = {i for band in bands for i in self.buckets.get(band, ())}
+        for i in candidates:
+            if np.mean(self.signatures[i] == signature) >= self.threshold:
+                self.near_duplicates += 1
+                return False
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        self.exact.add(key)
+        for band in bands:
+            self.buckets.setdefault(band, []).append(index)
+        return True
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkStore:
+    """Read-only, memory-mapped chunk store written by build_chunks"""
+
+    def __init__(self, path: str):
+        reader = SectionReader(path, _HEADER)
+        magic, version, n_chunks, n_sources = reader.header
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} chunk store: {path}")
+        self.source_codes = reader.section(np.uint32, n_chunks)
+        self.sources = reader.strings(n_sources).tolist()
+        self.texts = reader.strings(n_chunks)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, index: int) -> Chunk:
+        return Chunk(self.sources[self.source_codes[index]], self.texts[index])
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for index in range(len(self)):
+            yield self[index]
+
+
+def _process_source(name: str, path: str, cache_path: str):
+    """Chunk one source file and cache its chunks and signatures"""
+    sources, texts, keys, signatures = [], [], [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for doc, words in SOURCES[name](f):
+            for text in chunk_words(words):
+                sources.append(f"{name}#{doc}" if doc else name)
+                texts.append(text)
+                keys.append(exact_key(text))
+                signatures.append(minhash(text))
+    source_offsets, source_blob = pack_strings(sources)
+    text_offsets, text_blob = pack_strings(texts)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path + ".tmp", "wb") as f:
+        np.savez(
+            f,
+            source_offsets=source_offsets, source_blob=source_blob,
+            text_offsets=text_offsets, text_blob=text_blob,
+            keys=np.frombuffer(b"".join(keys), dtype=np.uint64),
+            signatures=np.array(signatures, dtype=np.uint64).reshape(-1, MINHASH_PERMUTATIONS),
+        )
+    os.replace(cache_path + ".tmp", cache_path)
+
+
+def build_chunks(
+    corpus: str = TRAINING_DIR,
+    output: str = CHUNK_DIR,
+    force: bool = False
+) -> Dict[str, int]:
+    """
+    Bring the chunk store in output up to date with corpus. Only sources
+    whose content changed since the last build are re-chunked; dedup runs
+    over the cached chunks of all sources. Returns build statistics.
+    """
+    manifest_path = os.path.join(output, "manifest.json")
+    manifest: Dict[str, object] = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    if manifest.get("version") != PIPELINE_VERSION:
+        manifest = {"version": PIPELINE_VERSION, "sources": {}}
+    digests = manifest["sources"]
+
+    stats = {"sources": 0, "reprocessed": 0, "chunks": 0,
+             "exact_duplicates": 0, "near_duplicates": 0}
+    dedup = Deduplicator()
+    kept_sources: List[str] = []
+    kept_texts: List[str] = []
+    for name in SOURCES:
+        path = os.path.join(corpus, name)
+        if not os.path.exists(path):
+            continue
+        stats["sources"] += 1
+        cache_path = os.path.join(output, "sources", name + ".npz")
+        digest = _file_digest(path)
+        if digests.get(name) != digest or not os.path.exists(cache_path):
+            _process_source(name, path, cache_path)
+            digests[name] = digest
+            stats["reprocessed"] += 1
+
+        with np.load(cache_path) as cached:
+            sources = StringSection(cached["source_offsets"], cached["source_blob"])
+            texts = StringSection(cached["text_offsets"], cached["text_blob"])
+            keys, signatures = cached["keys"], cached["signatures"]
+            for i in range(len(keys)):
+                if dedup.add(keys[i].tobytes(), signatures[i]):
+                    kept_sources.append(sources[i])
+                    kept_texts.append(texts[i])
+
+    source_index: Dict[str, int] = {}
+    codes = np.array(
+        [source_index.setdefault(source, len(source_index)) for source in kept_sources],
+        dtype=np.uint32
+    )
+    write_sections(
+        os.path.join(output, "chunks.bin"),
+        _HEADER.pack(MAGIC, VERSION, len(kept_texts), len(source_index)),
+        [codes, *pack_strings(list(source_index)), *pack_strings(kept_texts)]
+    )
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    stats["chunks"] = len(kept_texts)
+    stats["exact_duplicates"] = dedup.exact_duplicates
+    stats["near_duplicates"] = dedup.near_duplicates
+    return stats
+
+
+def open_chunks(output: str = CHUNK_DIR) -> Optional[ChunkStore]:
+    path = os.path.join(output, "chunks.bin")
+    return ChunkStore(path) if os.path.exists(path) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the retrieval chunk store")
+    parser.add_argument("--corpus", default=TRAINING_DIR)
+    parser.add_argument("--output", default=CHUNK_DIR)
+    parser.add_argument("--force", action="store_true", help="reprocess every source")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = build_chunks(args.corpus, args.output, args.force)
+    elapsed = time.perf_counter() - start
+    print(f"{stats} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
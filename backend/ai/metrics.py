@@ -0,0 +1,343 @@
+"""
+Metrics and tracing for OpusAIAgent
+Latency histograms, counters and contextvar-propagated spans, exposed in the
+Prometheus text format (and recent slow traces as JSON) from a local endpoint
+"""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans from microsecond cache hits to multi-second LLM calls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(labels[name] for name in self.label_names)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(labels[name] for name in self.label_names)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics plus collectors: callables sampled at scrape time that return
+    (name, kind, help, labels dict, value) tuples, e.g. from cache stats().
+    Samples with the same name and labels from several collectors are summed.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self._collectors: List[Any] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], List[tuple]]):
+        """Register a collector; bound methods are held weakly"""
+        if hasattr(collector, "__self__"):
+            self._collectors.append(weakref.WeakMethod(collector))
+        else:
+            self._collectors.append(lambda: collector)
+
+    def collect(self) -> Dict[str, Tuple[str, str, Dict[Tuple, float]]]:
+        samples: Dict[str, Tuple[str, str, Dict[Tuple, float]]] = {}
+        live = []
+        for ref in self._collectors:
+            collector = ref()
+            if collector is None:
+                continue
+            live.append(ref)
+            try:
+                collected = collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help, labels, value in collected:
+                _, _, values = samples.setdefault(name, (kind, help, {}))
+                key = tuple(sorted(labels.items()))
+                values[key] = values.get(key, 0) + value
+        self._collectors = live
+        return samples
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for name, (kind, help, values) in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values.items()):
+                names = [label for label, _ in key]
+                lines.append(f"{name}{_labels(names, [v for _, v in key])} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "apyhub_agent_stage_seconds", "Latency of agent stages (spans)", ["stage"]
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "apyhub_llm_requests_total", "LLM calls by provider and outcome", ["provider", "outcome"]
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "apyhub_llm_latency_seconds", "LLM call latency (full completion or stream)", ["provider"]
+)
+LLM_FIRST_TOKEN = REGISTRY.histogram(
+    "apyhub_llm_first_token_seconds", "Time to the first streamed chunk", ["provider"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "apyhub_llm_tokens_total", "Estimated LLM tokens by provider and kind (prompt/completion)",
+    ["provider", "kind"]
+)
+LOOP_LAG = REGISTRY.histogram(
+    "apyhub_event_loop_lag_seconds", "How late the event loop ran a scheduled sampler",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Token estimate for LLM counters (ingest.estimate_tokens per word)"""
+    from backend.ai.ingest import estimate_tokens as word_tokens
+    return sum(word_tokens(word) for word in text.split())
+
+
+def cache_samples(name: str, stats: Dict[str, int]) -> List[tuple]:
+    """Collector samples for an LRUCache.stats() (or RedisCache.stats()) dict"""
+    samples = []
+    for key, value in stats.items():
+        if key in ("entries", "bytes"):
+            samples.append((f"apyhub_cache_{key}", "gauge", f"Current cache {key}", {"cache": name}, value))
+        else:
+            samples.append((
+                f"apyhub_cache_{key}_total", "counter", f"Cache {key.replace('_', ' ')}",
+                {"cache": name}, value
+            ))
+    return samples
+
+
+# Tracing
+
+class Span:
+    """One timed stage; children are the stages started inside it"""
+
+    __slots__ = ("name", "attrs", "children", "start", "duration")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.children: List["Span"] = []
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        origin = self.start if origin is None else origin
+        return {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1e3, 3),
+            "duration_ms": None if self.duration is None else round(self.duration * 1e3, 3),
+            **({"attrs": self.attrs} if self.attrs else {}),
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class TraceBuffer:
+    """The most recent root spans slower than slow_seconds"""
+
+    def __init__(self, slow_seconds: float = 1.0, size: int = 100):
+        self.slow_seconds = slow_seconds
+        self.traces: deque = deque(maxlen=size)
+
+    def finish(self, root: Span):
+        if root.duration >= self.slow_seconds:
+            self.traces.append(root)
+
+    def to_json(self) -> str:
+        return json.dumps([root.to_dict() for root in self.traces])
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("apyhub_span", default=None)
+SLOW_TRACES = TraceBuffer()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    Time a stage into apyhub_agent_stage_seconds{stage=name}. Spans nest
+    through a ContextVar, so tasks started inside one (asyncio copies the
+    context) attach their spans to it; slow root spans go to SLOW_TRACES.
+    """
+    parent = _current_span.get()
+    current = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+        STAGE_LATENCY.observe(current.duration, stage=name)
+        if parent is None:
+            SLOW_TRACES.finish(current)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+async def sample_loop_lag(interval: float = 0.5):
+    """Run forever, recording how late each interval's wake-up is"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+
+_background: set = set()
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        writer.close()
+        return
+    path = request.split(b" ", 2)[1].decode("latin-1") if request.count(b" ") >= 2 else "/"
+    if path.startswith("/metrics"):
+        status, content_type, body = "200 OK", "text/plain; version=0.0.4", REGISTRY.render()
+    elif path.startswith("/traces"):
+        status, content_type, body = "200 OK", "application/json", SLOW_TRACES.to_json()
+    else:
+        status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+    payload = body.encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+    )
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+
+
+async def serve_metrics(host: str = "127.0.0.1", port: int = 9464) -> asyncio.AbstractServer:
+    """
+    Start the local endpoint (GET /metrics, GET /traces) and the loop lag
+    sampler on the running event loop
+    """
+    server = await asyncio.start_server(_handle_http, host, port)
+    # Hold a reference so the sampler task isn't garbage collected
+    _background.add(asyncio.ensure_future(sample_loop_lag()))
+    logger.info(f"Metrics on http://{host}:{port}/metrics")
+    return server
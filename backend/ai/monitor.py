@@ -0,0 +1,287 @@
+"""
+Position monitoring for OpusAIAgent
+Rule-table driven, vectorized alert checks over streams of position batches
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from backend.ai.agent_helpers import AgentHelpers
+from backend.ai.positions import CODE_COLUMNS, NUMERIC_COLUMNS, PositionTable
+
+_OPERATORS = {
+    ">": np.greater,
+    "<": np.less,
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+}
+
+
+@dataclass
+class MonitorRule:
+    """
+    One alert threshold. Scope fields (chain, protocol, type) narrow the
+    rule; for each position the most specific matching rule of an alert
+    type wins. A disabled rule switches the alert off for its scope.
+    """
+    alert_type: str
+    column: str
+    op: str
+    threshold: float
+    chain: Optional[str] = None
+    protocol: Optional[str] = None
+    type: Optional[str] = None
+    enabled: bool = True
+
+    @property
+    def specificity(self) -> int:
+        return sum(getattr(self, key) is not None for key in CODE_COLUMNS)
+
+
+# Thresholds monitor_positions has always used
+DEFAULT_RULES = [
+    MonitorRule("HIGH_IL", "il_percentage", ">", 5.0),
+    MonitorRule("LOW_APY", "current_apy", "<", 5.0),
+    MonitorRule("LIQUIDATION_RISK", "health_factor", "<", 1.5),
+]
+
+# How far past its threshold a raised alert's value must move to clear
+DEFAULT_HYSTERESIS = {
+    "HIGH_IL": 0.5,
+    "LOW_APY": 0.5,
+    "LIQUIDATION_RISK": 0.1,
+}
+
+
+class RuleTable:
+    """Alert rules grouped by alert type, evaluated as column masks"""
+
+    def __init__(self, rules: Sequence[MonitorRule] = DEFAULT_RULES):
+        self.rules: Dict[str, List[MonitorRule]] = {}
+        for rule in rules:
+            if rule.alert_type not in AgentHelpers.POSITION_ALERTS:
+                raise ValueError(f"Unknown alert type: {rule.alert_type}")
+            if rule.column not in NUMERIC_COLUMNS:
+                raise ValueError(f"Unknown position column: {rule.column}")
+            if rule.op not in _OPERATORS:
+                raise ValueError(f"Unknown rule operator: {rule.op}")
+            self.rules.setdefault(rule.alert_type, []).append(rule)
+
+        for alert_type, group in self.rules.items():
+            if len({(rule.column, rule.op) for rule in group}) > 1:
+                raise ValueError(f"Rules for {alert_type} must share column and operator")
+            # Least specific first, so narrower rules overwrite broader ones
+            group.sort(key=lambda rule: rule.specificity)
+
+    @classmethod
+    def from_config(cls, entries: Sequence[Dict[str, Any]]) -> "RuleTable":
+        """Defaults plus overrides, e.g. entries from model_config.yaml"""
+        return cls(list(DEFAULT_RULES) + [MonitorRule(**entry) for entry in entries])
+
+    def hits(
+        self,
+        table: PositionTable,
+        bands: Optional[Dict[str, float]] = None
+    ) -> List[tuple]:
+        """
+        (alert_type, column, boolean mask) per alert type. With bands,
+        each threshold is relaxed by its alert type's band, giving the
+        looser check an already raised alert must fail before it clears.
+        """
+        results = []
+        lookup = table.pool.lookup
+        for alert_type, group in self.rules.items():
+            column, op = group[0].column, group[0].op
+            thresholds = np.full(len(table), np.nan)
+            for rule in group:
+                scope = np.ones(len(table), dtype=bool)
+                for key in CODE_COLUMNS:
+                    name = getattr(rule, key)
+                    if name is not None:
+                        scope &= table.columns[key] == lookup(name)
+                thresholds[scope] = rule.threshold if rule.enabled else np.nan
+            if bands and alert_type in bands:
+                thresholds += bands[alert_type] if op in ("<", "<=") else -bands[alert_type]
+            # NaN thresholds compare False, so unscoped rows never fire
+            mask = _OPERATORS[op](table.columns[column], thresholds)
+            results.append((alert_type, column, mask))
+        return results
+
+
+class PositionMonitor:
+    """Evaluates a RuleTable over position batches"""
+
+    def __init__(self, rules: Optional[RuleTable] = None):
+        self.rules = rules or RuleTable()
+
+    def evaluate(
+        self,
+        positions: Union[PositionTable, List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Alerts for one batch, ordered by position then by rule"""
+        source = None
+        if not isinstance(positions, PositionTable):
+            # Keep the caller's own values for alert messages
+            source = positions
+            positions = PositionTable.from_dicts(positions)
+
+        checks = self.rules.hits(positions)
+        rows, kinds = [], []
+        for kind, (_, _, mask) in enumerate(checks):
+            hits = np.flatnonzero(mask)
+            rows.append(hits)
+            kinds.append(np.full(len(hits), kind))
+        if not rows:
+            return []
+        rows, kinds = np.concatenate(rows), np.concatenate(kinds)
+        order = np.lexsort((kinds, rows))
+
+        alerts = []
+        for row, kind in zip(rows[order].tolist(), kinds[order].tolist()):
+            alert_type, column, _ = checks[kind]
+            position_id, value = _position_value(positions, source, row, column)
+            alerts.append(AgentHelpers._position_alert(alert_type, position_id, value))
+        return alerts
+
+    async def stream(
+        self,
+        batches: AsyncIterator[Union[PositionTable, List[Dict[str, Any]]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Consume position batches and yield alerts as each batch is checked;
+        only one batch is held in memory at a time
+        """
+        async for batch in batches:
+            for alert in self.evaluate(batch):
+                yield alert
+            # Let other tasks run between batches
+            await asyncio.sleep(0)
+
+
+class IncrementalMonitor:
+    """
+    Stateful monitor fed with position deltas. Only changed positions are
+    re-checked and only alert transitions are emitted, each alert carrying
+    "transition": "raised" or "cleared". An alert raised at its rule
+    threshold clears only once the value is past the threshold by the
+    alert type's hysteresis band, so values hovering at the line don't flap.
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(
+        self,
+        rules: Optional[RuleTable] = None,
+        hysteresis: Optional[Dict[str, float]] = None
+    ):
+        self.rules = rules or RuleTable()
+        self.hysteresis = dict(DEFAULT_HYSTERESIS if hysteresis is None else hysteresis)
+        # alert_type -> {position_id: value when raised}
+        self.active: Dict[str, Dict[Any, Any]] = {
+            alert_type: {} for alert_type in self.rules.rules
+        }
+
+    def update(
+        self,
+        changed: Union[PositionTable, List[Dict[str, Any]]] = (),
+        removed: Iterable[Any] = ()
+    ) -> List[Dict[str, Any]]:
+        """
+        Apply a delta: positions added or changed since the last update,
+        and ids of positions closed. Returns the resulting transitions.
+        """
+        transitions = []
+        for position_id in removed:
+            for alert_type, active in self.active.items():
+                if position_id in active:
+                    transitions.append(
+                        _transition(alert_type, position_id, active.pop(position_id), "cleared")
+                    )
+
+        source = None
+        if not isinstance(changed, PositionTable):
+            source = changed
+            changed = PositionTable.from_dicts(changed)
+        if not len(changed):
+            return transitions
+
+        ids = changed.ids.tolist()
+        raise_checks = self.rules.hits(changed)
+        hold_checks = self.rules.hits(changed, self.hysteresis)
+        rows, kinds, raised = [], [], []
+        for kind, ((alert_type, _, fires), (_, _, holds)) in enumerate(
+            zip(raise_checks, hold_checks)
+        ):
+            active = self.active.setdefault(alert_type, {})
+            was_active = np.fromiter((pid in active for pid in ids), bool, len(ids))
+            now_active = np.where(was_active, holds, fires)
+            for flag, mask in ((True, now_active & ~was_active), (False, was_active & ~now_active)):
+                hits = np.flatnonzero(mask)
+                rows.append(hits)
+                kinds.append(np.full(len(hits), kind))
+                raised.append(np.full(len(hits), flag))
+
+        rows, kinds, raised = np.concatenate(rows), np.concatenate(kinds), np.concatenate(raised)
+        for i in np.lexsort((kinds, rows)).tolist():
+            row, kind = int(rows[i]), int(kinds[i])
+            alert_type, column, _ = raise_checks[kind]
+            active = self.active[alert_type]
+            position_id, value = _position_value(changed, source, row, column)
+            if raised[i]:
+                active[position_id] = value
+                transitions.append(_transition(alert_type, position_id, value, "raised"))
+            else:
+                del active[position_id]
+                transitions.append(_transition(alert_type, position_id, value, "cleared"))
+        return transitions
+
+    def active_alerts(self) -> List[Dict[str, Any]]:
+        """Currently raised alerts, as monitor_positions would report them"""
+        return [
+            AgentHelpers._position_alert(alert_type, position_id, value)
+            for alert_type, active in self.active.items()
+            for position_id, value in active.items()
+        ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable alert state"""
+        return {
+            "version": self.SNAPSHOT_VERSION,
+            "active": {
+                alert_type: [[position_id, value] for position_id, value in active.items()]
+                for alert_type, active in self.active.items()
+            },
+        }
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """Load state written by snapshot(), e.g. after a restart"""
+        version = snapshot.get("version")
+        if version != self.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported monitor snapshot version {version}")
+        self.active = {alert_type: {} for alert_type in self.rules.rules}
+        for alert_type, entries in snapshot["active"].items():
+            self.active.setdefault(alert_type, {}).update(
+                (position_id, value) for position_id, value in entries
+            )
+
+
+def _position_value(
+    table: PositionTable,
+    source: Optional[Sequence[Dict[str, Any]]],
+    row: int,
+    column: str
+) -> tuple:
+    """(position id, column value), preferring the caller's own dict values"""
+    if source is not None:
+        position = source[row]
+        return position["id"], position.get(column, NUMERIC_COLUMNS[column])
+    return table.ids[row], float(table.columns[column][row])
+
+
+def _transition(alert_type: str, position_id: Any, value: Any, transition: str) -> Dict[str, Any]:
+    alert = AgentHelpers._position_alert(alert_type, position_id, value)
+    alert["transition"] = transition
+    return alert
@@ -0,0 +1,277 @@
+"""
+Columnar position storage for OpusAIAgent
+PositionTable keeps typed NumPy columns instead of one dict per position
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Numeric columns and the value used when a position dict lacks the key
+NUMERIC_COLUMNS = {
+    "value_usd": 0.0,
+    "apy": 0.0,
+    "current_apy": 0.0,
+    "il_percentage": 0.0,
+    "health_factor": np.inf,  # No leverage, can't be liquidated
+}
+
+# Dictionary-encoded string columns
+CODE_COLUMNS = ("protocol", "chain", "type")
+
+CODE_DTYPE = np.int32
+
+
+class StringPool:
+    """Interns strings (and None) to small integer codes"""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self._codes: Dict[Optional[str], int] = {}
+
+    def code(self, value: Optional[str]) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: Optional[str]) -> int:
+        """Code for value, or -1 if it was never interned"""
+        return self._codes.get(value, -1)
+
+    def encode(self, values: Iterable[Optional[str]], count: int = -1) -> np.ndarray:
+        return np.fromiter(map(self.code, values), CODE_DTYPE, count)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class PositionRow(Mapping):
+    """Zero-copy, read-only dict-like view of one PositionTable row"""
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table: "PositionTable", index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        table = self._table
+        if key in NUMERIC_COLUMNS:
+            return float(table.columns[key][self._index])
+        if key in CODE_COLUMNS:
+            return table.pool.values[table.columns[key][self._index]]
+        if key == "id":
+            return table.ids[self._index]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield "id"
+        yield from CODE_COLUMNS
+        yield from NUMERIC_COLUMNS
+
+    def __len__(self) -> int:
+        return 1 + len(CODE_COLUMNS) + len(NUMERIC_COLUMNS)
+
+    def __repr__(self) -> str:
+        return f"PositionRow({dict(self)!r})"
+
+
+class PositionTable:
+    """
+    Positions as typed columns: float64 value_usd, apy, current_apy,
+    il_percentage and health_factor; int32 protocol/chain/type codes into
+    a StringPool; and an object array of position ids. Iterating yields
+    PositionRow views, so code written for List[Dict] keeps working.
+    Each table built from dicts or columns gets its own pool unless one is
+    passed in; slices share their parent's.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        pool: StringPool
+    ):
+        self.ids = ids
+        self.columns = columns
+        self.pool = pool
+        # (table, start row) when this table is a slice view of another
+        self.base: Optional[Tuple["PositionTable", int]] = None
+
+    @classmethod
+    def from_dicts(
+        cls,
+        positions: Sequence[Dict[str, Any]],
+        pool: Optional[StringPool] = None
+    ) -> "PositionTable":
+        """Build from the existing List[Dict] position format"""
+        pool = StringPool() if pool is None else pool
+        n = len(positions)
+        columns = {
+            key: np.fromiter((p.get(key, default) for p in positions), np.float64, n)
+            for key, default in NUMERIC_COLUMNS.items()
+        }
+        for key in CODE_COLUMNS:
+            columns[key] = pool.encode((p.get(key) for p in positions), n)
+        ids = np.empty(n, dtype=object)
+        ids[:] = [p.get("id") for p in positions]
+        return cls(ids, columns, pool)
+
+    @classmethod
+    def from_columns(
+        cls,
+        ids: Sequence[Any],
+        pool: Optional[StringPool] = None,
+        **values: Sequence[Any]
+    ) -> "PositionTable":
+        """Build from per-column sequences; string columns hold names"""
+        pool = StringPool() if pool is None else pool
+        n = len(ids)
+        columns = {}
+        for key, default in NUMERIC_COLUMNS.items():
+            column = values.get(key)
+            columns[key] = (
+                np.full(n, default) if column is None
+                else np.asarray(column, dtype=np.float64)
+            )
+        for key in CODE_COLUMNS:
+            column = values.get(key)
+            columns[key] = pool.encode([None] * n if column is None else column, n)
+        id_array = np.empty(n, dtype=object)
+        id_array[:] = list(ids)
+        return cls(id_array, columns, pool)
+
+    @classmethod
+    def concat(
+        cls,
+        tables: Sequence["PositionTable"],
+        keys: Optional[Sequence[str]] = None
+    ) -> "PositionTable":
+        """
+        Stack tables, optionally only some columns. Back-to-back slices of
+        one table are re-joined without copying; tables with different
+        StringPools are re-encoded into a new pool.
+        """
+        keys = list(keys or (*NUMERIC_COLUMNS, *CODE_COLUMNS))
+
+        contiguous = _contiguous_span(tables)
+        if contiguous is not None:
+            parent, start, stop = contiguous
+            return cls(
+                parent.ids[start:stop],
+                {key: parent.columns[key][start:stop] for key in keys},
+                parent.pool
+            )
+
+        columns = {
+            key: np.concatenate([table.columns[key] for table in tables])
+            for key in keys
+        }
+        ids = np.concatenate([table.ids for table in tables]) if tables else np.empty(0, object)
+        pool = tables[0].pool if tables else StringPool()
+        if any(table.pool is not pool for table in tables):
+            pool = _merge_codes(tables, columns)
+        return cls(ids, columns, pool)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Materialize the List[Dict] format"""
+        return [dict(row) for row in self]
+
+    def names(self, key: str) -> List[Optional[str]]:
+        """Decoded values of a string column"""
+        values = self.pool.values
+        return [values[code] for code in self.columns[key].tolist()]
+
+    def distinct(self, key: str) -> int:
+        """Number of distinct values in a string column"""
+        return len(np.unique(self.columns[key]))
+
+    def __getattr__(self, key: str) -> np.ndarray:
+        # table.apy, table.protocol, ... return the column itself
+        columns = self.__dict__.get("columns")
+        if columns is not None and key in columns:
+            return columns[key]
+        raise AttributeError(key)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            # Slices of every column are views, not copies
+            view = PositionTable(
+                self.ids[index],
+                {key: column[index] for key, column in self.columns.items()},
+                self.pool
+            )
+            start, _, step = index.indices(len(self))
+            if step == 1:
+                parent, offset = self.base or (self, 0)
+                view.base = (parent, offset + start)
+            return view
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return PositionRow(self, index)
+
+    def __iter__(self) -> Iterator[PositionRow]:
+        for index in range(len(self)):
+            yield PositionRow(self, index)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, PositionTable):
+            return NotImplemented
+        return (
+            len(self) == len(other)
+            and list(self.ids) == list(other.ids)
+            and all(
+                np.array_equal(self.columns[key], other.columns[key])
+                for key in NUMERIC_COLUMNS
+            )
+            and all(self.names(key) == other.names(key) for key in CODE_COLUMNS)
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the typed columns (ids excluded)"""
+        return sum(column.nbytes for column in self.columns.values()) + self.ids.nbytes
+
+
+def _contiguous_span(tables: Sequence[PositionTable]) -> Optional[Tuple[PositionTable, int, int]]:
+    """(parent, start, stop) if the tables are consecutive slices of one parent"""
+    if not tables or tables[0].base is None:
+        return None
+    parent, start = tables[0].base
+    stop = start
+    for table in tables:
+        if table.base is None or table.base[0] is not parent or table.base[1] != stop:
+            return None
+        stop += len(table.ids)
+    return parent, start, stop
+
+
+def _merge_codes(tables: Sequence[PositionTable], columns: Dict[str, np.ndarray]) -> StringPool:
+    """
+    Re-encode the stacked code columns of tables from different pools into
+    one new pool, in place; each distinct pool is translated once
+    """
+    offsets: Dict[int, int] = {}
+    values: List[Optional[str]] = []
+    for table in tables:
+        if id(table.pool) not in offsets:
+            offsets[id(table.pool)] = len(values)
+            values.extend(table.pool.values)
+    merged = StringPool()
+    translation = merged.encode(values, len(values))
+    row_offsets = np.repeat(
+        np.fromiter((offsets[id(table.pool)] for table in tables), np.int64, len(tables)),
+        [len(table.ids) for table in tables]
+    )
+    for key in CODE_COLUMNS:
+        if key in columns:
+            columns[key] = translation[columns[key] + row_offsets]
+    return merged
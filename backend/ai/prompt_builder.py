@@ -0,0 +1,169 @@
+"""
+Prompt assembly for OpusAIAgent
+Templates from backend/ai/prompts are compiled once; prompts are packed into a
+token budget, filling higher-priority sections first and truncating the rest
+"""
+
+import os
+import string
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from backend.ai.ingest import estimate_tokens
+from backend.ai.positions import PositionTable
+
+PROMPT_DIR = os.path.join(os.path.dirname(__file__), "prompts")
+ELLIPSIS = "…"
+
+
+def count_tokens(text: str) -> int:
+    """Local estimate of the BPE token count of text (no tokenizer needed)"""
+    return sum(estimate_tokens(word) for word in text.split())
+
+
+class PromptTemplate:
+    """A str.format template split once into literal text and field names"""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        # Drop indentation and blank-line runs; they cost tokens, not meaning
+        lines = [line.strip() for line in text.strip().splitlines()]
+        text = "\n".join(line for i, line in enumerate(lines) if line or (i and lines[i - 1]))
+        self.segments: List[Tuple[str, Optional[str]]] = [
+            (literal, name) for literal, name, _, _ in string.Formatter().parse(text)
+        ]
+        self.fields = [name for _, name in self.segments if name]
+        self.fixed_tokens = count_tokens("".join(literal for literal, _ in self.segments))
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(
+            literal + (values.get(name, "") if name else "") for literal, name in self.segments
+        )
+
+
+@lru_cache(maxsize=None)
+def load_template(name: str, directory: str = PROMPT_DIR) -> PromptTemplate:
+    """prompts/<name>.txt, read and compiled on first use"""
+    with open(os.path.join(directory, f"{name}.txt"), "r", encoding="utf-8") as f:
+        return PromptTemplate(name, f.read())
+
+
+@dataclass
+class Section:
+    """
+    Content for one template field: parts are joined with separator and
+    kept in order until the budget runs out. Lower priority values are
+    filled first; the first part that doesn't fit is cut at a word boundary.
+    Several sections may share a field, e.g. to truncate its tail first.
+    """
+    field: str
+    parts: Sequence[str]
+    priority: int = 0
+    separator: str = "\n"
+
+
+@dataclass
+class Prompt:
+    """An assembled prompt and its estimated size"""
+    text: str
+    tokens: int
+    template: str
+    truncated: List[str] = field(default_factory=list)
+
+
+def _cut(text: str, budget: int) -> str:
+    """Longest word prefix of text within budget tokens"""
+    words, used = [], 0
+    for word in text.split():
+        cost = estimate_tokens(word)
+        if used + cost > budget:
+            break
+        words.append(word)
+        used += cost
+    return " ".join(words) + ELLIPSIS if words else ""
+
+
+def build_prompt(
+    template: Union[str, PromptTemplate],
+    sections: Iterable[Section],
+    budget: int
+) -> Prompt:
+    """Render template with as much of each section as fits in budget tokens"""
+    if isinstance(template, str):
+        template = load_template(template)
+    sections = list(sections)
+    remaining = budget - template.fixed_tokens
+    kept: Dict[int, List[str]] = {}
+    truncated: List[str] = []
+    for index in sorted(range(len(sections)), key=lambda i: sections[i].priority):
+        section = sections[index]
+        kept[index] = []
+        for part in section.parts:
+            cost = count_tokens(part)
+            if cost > remaining:
+                cut = _cut(part, remaining)
+                if cut:
+                    kept[index].append(cut)
+                    remaining -= count_tokens(cut)
+                truncated.append(section.field)
+                break
+            kept[index].append(part)
+            remaining -= cost
+
+    # Sections sharing a field are joined in the order they were given
+    values: Dict[str, List[str]] = {}
+    for index, section in enumerate(sections):
+        if kept[index]:
+            values.setdefault(section.field, []).append(section.separator.join(kept[index]))
+    text = template.render({name: "\n".join(texts) for name, texts in values.items()})
+    return Prompt(text, count_tokens(text), template.name, truncated)
+
+
+def _number(value: float) -> str:
+    return f"{value:.0f}" if abs(value) >= 100 else f"{value:.3g}"
+
+
+def compact_positions(
+    positions: Union[List[Dict[str, Any]], PositionTable]
+) -> List[str]:
+    """
+    A one-line summary, a header, then one pipe-separated row per position,
+    largest first so budget truncation drops the smallest positions
+    """
+    table = positions if isinstance(positions, PositionTable) else PositionTable.from_dicts(positions)
+    if not len(table):
+        return ["no positions"]
+    value = table.value_usd
+    # Position feeds use either apy or current_apy
+    apy = np.where(table.apy != 0, table.apy, table.current_apy)
+    total = float(value.sum())
+    average = float((apy * value).sum() / total) if total else float(apy.mean())
+    protocols, chains, types = table.names("protocol"), table.names("chain"), table.names("type")
+    rows = [
+        f"{len(table)} positions, ${total:,.0f} total, {average:.2f}% value-weighted APY",
+        "protocol|chain|type|usd|apy%|health",
+    ]
+    for i in np.argsort(-value, kind="stable").tolist():
+        health = table.health_factor[i]
+        rows.append("|".join([
+            protocols[i] or "-", chains[i] or "-", types[i] or "-",
+            _number(value[i]), _number(apy[i]),
+            _number(health) if np.isfinite(health) else "-",
+        ]))
+    return rows
+
+
+def compact_mapping(data: Dict[str, Any]) -> List[str]:
+    """key: value lines, nested mappings flattened to dotted keys"""
+    lines = []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            lines.extend(f"{key}.{line}" for line in compact_mapping(value))
+        elif isinstance(value, float):
+            lines.append(f"{key}: {_number(value)}")
+        else:
+            lines.append(f"{key}: {value}")
+    return lines
@@ -0,0 +1,455 @@
+"""
+LLM provider adapters for OpusAIAgent
+Async, concurrency-bounded access to Anthropic and OpenAI, with per-provider
+circuit breakers and timeouts adapted to observed latency
+"""
+
+import asyncio
+import importlib.util
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from backend.ai.metrics import (
+    LLM_FIRST_TOKEN, LLM_LATENCY, LLM_REQUESTS, LLM_TOKENS, estimate_tokens
+)
+
+logger = logging.getLogger(__name__)
+
+# The SDKs are only located here and imported when a provider is built;
+# importing them costs more than the rest of the agent together
+HAS_ANTHROPIC = importlib.util.find_spec("anthropic") is not None
+HAS_OPENAI = importlib.util.find_spec("openai") is not None
+
+
+class ProviderTimeout(Exception):
+    """Raised when a provider call exceeds its per-call timeout"""
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker over a provider's recent calls. It opens
+    when, over the last `window` calls (at least `min_calls`), the share
+    of failures reaches error_rate or the share of calls slower than
+    slow_call seconds reaches slow_rate. After `cooldown` seconds one
+    probe call is let through (half-open): success closes the breaker,
+    failure opens it again with the cooldown doubled (up to max_cooldown).
+
+    allow() returns the breaker's generation, which changes with every
+    state change; record() ignores calls admitted under an earlier one, so
+    a call that was already in flight when the breaker opened can neither
+    re-open it nor stand in for the half-open probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call: float = 10.0,
+        slow_rate: float = 0.8,
+        cooldown: float = 15.0,
+        max_cooldown: float = 300.0
+    ):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.generation = 0
+        self._probing = False
+        # (failed, slow) per recent call
+        self._calls: deque = deque(maxlen=window)
+        self.stats: Dict[str, int] = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> Optional[int]:
+        """
+        The generation to pass to record(), or None if the call must not go
+        ahead; claims the probe when half-open
+        """
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.stats["rejected"] += 1
+                return None
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                self.stats["rejected"] += 1
+                return None
+            self._probing = True
+        return self.generation
+
+    def is_probe(self, generation: int) -> bool:
+        return self.state == self.HALF_OPEN and generation == self.generation
+
+    def record(self, generation: int, failed: bool, elapsed: float):
+        """Outcome of a call admitted under generation"""
+        if generation != self.generation:
+            return
+        slow = elapsed >= self.slow_call
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if failed or slow:
+                self._open(self.cooldown * 2)
+            else:
+                self._transition(self.CLOSED)
+                self.cooldown = self.base_cooldown
+            return
+        self._calls.append((failed, slow))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(failed for failed, _ in self._calls)
+        slow_calls = sum(slow for _, slow in self._calls)
+        if (failures >= self.error_rate * len(self._calls)
+                or slow_calls >= self.slow_rate * len(self._calls)):
+            self._open(self.base_cooldown)
+
+    def release(self, generation: int):
+        """A call admitted under generation ended without an outcome (e.g. cancelled)"""
+        if self.is_probe(generation):
+            self._probing = False
+
+    def _open(self, cooldown: float):
+        self._transition(self.OPEN)
+        self.opened_at = time.monotonic()
+        self.cooldown = min(cooldown, self.max_cooldown)
+        self.stats["opened"] += 1
+
+    def _transition(self, state: str):
+        self.state = state
+        self.generation += 1
+        self._calls.clear()
+
+
+class LLMProvider:
+    """
+    Base provider: bounds in-flight calls with a semaphore, enforces a
+    per-call timeout around the async completion and rejects calls while
+    its circuit breaker is open.
+
+    timeout is the ceiling. Once min_samples calls have succeeded,
+    completions time out at timeout_multiplier x the timeout_quantile
+    latency (but at least min_timeout); timeout_quantile=None disables
+    this. Streams and half-open probes always get the full timeout.
+    """
+
+    name = "base"
+
+    def __init__(
+        self,
+        model: str,
+        max_tokens: int = 1000,
+        temperature: float = 0.7,
+        max_concurrency: int = 32,
+        timeout: float = 30.0,
+        timeout_quantile: Optional[float] = 0.99,
+        timeout_multiplier: float = 2.0,
+        min_timeout: float = 2.0,
+        min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.timeout_quantile = timeout_quantile
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.min_samples = min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Recent successful call latencies (seconds)
+        self.latencies = deque(maxlen=256)
+
+    def call_timeout(self) -> float:
+        """Timeout for the next completion: adaptive below the configured ceiling"""
+        if self.timeout_quantile is None or len(self.latencies) < self.min_samples:
+            return self.timeout
+        observed = self.latency_quantile(self.timeout_quantile) * self.timeout_multiplier
+        return min(self.timeout, max(self.min_timeout, observed))
+
+    def _admit(self) -> int:
+        generation = self.breaker.allow()
+        if generation is None:
+            LLM_REQUESTS.inc(provider=self.name, outcome="rejected")
+            raise CircuitOpen(f"{self.name} circuit open")
+        return generation
+
+    async def complete(self, prompt: str) -> str:
+        """Run one completion within the concurrency, time and breaker limits"""
+        generation = self._admit()
+        timeout = self.timeout if self.breaker.is_probe(generation) else self.call_timeout()
+        outcome = "error"
+        started = time.perf_counter()
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(self._complete(prompt), timeout)
+                    outcome = "ok"
+                except asyncio.TimeoutError:
+                    outcome = "timeout"
+                    raise ProviderTimeout(
+                        f"{self.name} call exceeded {timeout:.2f}s timeout"
+                    )
+        except asyncio.CancelledError:
+            # e.g. the losing side of a hedged request
+            outcome = "cancelled"
+            raise
+        finally:
+            self._record(prompt, generation, outcome, time.perf_counter() - started)
+        self.latencies.append(time.perf_counter() - started)
+        LLM_TOKENS.inc(estimate_tokens(result), provider=self.name, kind="completion")
+        return result
+
+    def _record(
+        self,
+        prompt: str,
+        generation: int,
+        outcome: str,
+        elapsed: float,
+        breaker_elapsed: Optional[float] = None
+    ):
+        if outcome == "cancelled":
+            self.breaker.release(generation)
+        else:
+            before = self.breaker.state
+            self.breaker.record(
+                generation, outcome != "ok", elapsed if breaker_elapsed is None else breaker_elapsed
+            )
+            if self.breaker.state != before:
+                logger.warning(f"{self.name} circuit {before} -> {self.breaker.state}")
+        LLM_REQUESTS.inc(provider=self.name, outcome=outcome)
+        LLM_LATENCY.observe(elapsed, provider=self.name)
+        LLM_TOKENS.inc(estimate_tokens(prompt), provider=self.name, kind="prompt")
+
+    def latency_quantile(self, q: float) -> Optional[float]:
+        """Observed latency at quantile q, or None without samples"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Yield text chunks as the provider produces them. The timeout
+        applies to the wait for each chunk, not to the whole stream.
+        """
+        generation = self._admit()
+        outcome = "error"
+        started = time.perf_counter()
+        first_chunk: Optional[float] = None
+        completion_tokens = 0
+        chunks = None
+        try:
+            async with self._semaphore:
+                chunks = self._stream(prompt)
+                started = time.perf_counter()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                    except StopAsyncIteration:
+                        outcome = "ok"
+                        break
+                    except asyncio.TimeoutError:
+                        outcome = "timeout"
+                        raise ProviderTimeout(
+                            f"{self.name} stream stalled for {self.timeout}s"
+                        )
+                    if chunk:
+                        if first_chunk is None:
+                            first_chunk = time.perf_counter() - started
+                            LLM_FIRST_TOKEN.observe(first_chunk, provider=self.name)
+                        completion_tokens += estimate_tokens(chunk)
+                        yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
+        finally:
+            # A long answer is not a slow provider: the breaker judges
+            # streams by their time to first chunk
+            elapsed = time.perf_counter() - started
+            self._record(prompt, generation, outcome, elapsed, first_chunk)
+            LLM_TOKENS.inc(completion_tokens, provider=self.name, kind="completion")
+            if chunks is not None:
+                await chunks.aclose()
+
+    async def _complete(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        # Providers without native streaming emit the full completion at once
+        yield await self._complete(prompt)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of calls currently holding a concurrency slot"""
+        return self.max_concurrency - self._semaphore._value
+
+
+class AnthropicProvider(LLMProvider):
+    """Claude via the native async client"""
+
+    name = "anthropic"
+
+    def __init__(self, api_key: str, model: str, **kwargs):
+        super().__init__(model, **kwargs)
+        import anthropic
+        # Client-level timeout is left to us; retries would hide latency
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+
+    async def _complete(self, prompt: str) -> str:
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self.client.messages.stream(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": prompt}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+
+class OpenAIProvider(LLMProvider):
+    """GPT models via the async client (openai>=1) or acreate (legacy SDK)"""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, model: str, **kwargs):
+        super().__init__(model, **kwargs)
+        import openai
+        self.sdk = openai
+        self.client: Optional[Any] = None
+        if hasattr(openai, "AsyncOpenAI"):
+            self.client = openai.AsyncOpenAI(api_key=api_key, max_retries=0)
+        else:
+            openai.api_key = api_key
+
+    def _request(self, prompt: str, **extra) -> dict:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            **extra,
+        }
+
+    async def _complete(self, prompt: str) -> str:
+        if self.client is not None:
+            response = await self.client.chat.completions.create(**self._request(prompt))
+        else:
+            response = await self.sdk.ChatCompletion.acreate(**self._request(prompt))
+        return response.choices[0].message.content
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        if self.client is not None:
+            response = await self.client.chat.completions.create(
+                **self._request(prompt, stream=True)
+            )
+            async for chunk in response:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+        else:
+            response = await self.sdk.ChatCompletion.acreate(
+                **self._request(prompt, stream=True)
+            )
+            async for chunk in response:
+                yield chunk.choices[0].delta.get("content", "")
+
+
+class HedgedRequest:
+    """
+    Hedge a primary provider with a backup: if the primary has not
+    answered within the hedge delay, fire the backup as well, return
+    whichever answers first and cancel the other
+    """
+
+    def __init__(
+        self,
+        primary: LLMProvider,
+        backup: LLMProvider,
+        delay: Optional[float] = None,
+        quantile: float = 0.9,
+        initial_delay: float = 2.0,
+        min_samples: int = 20
+    ):
+        self.primary = primary
+        self.backup = backup
+        self.delay = delay
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.stats: Dict[str, int] = {"requests": 0, "fired": 0, "won": 0}
+
+    def hedge_delay(self) -> float:
+        """Fixed delay if configured, else the primary's observed quantile"""
+        if self.delay is not None:
+            return self.delay
+        if len(self.primary.latencies) < self.min_samples:
+            return self.initial_delay
+        return self.primary.latency_quantile(self.quantile)
+
+    async def complete(self, prompt: str) -> str:
+        """Complete with the primary, hedging to the backup if it is slow"""
+        self.stats["requests"] += 1
+        primary = asyncio.ensure_future(self.primary.complete(prompt))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done:
+                if primary.exception() is None:
+                    return primary.result()
+                # Primary failed (or its circuit is open) before the hedge
+                # point: the backup is the only chance left
+                logger.warning(f"Hedged primary failed, using backup: {primary.exception()}")
+                self.stats["fired"] += 1
+                result = await self.backup.complete(prompt)
+                self.stats["won"] += 1
+                return result
+
+            self.stats["fired"] += 1
+            backup = asyncio.ensure_future(self.backup.complete(prompt))
+            tasks.append(backup)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["won"] += 1
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"Hedged call failed: {error}")
+            raise error
+        finally:
+            # Cancel the loser (or everything, if we were cancelled)
+            losers = [task for task in tasks if not task.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
@@ -0,0 +1,198 @@
+"""
+BM25 retrieval for OpusAIAgent
+Inverted index over backend/data/training, built offline and memory-mapped at startup
+
+Build with: python -m backend.ai.retrieval
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import struct
+import time
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backend.ai.binfile import SectionReader, pack_strings, write_sections
+from backend.ai.ingest import CHUNK_DIR, TRAINING_DIR, Chunk, ChunkStore, build_chunks
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AHBM"
+VERSION = 1
+
+INDEX_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "index")
+DEFAULT_INDEX = os.path.join(INDEX_DIR, "bm25.idx")
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have if in into is it its of on or
+so than that the their then there these this to was were will with you your
+""".split())
+
+# n_passages, n_terms, n_postings, n_sources, k1, b
+_HEADER = struct.Struct("<4sHxxIIIIdd")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords"""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def term_hash(term: str) -> int:
+    """Stable 64-bit term key; the index stores these instead of strings"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def load_passages(corpus: str = TRAINING_DIR, chunks: str = CHUNK_DIR) -> Iterator[Chunk]:
+    """Normalized, de-duplicated corpus chunks, rebuilding changed sources first"""
+    build_chunks(corpus, chunks)
+    store = ChunkStore(os.path.join(chunks, "chunks.bin"))
+    yield from store
+
+
+def build_index(
+    passages: Iterable[Chunk],
+    path: str = DEFAULT_INDEX,
+    k1: float = 1.2,
+    b: float = 0.75
+) -> int:
+    """
+    Write a BM25 index. Postings hold precomputed per-(term, passage)
+    BM25 weights, so a query is a scatter-add plus partial top-k.
+    Returns the number of passages indexed.
+    """
+    texts: List[str] = []
+    source_codes: List[int] = []
+    sources: Dict[str, int] = {}
+    term_counts: List[Counter] = []
+    for passage in passages:
+        texts.append(passage.text)
+        source_codes.append(sources.setdefault(passage.source, len(sources)))
+        term_counts.append(Counter(tokenize(passage.text)))
+
+    n = len(texts)
+    lengths = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float64)
+    average_length = lengths.mean() if n else 0.0
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for doc, counts in enumerate(term_counts):
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc, tf))
+
+    keyed = sorted((term_hash(term), term) for term in postings)
+    hashes = np.array([key for key, _ in keyed], dtype=np.uint64)
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError("Term hash collision; change the hash seed")
+
+    offsets = np.zeros(len(keyed) + 1, dtype=np.uint32)
+    doc_ids, weights = [], []
+    for i, (_, term) in enumerate(keyed):
+        entries = postings[term]
+        docs = np.array([doc for doc, _ in entries], dtype=np.uint32)
+        tf = np.array([count for _, count in entries], dtype=np.float64)
+        idf = np.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+        norm = k1 * (1 - b + b * lengths[docs] / average_length)
+        doc_ids.append(docs)
+        weights.append((idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+        offsets[i + 1] = offsets[i] + len(entries)
+
+    sections = [
+        hashes,
+        offsets,
+        np.concatenate(doc_ids) if doc_ids else np.zeros(0, np.uint32),
+        np.concatenate(weights) if weights else np.zeros(0, np.float32),
+        np.array(source_codes, dtype=np.uint32),
+        *pack_strings(list(sources)),
+        *pack_strings(texts),
+    ]
+    write_sections(
+        path,
+        _HEADER.pack(MAGIC, VERSION, n, len(keyed), int(offsets[-1]), len(sources), k1, b),
+        sections
+    )
+    return n
+
+
+class BM25Index:
+    """Read-only, memory-mapped BM25 index written by build_index"""
+
+    def __init__(self, path: str = DEFAULT_INDEX):
+        self.path = path
+        reader = SectionReader(path, _HEADER)
+        magic, version, n, n_terms, n_postings, n_sources, self.k1, self.b = reader.header
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} BM25 index: {path}")
+        self.size = n
+        self.hashes = reader.section(np.uint64, n_terms)
+        self.offsets = reader.section(np.uint32, n_terms + 1)
+        self.doc_ids = reader.section(np.uint32, n_postings)
+        self.weights = reader.section(np.float32, n_postings)
+        self.source_codes = reader.section(np.uint32, n)
+        self.sources = reader.strings(n_sources).tolist()
+        self.texts = reader.strings(n)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def text(self, doc: int) -> str:
+        return self.texts[doc]
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every passage for the query"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        hashes = self.hashes
+        for term, count in Counter(tokenize(query)).items():
+            key = np.uint64(term_hash(term))
+            i = int(np.searchsorted(hashes, key))
+            if i < len(hashes) and hashes[i] == key:
+                start, stop = int(self.offsets[i]), int(self.offsets[i + 1])
+                # Doc ids are unique within a posting list
+                scores[self.doc_ids[start:stop]] += count * self.weights[start:stop]
+        return scores
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, object]]:
+        """Top-k passages, best first, with their scores and sources"""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [
+            {
+                "score": float(scores[doc]),
+                "source": self.sources[self.source_codes[doc]],
+                "text": self.text(doc),
+            }
+            for doc in hits.tolist()
+        ]
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_INDEX) -> Optional["BM25Index"]:
+        """The index at path, or None if it hasn't been built"""
+        if not os.path.exists(path):
+            logger.info(f"No retrieval index at {path}; run python -m backend.ai.retrieval")
+            return None
+        return cls(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the BM25 retrieval index")
+    parser.add_argument("--corpus", default=TRAINING_DIR)
+    parser.add_argument("--chunks", default=CHUNK_DIR)
+    parser.add_argument("--output", default=DEFAULT_INDEX)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = build_index(load_passages(args.corpus, args.chunks), args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {count} passages into {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.0f} KB) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Monte Carlo risk engine for OpusAIAgent
+Seeded, vectorized price / funding / APY path simulation behind calculate_risk_metrics
+"""
+
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.ai.cache import LRUCache
+
+RISK_FREE_RATE = 4.0  # US Treasury rate, APY %
+PRICE_VOL = 0.65  # Annualized ETH volatility
+DAYS_PER_YEAR = 365.0
+
+
+@dataclass(frozen=True)
+class MarketModel:
+    """
+    Simulation assumptions for one StrategyType. Yield is an Ornstein-
+    Uhlenbeck process around the strategy's expected APY; for basis and
+    delta-neutral trades its volatility is the funding rate's, so funding
+    can turn negative. Those trades also carry hedge risk: the mark-to-
+    market of the spread between the two legs (another OU process, with
+    stationary std basis_vol per $1) and Poisson events at jump_rate per
+    year, e.g. a basis blowout or a forced re-hedge, that each lose
+    jump_loss of equity for good.
+    """
+    price_beta: float = 0.0  # Exposure of equity to the ETH price path
+    leverage: float = 1.0
+    liquidation_ltv: float = 0.0  # Debt / collateral at which a position is liquidated
+    liquidation_penalty: float = 0.0  # Fraction of equity lost when liquidated
+    yield_vol: float = 1.0  # Stationary std of the APY path, in APY points
+    yield_reversion: float = 12.0  # Per year
+    il_vol: float = 0.0  # Pair volatility for LP when the strategy gives no IL estimate
+    basis_vol: float = 0.0
+    basis_reversion: float = 20.0  # Per year
+    jump_rate: float = 0.0
+    jump_loss: float = 0.0
+
+
+# Keyed by StrategyType value
+MARKET_MODELS = {
+    "lending": MarketModel(yield_vol=2.0),
+    "liquidity_provision": MarketModel(yield_vol=4.0, il_vol=0.5),
+    "staking": MarketModel(price_beta=1.0, yield_vol=1.0),
+    "looping": MarketModel(
+        price_beta=1.0, leverage=3.0, liquidation_ltv=0.909,
+        liquidation_penalty=0.1, yield_vol=5.0
+    ),
+    "basis_trade": MarketModel(
+        yield_vol=15.0, yield_reversion=25.0,
+        basis_vol=0.01, jump_rate=3.0, jump_loss=0.02
+    ),
+    "delta_neutral": MarketModel(
+        yield_vol=10.0, yield_reversion=25.0,
+        basis_vol=0.008, jump_rate=2.0, jump_loss=0.015
+    ),
+    "tranching": MarketModel(yield_vol=1.0),
+    "principal_token_yield_token": MarketModel(yield_vol=0.5),
+}
+
+# Per-$1 results of one simulation, scaled by investment amount afterwards
+_SUMMARY_FIELDS = (
+    "var", "cvar", "max_drawdown", "liquidation_risk",
+    "impermanent_loss", "mean_return", "volatility"
+)
+
+
+class RiskEngine:
+    """
+    Simulates n_paths daily paths over horizon_days for many strategies at
+    once. All strategies share one seeded set of shocks, so results are
+    reproducible and comparable; per-strategy summaries are cached by their
+    simulation parameters.
+    """
+
+    def __init__(
+        self,
+        n_paths: int = 10000,
+        horizon_days: int = 30,
+        confidence: float = 0.95,
+        seed: int = 42,
+        price_vol: float = PRICE_VOL,
+        cache_size: int = 1024,
+        batch_size: int = 16
+    ):
+        self.n_paths = n_paths
+        self.horizon_days = horizon_days
+        self.confidence = confidence
+        self.seed = seed
+        self.price_vol = price_vol
+        self.batch_size = batch_size
+        self.cache = LRUCache(max_entries=cache_size)
+        self._shocks: Optional[Tuple[Tuple[int, int, int], np.ndarray]] = None
+
+    def shocks(self) -> np.ndarray:
+        """
+        (5, n_paths, horizon_days) standard normals: price, pair price,
+        yield, basis spread and hedge-event draws
+        """
+        key = (self.n_paths, self.horizon_days, self.seed)
+        if self._shocks is None or self._shocks[0] != key:
+            rng = np.random.default_rng(self.seed)
+            self._shocks = (key, rng.standard_normal((5, self.n_paths, self.horizon_days)))
+        return self._shocks[1]
+
+    def _cache_key(self, strategy: Any, confidence: float, yield_vol: Optional[float]) -> str:
+        return (
+            f"{strategy.type.value}:{strategy.expected_apy!r}:{strategy.il_exposure!r}:{yield_vol!r}:"
+            f"{self.n_paths}:{self.horizon_days}:{self.seed}:{self.price_vol!r}:{confidence!r}"
+        )
+
+    def simulate(
+        self,
+        strategies: Sequence[Any],
+        yield_vols: Optional[Sequence[Optional[float]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Equity value paths per $1 invested, shape
+        (len(strategies), n_paths, horizon_days + 1), plus whether each path
+        ended liquidated and its IL at the horizon, in one vectorized pass.
+        yield_vols overrides the model's APY volatility, e.g. from history.
+        """
+        models = [MARKET_MODELS.get(s.type.value, MarketModel()) for s in strategies]
+        yield_vols = yield_vols or [None] * len(strategies)
+
+        def column(values: List[float]) -> np.ndarray:
+            return np.asarray(values, dtype=np.float64)[:, None, None]
+
+        beta = column([m.price_beta for m in models])
+        leverage = column([m.leverage for m in models])
+        liquidation_ltv = column([m.liquidation_ltv for m in models])
+        penalty = column([m.liquidation_penalty for m in models])
+        apy = column([s.expected_apy for s in strategies])
+        yield_vol = column([
+            m.yield_vol if vol is None else vol for m, vol in zip(models, yield_vols)
+        ])
+        reversion = column([m.yield_reversion for m in models])
+        # Pair volatility giving an expected annual IL of il_exposure %
+        # (E[IL] ~ sigma^2 T / 8 for small sigma)
+        il_vol = column([
+            np.sqrt(8 * s.il_exposure / 100) if s.il_exposure > 0
+            else (m.il_vol if s.type.value == "liquidity_provision" else 0.0)
+            for s, m in zip(strategies, models)
+        ])
+
+        z_price, z_pair, z_yield, z_basis, z_event = self.shocks()
+        dt = 1 / DAYS_PER_YEAR
+        steps = self.horizon_days
+        start = np.zeros((len(strategies), self.n_paths, 1))
+
+        # ETH price and LP pair price ratio: driftless GBM
+        price_sigma = self.price_vol * np.sqrt(dt)
+        log_price = np.cumsum(price_sigma * z_price - price_sigma ** 2 / 2, axis=-1)
+        price = np.exp(np.concatenate([start[0], log_price], axis=-1))
+        pair_sigma = il_vol * np.sqrt(dt)
+        pair = np.exp(np.concatenate(
+            [start, np.cumsum(pair_sigma * z_pair - pair_sigma ** 2 / 2, axis=-1)], axis=-1
+        ))
+        impermanent_loss = 2 * np.sqrt(pair) / (1 + pair) - 1
+
+        # APY / funding: mean-reverting deviation around the expected APY
+        decay = 1 - reversion * dt
+        scale = yield_vol * np.sqrt(2 * reversion * dt)
+        deviation = np.zeros((len(strategies), self.n_paths, steps))
+        level = np.zeros((len(strategies), self.n_paths))
+        for t in range(steps):
+            level = level * decay[..., 0] + scale[..., 0] * z_yield[:, t]
+            deviation[..., t] = level
+        daily_yield = (apy + deviation) / 100 * dt
+        accrued = np.concatenate([start, np.cumsum(daily_yield, axis=-1)], axis=-1)
+
+        equity = 1 + beta * leverage * (price - 1) + impermanent_loss + accrued
+
+        # Hedged trades: spread mark-to-market and permanent hedge-event losses
+        hedged = [i for i, m in enumerate(models) if m.basis_vol > 0 or m.jump_rate > 0]
+        if hedged:
+            equity[hedged] += self._hedge_losses([models[i] for i in hedged], z_basis, z_event)
+
+        # Leveraged positions: liquidated the first time debt / collateral
+        # crosses the threshold; equity is then frozen less the penalty
+        levered = (leverage > 1) & (liquidation_ltv > 0)
+        ltv = np.where(levered, (leverage - 1) / (leverage * price), 0.0)
+        hit = levered & (ltv >= liquidation_ltv)
+        liquidated = np.logical_or.accumulate(hit, axis=-1)
+        if liquidated.any():
+            first = np.argmax(hit, axis=-1)[..., None]
+            frozen = np.take_along_axis(equity, first, axis=-1) * (1 - penalty)
+            equity = np.where(liquidated, frozen, equity)
+
+        return equity, liquidated[..., -1], impermanent_loss[..., -1]
+
+    def _hedge_losses(
+        self,
+        models: List[MarketModel],
+        z_basis: np.ndarray,
+        z_event: np.ndarray
+    ) -> np.ndarray:
+        """(len(models), n_paths, horizon_days + 1) equity change per $1 from hedge risk"""
+        dt = 1 / DAYS_PER_YEAR
+        out = np.zeros((len(models), self.n_paths, self.horizon_days + 1))
+        for i, model in enumerate(models):
+            if model.basis_vol > 0:
+                decay = 1 - model.basis_reversion * dt
+                scale = model.basis_vol * np.sqrt(2 * model.basis_reversion * dt)
+                level = np.zeros(self.n_paths)
+                for t in range(self.horizon_days):
+                    level = level * decay + scale * z_basis[:, t]
+                    out[i, :, t + 1] = level
+            if model.jump_rate > 0:
+                # An event on a day when its draw exceeds the 1 - rate*dt quantile
+                threshold = NormalDist().inv_cdf(1 - min(model.jump_rate * dt, 0.5))
+                events = np.cumsum(z_event > threshold, axis=-1)
+                out[i, :, 1:] -= model.jump_loss * events
+        return out
+
+    def _summaries(
+        self,
+        equity: np.ndarray,
+        liquidated: np.ndarray,
+        il: np.ndarray,
+        confidence: float
+    ) -> Dict[str, np.ndarray]:
+        """Per-strategy, per-$1 metrics from simulated paths"""
+        returns = equity[..., -1] - 1
+        cutoff = np.quantile(returns, 1 - confidence, axis=-1)
+        tail = returns <= cutoff[:, None]
+        tail_mean = (returns * tail).sum(axis=-1) / np.maximum(tail.sum(axis=-1), 1)
+
+        peak = np.maximum.accumulate(equity, axis=-1)
+        drawdown = (1 - equity / peak).max(axis=-1)
+
+        years = self.horizon_days / DAYS_PER_YEAR
+        return {
+            "var": np.maximum(-cutoff, 0.0),
+            "cvar": np.maximum(-tail_mean, 0.0),
+            "max_drawdown": np.quantile(drawdown, confidence, axis=-1),
+            "liquidation_risk": liquidated.mean(axis=-1),
+            "impermanent_loss": np.abs(il.mean(axis=-1)),
+            "mean_return": returns.mean(axis=-1) / years,
+            "volatility": returns.std(axis=-1) / np.sqrt(years),
+        }
+
+    def summarize(
+        self,
+        strategies: Sequence[Any],
+        confidence: Optional[float] = None,
+        yield_vols: Optional[Sequence[Optional[float]]] = None
+    ) -> List[Dict[str, float]]:
+        """Per-$1 metrics per strategy; only uncached parameter sets are simulated"""
+        confidence = confidence or self.confidence
+        yield_vols = yield_vols or [None] * len(strategies)
+        keys = [
+            self._cache_key(s, confidence, vol) for s, vol in zip(strategies, yield_vols)
+        ]
+        results = [self.cache.get(key) for key in keys]
+        fresh: Dict[str, Dict[str, float]] = {}
+
+        # One simulation per distinct missing parameter set
+        missing: Dict[str, Tuple[Any, Optional[float]]] = {}
+        for key, strategy, vol, result in zip(keys, strategies, yield_vols, results):
+            if result is None:
+                missing.setdefault(key, (strategy, vol))
+        if missing:
+            pending = list(missing.items())
+            # Path matrices are strategies x n_paths x days; bound them per pass
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                summaries = self._summaries(
+                    *self.simulate(
+                        [strategy for _, (strategy, _) in chunk],
+                        [vol for _, (_, vol) in chunk]
+                    ),
+                    confidence
+                )
+                for i, (key, _) in enumerate(chunk):
+                    fresh[key] = {name: float(summaries[name][i]) for name in _SUMMARY_FIELDS}
+                    self.cache.set(key, fresh[key])
+            results = [
+                result if result is not None else fresh[key]
+                for key, result in zip(keys, results)
+            ]
+        return results
+
+    def metrics(
+        self,
+        strategies: Sequence[Any],
+        investment_amounts: Sequence[float],
+        confidence: Optional[float] = None,
+        yield_vols: Optional[Sequence[Optional[float]]] = None
+    ) -> List[List[Dict[str, float]]]:
+        """Risk metrics for every (strategy, investment amount) pair"""
+        confidence = confidence or self.confidence
+        summaries = self.summarize(strategies, confidence, yield_vols)
+        return [
+            self._scaled(summary, confidence, investment_amounts) for summary in summaries
+        ]
+
+    def pair_metrics(
+        self,
+        strategies: Sequence[Any],
+        investment_amounts: Sequence[float],
+        confidence: Optional[float] = None,
+        yield_vols: Optional[Sequence[Optional[float]]] = None
+    ) -> List[Dict[str, float]]:
+        """
+        Risk metrics for strategies[i] at investment_amounts[i] only;
+        strategies sharing simulation parameters are simulated once
+        """
+        confidence = confidence or self.confidence
+        summaries = self.summarize(strategies, confidence, yield_vols)
+        return [
+            self._scaled(summary, confidence, [amount])[0]
+            for summary, amount in zip(summaries, investment_amounts)
+        ]
+
+    def _scaled(
+        self,
+        summary: Dict[str, float],
+        confidence: float,
+        investment_amounts: Sequence[float]
+    ) -> List[Dict[str, float]]:
+        """A per-$1 summary as metrics at each investment amount"""
+        amounts = np.asarray(investment_amounts, dtype=np.float64)
+        excess = summary["mean_return"] * 100 - RISK_FREE_RATE
+        volatility = summary["volatility"] * 100
+        shared = {
+            "confidence": confidence,
+            "horizon_days": self.horizon_days,
+            "max_drawdown": summary["max_drawdown"],
+            "sharpe_ratio": excess / volatility if volatility > 0 else 0,
+            "liquidation_risk": summary["liquidation_risk"],
+            "impermanent_loss": summary["impermanent_loss"],
+            "volatility": summary["volatility"],
+        }
+        return [
+            {**shared, "var": var, "cvar": cvar}
+            for var, cvar in zip(
+                (summary["var"] * amounts).tolist(),
+                (summary["cvar"] * amounts).tolist()
+            )
+        ]
@@ -0,0 +1,140 @@
+"""
+Vectorized strategy screening for OpusAIAgent
+Columnar strategy universe with boolean-mask filters and partial top-k ranking
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from backend.ai.agent_helpers import StrategySkeleton
+from backend.ai.metrics import span
+
+# RiskLevel values in ascending order; the column stores the position
+RISK_ORDER = ["low", "medium", "high", "extreme"]
+RISK_CODES = {value: code for code, value in enumerate(RISK_ORDER)}
+
+UNIVERSE_DTYPE = np.dtype([
+    ("expected_apy", "f8"),
+    ("gas_cost_usd", "f8"),
+    ("minimum_investment", "f8"),
+    ("il_exposure", "f8"),
+    ("base_confidence", "f8"),
+    ("risk", "i1"),
+])
+
+
+class StrategyUniverse:
+    """
+    Strategy skeletons stored as a NumPy structured array. Screening is
+    done with column masks and only the top-k winners become YieldStrategy
+    objects.
+    """
+
+    def __init__(self, skeletons: Iterable[StrategySkeleton] = ()):
+        self.skeletons: List[StrategySkeleton] = []
+        self.table = np.zeros(0, dtype=UNIVERSE_DTYPE)
+        self.add(skeletons)
+
+    def add(self, skeletons: Iterable[StrategySkeleton]):
+        """Append skeletons, e.g. strategies derived from live pool data"""
+        skeletons = list(skeletons)
+        if not skeletons:
+            return
+        rows = np.zeros(len(skeletons), dtype=UNIVERSE_DTYPE)
+        for i, skeleton in enumerate(skeletons):
+            fields = skeleton.fields
+            rows[i] = (
+                fields["expected_apy"],
+                fields["gas_cost_usd"],
+                fields["minimum_investment"],
+                fields["il_exposure"],
+                skeleton.base_confidence,
+                RISK_CODES[fields["risk_level"].value],
+            )
+        self.skeletons.extend(skeletons)
+        self.table = np.concatenate([self.table, rows])
+
+    def __len__(self) -> int:
+        return len(self.skeletons)
+
+    def screen(
+        self,
+        risk_tolerance: Any,
+        target_apy: Optional[float] = None,
+        max_gas_usd: float = 100.0
+    ) -> np.ndarray:
+        """Boolean mask of strategies matching the user's criteria"""
+        table = self.table
+        mask = table["gas_cost_usd"] <= max_gas_usd
+
+        # Low risk tolerance excludes high and extreme strategies
+        if risk_tolerance.value == "low":
+            mask &= table["risk"] < RISK_CODES["high"]
+
+        # Allow strategies within 20% of the target APY
+        if target_apy:
+            mask &= table["expected_apy"] >= target_apy * 0.8
+
+        return mask
+
+    def top_k(self, mask: np.ndarray, k: int) -> np.ndarray:
+        """
+        Row indices of the k highest-APY matches, best first. Ties keep
+        universe order, matching a stable full sort.
+        """
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > k:
+            apy = self.table["expected_apy"][candidates]
+            # k-th best APY via partial selection, then keep everything
+            # above it plus the earliest rows tied with it
+            threshold = np.partition(apy, len(apy) - k)[len(apy) - k]
+            above = candidates[apy > threshold]
+            tied = candidates[apy == threshold][:k - len(above)]
+            candidates = np.concatenate([above, tied])
+        order = np.lexsort((candidates, -self.table["expected_apy"][candidates]))
+        return candidates[order]
+
+    def confidence(self, rows: np.ndarray, portfolio: Any) -> np.ndarray:
+        """Vectorized StrategyBuilder._calculate_confidence for the given rows"""
+        confidence = self.table["base_confidence"][rows].copy()
+
+        # Adjust based on risk match
+        risk_code = RISK_CODES[portfolio.risk_tolerance.value]
+        confidence += np.where(self.table["risk"][rows] == risk_code, 10.0, 0.0)
+
+        # Adjust based on portfolio size
+        if portfolio.total_value_usd > 10000:
+            confidence += 5
+        elif portfolio.total_value_usd < 1000:
+            confidence -= 10
+
+        return np.clip(confidence, 0, 100)
+
+    def recommend(
+        self,
+        portfolio: Any,
+        target_apy: Optional[float] = None,
+        max_gas_usd: float = 100.0,
+        k: int = 5
+    ) -> List[Any]:
+        """Screen, rank and materialize the top-k YieldStrategy objects"""
+        from backend.ai.agent import YieldStrategy
+
+        with span("screening"):
+            mask = self.screen(portfolio.risk_tolerance, target_apy, max_gas_usd)
+            rows = self.top_k(mask, k)
+            confidence = self.confidence(rows, portfolio)
+
+        with span("strategy_build"):
+            return [
+                YieldStrategy(
+                    **self.skeletons[row].strategy_fields(),
+                    confidence_score=float(score)
+                )
+                for row, score in zip(rows.tolist(), confidence.tolist())
+            ]
+
+    @classmethod
+    def from_skeletons(cls, skeletons: Dict[str, StrategySkeleton]) -> "StrategyUniverse":
+        return cls(skeletons.values())
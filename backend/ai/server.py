@@ -0,0 +1,491 @@
+"""
+Resident OpusAIAgent server
+Serves recommend/analyze/explain/monitor/risk over a local socket, so callers
+(e.g. the TypeScript services) pay the agent's startup cost once per worker
+
+Frames, both directions: a big-endian header (body length u32, request id u32,
+method or status u8) followed by a UTF-8 JSON body. Requests on one connection
+may be pipelined; responses carry the request id and can arrive out of order.
+Status 0 is a result, 1 an error ({"error": message}).
+
+Run with: python -m backend.ai.server --workers 4 [--metrics-port 9464]
+With --metrics-port, worker i serves Prometheus metrics on port + i.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import time
+from dataclasses import asdict, is_dataclass
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.ai.agent import OpusAIAgent, Portfolio, RiskLevel, StrategyType, YieldStrategy
+from backend.ai.metrics import serve_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.getenv("AI_SERVER_SOCKET", "/tmp/apyhub-ai.sock")
+
+_FRAME = struct.Struct(">IIB")
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+METHOD_PING = 0
+METHOD_RECOMMEND = 1
+METHOD_ANALYZE = 2
+METHOD_EXPLAIN = 3
+METHOD_MONITOR = 4
+METHOD_RISK = 5
+
+
+class MicroBatcher:
+    """
+    Gathers concurrent submissions sharing a key into one handler call.
+    A batch runs when it reaches max_batch items or max_delay seconds
+    after its first item, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 256,
+        max_delay: float = 0.002
+    ):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.items = 0
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_batch:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.max_delay, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            asyncio.ensure_future(self._run(key, batch))
+
+    async def _run(self, key: Hashable, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.handler(key, [item for item, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self._settle(batch, e)
+                return
+            # One bad item shouldn't fail its neighbours: retry them one at
+            # a time so only the requests that fail on their own get an error
+            logger.warning(f"Batch of {len(batch)} failed ({e}); retrying items individually")
+            for item, future in batch:
+                if future.done():
+                    continue
+                try:
+                    self._settle([(item, future)], None, await self.handler(key, [item]))
+                except Exception as item_error:
+                    self._settle([(item, future)], item_error)
+            return
+        self._settle(batch, None, results)
+
+    @staticmethod
+    def _settle(
+        batch: List[Tuple[Any, asyncio.Future]],
+        error: Optional[BaseException],
+        results: Sequence[Any] = ()
+    ):
+        if error is None and len(results) != len(batch):
+            error = RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} items")
+        for i, (_, future) in enumerate(batch):
+            # Callers that disconnected meanwhile have cancelled their future
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+
+def _portfolio(data: Dict[str, Any]) -> Portfolio:
+    return Portfolio(
+        address=data["address"],
+        total_value_usd=float(data["total_value_usd"]),
+        positions=data.get("positions", []),
+        chains=data.get("chains", []),
+        risk_tolerance=RiskLevel(data.get("risk_tolerance", RiskLevel.MEDIUM.value)),
+        preferred_protocols=data.get("preferred_protocols", [])
+    )
+
+
+def _strategy(data: Dict[str, Any]) -> YieldStrategy:
+    return YieldStrategy(**{
+        **data,
+        "type": StrategyType(data["type"]),
+        "risk_level": RiskLevel(data["risk_level"]),
+    })
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if is_dataclass(value) and not isinstance(value, type):
+        return asdict(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_frame(request_id: int, code: int, body: Any) -> bytes:
+    payload = json.dumps(body, default=_json_default, separators=(",", ":")).encode("utf-8")
+    return _FRAME.pack(len(payload), request_id, code) + payload
+
+
+class AgentServer:
+    """One worker's request dispatcher around a single OpusAIAgent"""
+
+    def __init__(self, agent: OpusAIAgent, max_batch: int = 256, max_delay: float = 0.002):
+        self.agent = agent
+        self.recommend_batcher = MicroBatcher(self._recommend_batch, max_batch, max_delay)
+        self.analyze_batcher = MicroBatcher(self._analyze_batch, max_batch, max_delay)
+        self.risk_batcher = MicroBatcher(self._risk_batch, max_batch, max_delay)
+        self.methods: Dict[int, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+            METHOD_PING: self.ping,
+            METHOD_RECOMMEND: self.recommend,
+            METHOD_ANALYZE: self.analyze,
+            METHOD_EXPLAIN: self.explain,
+            METHOD_MONITOR: self.monitor,
+            METHOD_RISK: self.risk,
+        }
+
+    # Methods: params dict in, JSON-serializable result out
+
+    async def ping(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"pid": os.getpid()}
+
+    async def recommend(self, params: Dict[str, Any]) -> List[YieldStrategy]:
+        key = (params.get("target_apy"), float(params.get("max_gas_usd", 100.0)))
+        return await self.recommend_batcher.submit(key, _portfolio(params["portfolio"]))
+
+    async def analyze(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.analyze_batcher.submit(None, _portfolio(params["portfolio"]))
+
+    async def explain(self, params: Dict[str, Any]) -> Dict[str, str]:
+        # LLM-bound; concurrency is already bounded per provider
+        explanation = await self.agent.explain_strategy(
+            _strategy(params["strategy"]), _portfolio(params["portfolio"])
+        )
+        return {"explanation": explanation}
+
+    async def monitor(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Each request is already one vectorized pass over its positions
+        return await self.agent.monitor_positions(params["positions"])
+
+    async def risk(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        item = (_strategy(params["strategy"]), float(params["investment_amount"]))
+        return await self.risk_batcher.submit(params.get("confidence"), item)
+
+    # Batch handlers behind the micro-batchers
+
+    async def _recommend_batch(self, key: Tuple, portfolios: List[Portfolio]) -> List[Any]:
+        target_apy, max_gas_usd = key
+        return await self.agent.get_strategy_recommendations(portfolios, target_apy, max_gas_usd)
+
+    async def _analyze_batch(self, key: None, portfolios: List[Portfolio]) -> List[Any]:
+        return await self.agent.analyze_portfolios(portfolios)
+
+    async def _risk_batch(
+        self,
+        confidence: Optional[float],
+        items: List[Tuple[YieldStrategy, float]]
+    ) -> List[Dict[str, Any]]:
+        # Only the requested (strategy, amount) pairs; the risk engine
+        # simulates each distinct parameter set once, so identical strategies
+        # share a simulation and same-id strategies with different
+        # parameters don't
+        strategies, amounts = zip(*items)
+        return await self.agent.calculate_risk_metrics_pairs(
+            list(strategies), list(amounts), confidence
+        )
+
+    # Transport
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(_FRAME.size)
+                length, request_id, method = _FRAME.unpack(header)
+                if length > MAX_FRAME_BYTES:
+                    logger.warning(f"Closing connection: {length} byte frame")
+                    break
+                body = await reader.readexactly(length)
+                # Pipelined requests run concurrently so they can share batches
+                task = asyncio.ensure_future(self._respond(writer, request_id, method, body))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, request_id: int, method: int, body: bytes):
+        try:
+            handler = self.methods.get(method)
+            if handler is None:
+                raise ValueError(f"Unknown method {method}")
+            frame = encode_frame(request_id, STATUS_OK, await handler(json.loads(body or b"{}")))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Request {request_id} (method {method}) failed: {e}")
+            frame = encode_frame(request_id, STATUS_ERROR, {"error": str(e)})
+        if writer.is_closing():
+            return
+        writer.write(frame)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def serve(
+    sock: socket.socket,
+    max_batch: int = 256,
+    max_delay: float = 0.002,
+    metrics_port: Optional[int] = None
+):
+    """Run one worker on an already bound, listening socket until SIGTERM/SIGINT"""
+    agent = OpusAIAgent()
+    metrics = await serve_metrics(port=metrics_port) if metrics_port is not None else None
+    server = AgentServer(agent, max_batch, max_delay)
+    if sock.family == socket.AF_UNIX:
+        listener = await asyncio.start_unix_server(server.handle_connection, sock=sock)
+    else:
+        listener = await asyncio.start_server(server.handle_connection, sock=sock)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    logger.info(f"Agent worker {os.getpid()} serving")
+    async with listener:
+        await stop.wait()
+    if metrics is not None:
+        metrics.close()
+
+
+def bind(address: str, backlog: int = 1024) -> socket.socket:
+    """Listening socket for a unix path or host:port"""
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, int(port)))
+    else:
+        if os.path.exists(address):
+            os.unlink(address)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(address)
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def run(
+    address: str = DEFAULT_SOCKET,
+    workers: int = 1,
+    max_batch: int = 256,
+    max_delay: float = 0.002,
+    metrics_port: Optional[int] = None
+):
+    """
+    Bind once, then fork workers that all accept on the shared socket.
+    Modules are imported before forking so workers share them copy-on-write.
+    """
+    sock = bind(address)
+    if workers <= 1:
+        asyncio.run(serve(sock, max_batch, max_delay, metrics_port))
+        return
+
+    # Keep preloaded objects out of the collector so workers don't copy their pages
+    gc.freeze()
+    children: Dict[int, Tuple[int, float]] = {}  # pid -> (worker index, start time)
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            # Respawned workers would otherwise inherit the parent's handlers
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                # Each worker has its own registry, so its own port
+                port = None if metrics_port is None else metrics_port + index
+                asyncio.run(serve(sock, max_batch, max_delay, port))
+            finally:
+                os._exit(0)
+        children[pid] = (index, time.monotonic())
+
+    for index in range(workers):
+        spawn(index)
+    logger.info(f"Started {workers} agent workers on {address}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, started = children.pop(pid, (None, 0.0))
+        if stopping or index is None:
+            continue
+        # A worker that died on its own is replaced; one that keeps dying
+        # right after start is respawned at most once per second
+        logger.error(f"Agent worker {pid} exited with status {status}; restarting")
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        if not stopping:
+            spawn(index)
+    sock.close()
+    if sock.family == socket.AF_UNIX and os.path.exists(address):
+        os.unlink(address)
+
+
+class AgentClient:
+    """
+    Minimal asyncio client for the framed protocol, with pipelining. Calls
+    time out after `timeout` seconds, and all pending calls fail as soon as
+    the connection (or the receiver task) dies.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        timeout: Optional[float] = 30.0
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self._next_id = 0
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(
+        cls,
+        address: str = DEFAULT_SOCKET,
+        timeout: Optional[float] = 30.0
+    ) -> "AgentClient":
+        if ":" in address:
+            host, port = address.rsplit(":", 1)
+            return cls(*await asyncio.open_connection(host, int(port)), timeout=timeout)
+        return cls(*await asyncio.open_unix_connection(address), timeout=timeout)
+
+    async def call(
+        self,
+        method: int,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Any:
+        if self._receiver.done():
+            raise ConnectionError("Agent server connection is closed")
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        try:
+            self.writer.write(encode_frame(request_id, method, params or {}))
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Agent server call (method {method}) timed out")
+        finally:
+            self._waiting.pop(request_id, None)
+
+    async def _receive(self):
+        try:
+            while True:
+                length, request_id, status = _FRAME.unpack(await self.reader.readexactly(_FRAME.size))
+                body = json.loads(await self.reader.readexactly(length))
+                future = self._waiting.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if status == STATUS_OK:
+                    future.set_result(body)
+                else:
+                    future.set_exception(RuntimeError(body["error"]))
+        except asyncio.CancelledError:
+            self._fail_waiting(ConnectionError("Agent client closed"))
+            raise
+        except Exception as e:
+            # Lost connection, or a frame we can't parse (framing is then lost too)
+            self._fail_waiting(ConnectionError(f"Agent server connection lost: {e!r}"))
+            self.writer.close()
+
+    def _fail_waiting(self, error: Exception):
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(error)
+        self._waiting.clear()
+
+    async def close(self):
+        self._receiver.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve OpusAIAgent over a local socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="unix socket path or host:port")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve /metrics and /traces on 127.0.0.1 from this port (+ worker index)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    run(args.socket, args.workers, args.max_batch, args.max_delay_ms / 1000, args.metrics_port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""PortfolioBatch results must match analyze_portfolio exactly"""
+
+import asyncio
+import math
+
+import pytest
+
+from backend.ai.agent import OpusAIAgent, Portfolio, RiskLevel
+from backend.ai.agent_helpers import OpportunityFinder
+from backend.ai.batch_analysis import PortfolioBatch
+from backend.ai.benchmarks.synthetic import generate_portfolios
+from backend.ai.positions import PositionTable
+from backend.ai.timeseries import SeriesStore
+
+
+def _close(a, b) -> bool:
+    """Equal up to float rounding, with identical types throughout"""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_close(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_close(x, y) for x, y in zip(a, b))
+    if isinstance(a, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+@pytest.fixture
+def agent(tmp_path):
+    agent = OpusAIAgent()
+    agent.apy_history = SeriesStore(str(tmp_path))
+    yield agent
+    agent.apy_history.close()
+
+
+def _single(agent, portfolios):
+    async def run():
+        return await asyncio.gather(*(agent.analyze_portfolio(p) for p in portfolios))
+    return asyncio.run(run())
+
+
+def _batch(agent, portfolios):
+    return asyncio.run(agent.analyze_portfolios(portfolios))
+
+
+def _edge_portfolios(as_table: bool):
+    """No positions, only idle capital, and positions missing optional keys"""
+    positions = [
+        [],
+        [{"id": "a", "protocol": "Aave V3", "chain": "Ethereum", "type": "lending",
+          "value_usd": 5000.0, "apy": 3.5, "health_factor": 1.05}],
+        [{"id": "b", "value_usd": 100.0}, {"id": "c", "protocol": "Curve", "apy": 8.0}],
+    ]
+    totals = [0.0, 12000.0, 100.0]
+    return [
+        Portfolio(
+            address=f"0x{i}",
+            total_value_usd=total,
+            positions=PositionTable.from_dicts(p) if as_table else p,
+            chains=["Ethereum"],
+            risk_tolerance=RiskLevel.LOW,
+            preferred_protocols=[]
+        )
+        for i, (p, total) in enumerate(zip(positions, totals))
+    ]
+
+
+@pytest.mark.parametrize("as_dicts", [True, False])
+def test_batch_matches_single(agent, as_dicts):
+    portfolios = generate_portfolios(300, as_dicts=as_dicts)
+    assert _close(_single(agent, portfolios), _batch(agent, portfolios))
+
+
+@pytest.mark.parametrize("as_table", [False, True])
+def test_batch_matches_single_on_edge_cases(agent, as_table):
+    portfolios = _edge_portfolios(as_table)
+    assert _close(_single(agent, portfolios), _batch(agent, portfolios))
+
+
+def test_table_and_dict_batches_agree(agent):
+    tables = generate_portfolios(200)
+    dicts = generate_portfolios(200, as_dicts=True)
+    assert _close(_batch(agent, tables), _batch(agent, dicts))
+
+
+def test_batch_uses_apy_history(agent):
+    for day in range(agent.config["history_min_samples"]):
+        agent.apy_history.append(OpportunityFinder.UPGRADE_PROTOCOL, day * 86400, 12.0 + day % 3)
+        agent.apy_history.append(OpportunityFinder.DEPLOY_PROTOCOL, day * 86400, 18.0 - day % 5)
+    portfolios = generate_portfolios(200, as_dicts=True)
+    assert _close(_single(agent, portfolios), _batch(agent, portfolios))
+
+
+def test_analyze_all_keeps_input_order():
+    portfolios = generate_portfolios(50)
+    results = PortfolioBatch.analyze_all(portfolios)
+    assert [r["total_value"] for r in results] == [p.total_value_usd for p in portfolios]
+
+
+def test_empty_batch():
+    assert PortfolioBatch.analyze_all([]) == []
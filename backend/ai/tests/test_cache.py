@@ -0,0 +1,102 @@
+"""Tests for the bounded in-process LRUCache"""
+
+import pytest
+
+from backend.ai import cache as cache_module
+from backend.ai.cache import LRUCache, approximate_size
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for TTL tests"""
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_get_returns_default_on_miss():
+    lru = LRUCache(max_entries=4)
+    assert lru.get("missing", "fallback") == "fallback"
+    assert lru.stats()["misses"] == 1
+
+
+def test_entry_expires_after_ttl(clock):
+    lru = LRUCache(max_entries=4, ttl=10)
+    lru.set("a", 1)
+    clock[0] += 9.9
+    assert lru.get("a") == 1
+    clock[0] += 0.1
+    assert lru.get("a") is None
+    stats = lru.stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+    assert stats["bytes"] == 0
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    lru = LRUCache(max_entries=4, ttl=10)
+    lru.set("short", 1, ttl=1)
+    lru.set("long", 2)
+    clock[0] += 5
+    assert lru.get("short") is None
+    assert lru.get("long") == 2
+
+
+def test_no_ttl_never_expires(clock):
+    lru = LRUCache(max_entries=4)
+    lru.set("a", 1)
+    clock[0] += 10 ** 9
+    assert lru.get("a") == 1
+
+
+def test_evicts_least_recently_used_over_max_entries():
+    lru = LRUCache(max_entries=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_byte_budget_evicts_oldest_entries():
+    value = "x" * 100
+    size = approximate_size(value)
+    lru = LRUCache(max_entries=100, max_bytes=size * 2)
+    lru.set("a", value)
+    lru.set("b", value)
+    lru.set("c", value)
+    assert lru.get("a") is None
+    assert lru.get("b") == value
+    assert lru.get("c") == value
+    assert lru.stats()["bytes"] == size * 2
+    assert lru.stats()["evictions"] == 1
+
+
+def test_oversize_value_is_rejected_without_evicting():
+    small = "x" * 10
+    lru = LRUCache(max_entries=100, max_bytes=approximate_size(small) * 3)
+    lru.set("small", small)
+    lru.set("huge", "y" * 10_000)
+    assert lru.get("huge") is None
+    assert lru.get("small") == small
+    assert lru.stats()["evictions"] == 1
+    assert lru.stats()["bytes"] == approximate_size(small)
+
+
+def test_oversize_overwrite_drops_previous_value():
+    lru = LRUCache(max_entries=100, max_bytes=approximate_size("x" * 10) * 3)
+    lru.set("k", "x" * 10)
+    lru.set("k", "y" * 10_000)
+    assert lru.get("k") is None
+    assert lru.stats()["bytes"] == 0
+
+
+def test_overwrite_replaces_size_accounting():
+    lru = LRUCache(max_entries=4)
+    lru.set("k", "x" * 10)
+    lru.set("k", "x" * 1000)
+    assert lru.stats()["entries"] == 1
+    assert lru.stats()["bytes"] == approximate_size("x" * 1000)
@@ -0,0 +1,146 @@
+"""Tests for the provider CircuitBreaker state machine"""
+
+import pytest
+
+from backend.ai import providers
+from backend.ai.providers import CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for cooldown tests"""
+    now = [1000.0]
+    monkeypatch.setattr(providers.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _breaker(**overrides):
+    settings = dict(window=10, min_calls=4, error_rate=0.5, slow_call=5.0,
+                    slow_rate=0.75, cooldown=10.0, max_cooldown=30.0)
+    settings.update(overrides)
+    return CircuitBreaker(**settings)
+
+
+def _call(breaker, failed=False, elapsed=0.1):
+    generation = breaker.allow()
+    assert generation is not None
+    breaker.record(generation, failed, elapsed)
+
+
+def _trip(breaker):
+    for _ in range(breaker.min_calls):
+        _call(breaker, failed=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        _call(breaker, failed=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_opens_at_error_rate(clock):
+    breaker = _breaker()
+    _call(breaker)
+    _call(breaker)
+    _call(breaker, failed=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    _call(breaker, failed=True)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats["opened"] == 1
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        _call(breaker, elapsed=6.0)
+    _call(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_rejects_until_cooldown(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock[0] += 9.9
+    assert breaker.allow() is None
+    assert breaker.stats["rejected"] == 1
+    clock[0] += 0.1
+    assert breaker.allow() is not None
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_half_open_admits_a_single_probe(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock[0] += 10
+    probe = breaker.allow()
+    assert breaker.is_probe(probe)
+    assert breaker.allow() is None
+
+
+def test_successful_probe_closes(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock[0] += 10
+    breaker.record(breaker.allow(), False, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.cooldown == 10.0
+    # Closed with a fresh window
+    for _ in range(3):
+        _call(breaker, failed=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_with_doubled_cooldown(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    for expected in (20.0, 30.0, 30.0):
+        clock[0] += breaker.cooldown
+        breaker.record(breaker.allow(), True, 0.1)
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.cooldown == expected
+
+
+def test_slow_probe_reopens(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock[0] += 10
+    breaker.record(breaker.allow(), False, 6.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_released_probe_frees_the_slot(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock[0] += 10
+    breaker.release(breaker.allow())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() is not None
+
+
+def test_stale_results_are_ignored(clock):
+    breaker = _breaker()
+    in_flight = breaker.allow()
+    _trip(breaker)
+    clock[0] += 10
+    probe = breaker.allow()
+    # A call admitted while closed can't stand in for the probe
+    breaker.record(in_flight, False, 0.1)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.is_probe(in_flight)
+    breaker.release(in_flight)
+    assert breaker.allow() is None
+    breaker.record(probe, False, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_stale_failures_do_not_reopen(clock):
+    breaker = _breaker()
+    in_flight = [breaker.allow() for _ in range(4)]
+    _trip(breaker)
+    clock[0] += 10
+    breaker.record(breaker.allow(), False, 0.1)
+    for generation in in_flight:
+        breaker.record(generation, True, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
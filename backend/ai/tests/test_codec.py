@@ -0,0 +1,140 @@
+"""Tests for the binary cache codec"""
+
+import json
+import random
+
+import pytest
+
+from backend.ai import codec
+from backend.ai.agent import Portfolio, RiskLevel, StrategyType, YieldStrategy
+from backend.ai.benchmarks.synthetic import generate_portfolios
+from backend.ai.codec import CodecError, decode, encode
+
+
+def _strategies():
+    return [
+        YieldStrategy(
+            id=f"strategy-{i}",
+            name="ETH Perpetual Basis Trade",
+            type=kind,
+            protocol="GMX",
+            chain="Arbitrum",
+            expected_apy=15.25 + i,
+            risk_level=risk,
+            minimum_investment=1000.0,
+            gas_cost_usd=12.5,
+            il_exposure=0.0,
+            steps=["Deposit ETH", "Short ETH perp"],
+            required_tokens=["ETH", "USDC"],
+            exit_options=[],
+            confidence_score=0.85
+        )
+        for i, (kind, risk) in enumerate(zip(StrategyType, RiskLevel))
+    ]
+
+
+def _dict_portfolio():
+    return Portfolio(
+        address="0xabc",
+        total_value_usd=25000.5,
+        positions=[
+            {"id": "p1", "protocol": "Aave V3", "value_usd": 1000.0, "apy": 4.2},
+            {"id": "p2", "protocol": "Aave V3", "value_usd": 2500.0, "apy": 3.9},
+            {"id": "p3", "protocol": None, "value_usd": 10, "active": True},
+            {"id": "p4", "active": False, "big": 2 ** 60, "meta": {"tokens": ["ETH"]}},
+            {},
+        ],
+        chains=["Ethereum", "Arbitrum"],
+        risk_tolerance=RiskLevel.MEDIUM,
+        preferred_protocols=["Aave V3"]
+    )
+
+
+def _table_portfolio():
+    portfolio = generate_portfolios(3, seed=7)[1]
+    assert len(portfolio.positions) > 0
+    return portfolio
+
+
+def _payloads():
+    return [
+        encode(_strategies()),
+        encode(_dict_portfolio()),
+        encode(_table_portfolio()),
+        encode({"analysis": "text", "score": 1.5}),
+    ]
+
+
+def test_strategies_round_trip():
+    strategies = _strategies()
+    assert decode(encode(strategies)) == strategies
+
+
+def test_dict_portfolio_round_trip_keeps_value_types():
+    portfolio = _dict_portfolio()
+    decoded = decode(encode(portfolio))
+    assert decoded == portfolio
+    for original, restored in zip(portfolio.positions, decoded.positions):
+        assert list(restored) == list(original)
+        assert [type(v) for v in restored.values()] == [type(v) for v in original.values()]
+
+
+def test_table_portfolio_round_trip():
+    portfolio = _table_portfolio()
+    decoded = decode(encode(portfolio))
+    assert decoded == portfolio
+    assert type(decoded.positions) is type(portfolio.positions)
+
+
+def test_empty_positions_round_trip():
+    portfolio = _dict_portfolio()
+    portfolio.positions = []
+    assert decode(encode(portfolio)) == portfolio
+
+
+def test_json_values_round_trip():
+    value = {"analysis": "text", "score": 1.5, "items": [1, 2]}
+    assert decode(encode(value)) == value
+
+
+def test_plain_json_still_decodes():
+    value = {"legacy": True}
+    assert decode(json.dumps(value)) == value
+    assert decode(json.dumps(value).encode("utf-8")) == value
+
+
+def test_other_versions_are_rejected():
+    payload = bytearray(encode(_strategies()))
+    payload[len(codec.MAGIC)] = codec.VERSION - 1
+    with pytest.raises(CodecError):
+        decode(bytes(payload))
+
+
+def test_unknown_kind_is_rejected():
+    payload = bytearray(encode(_strategies()))
+    payload[len(codec.MAGIC) + 1] = ord("Z")
+    with pytest.raises(CodecError):
+        decode(bytes(payload))
+
+
+@pytest.mark.parametrize("index", range(4))
+def test_truncated_payloads_raise_value_error(index):
+    payload = _payloads()[index]
+    for length in range(len(payload)):
+        with pytest.raises(ValueError):
+            decode(payload[:length])
+
+
+@pytest.mark.parametrize("index", range(3))
+def test_corrupt_payloads_decode_or_raise_value_error(index):
+    payload = _payloads()[index]
+    rng = random.Random(index)
+    for _ in range(500):
+        corrupt = bytearray(payload)
+        for _ in range(rng.randint(1, 4)):
+            # Keep the prefix so the binary decoder is exercised
+            corrupt[rng.randrange(codec._PREFIX_LEN, len(corrupt))] = rng.randrange(256)
+        try:
+            decode(bytes(corrupt))
+        except ValueError:
+            pass
@@ -0,0 +1,146 @@
+"""Tests for IncrementalMonitor transitions, hysteresis and snapshots"""
+
+import json
+
+import pytest
+
+from backend.ai.monitor import IncrementalMonitor, MonitorRule, RuleTable
+from backend.ai.positions import PositionTable
+
+
+def _position(position_id="p1", **values):
+    position = {"id": position_id, "current_apy": 10.0, "il_percentage": 0.0}
+    position.update(values)
+    return position
+
+
+def _transitions(events):
+    return [(e["type"], e["position_id"], e["transition"]) for e in events]
+
+
+@pytest.fixture
+def monitor():
+    return IncrementalMonitor(hysteresis={"HIGH_IL": 0.5, "LOW_APY": 0.5, "LIQUIDATION_RISK": 0.1})
+
+
+def test_healthy_positions_emit_nothing(monitor):
+    assert monitor.update([_position()]) == []
+    assert monitor.active_alerts() == []
+
+
+def test_raise_is_emitted_once(monitor):
+    events = monitor.update([_position(il_percentage=6.0)])
+    assert _transitions(events) == [("HIGH_IL", "p1", "raised")]
+    assert monitor.update([_position(il_percentage=7.0)]) == []
+    assert len(monitor.active_alerts()) == 1
+
+
+def test_value_inside_band_does_not_clear(monitor):
+    monitor.update([_position(il_percentage=5.2)])
+    # Back under the 5.0 threshold, but not past 5.0 - 0.5
+    assert monitor.update([_position(il_percentage=4.8)]) == []
+    assert monitor.update([_position(il_percentage=5.1)]) == []
+    events = monitor.update([_position(il_percentage=4.4)])
+    assert _transitions(events) == [("HIGH_IL", "p1", "cleared")]
+    assert monitor.active_alerts() == []
+
+
+def test_band_applies_above_less_than_thresholds(monitor):
+    monitor.update([_position(current_apy=4.9)])
+    assert monitor.update([_position(current_apy=5.3)]) == []
+    events = monitor.update([_position(current_apy=5.6)])
+    assert _transitions(events) == [("LOW_APY", "p1", "cleared")]
+
+
+def test_zero_hysteresis_clears_at_threshold():
+    monitor = IncrementalMonitor(hysteresis={})
+    monitor.update([_position(il_percentage=5.2)])
+    events = monitor.update([_position(il_percentage=5.0)])
+    assert _transitions(events) == [("HIGH_IL", "p1", "cleared")]
+
+
+def test_removed_positions_clear_their_alerts(monitor):
+    monitor.update([
+        _position("p1", il_percentage=6.0, health_factor=1.2),
+        _position("p2", current_apy=1.0),
+    ])
+    events = monitor.update(removed=["p1", "unknown"])
+    assert sorted(_transitions(events)) == [
+        ("HIGH_IL", "p1", "cleared"),
+        ("LIQUIDATION_RISK", "p1", "cleared"),
+    ]
+    assert [a["position_id"] for a in monitor.active_alerts()] == ["p2"]
+
+
+def test_only_changed_positions_are_checked(monitor):
+    monitor.update([_position("p1", il_percentage=6.0), _position("p2")])
+    events = monitor.update([_position("p2", il_percentage=8.0)])
+    assert _transitions(events) == [("HIGH_IL", "p2", "raised")]
+    assert {a["position_id"] for a in monitor.active_alerts()} == {"p1", "p2"}
+
+
+def test_table_and_dict_updates_agree(monitor):
+    positions = [
+        _position("p1", il_percentage=6.0),
+        _position("p2", current_apy=2.0, health_factor=1.1),
+        _position("p3"),
+    ]
+    other = IncrementalMonitor(hysteresis=monitor.hysteresis)
+    from_dicts = monitor.update(positions)
+    from_table = other.update(PositionTable.from_dicts(positions))
+    assert _transitions(from_dicts) == _transitions(from_table)
+
+
+def test_scoped_rules_override_defaults():
+    rules = RuleTable.from_config([
+        {"alert_type": "HIGH_IL", "column": "il_percentage", "op": ">",
+         "threshold": 10.0, "protocol": "Curve"},
+    ])
+    monitor = IncrementalMonitor(rules)
+    events = monitor.update([
+        _position("curve", protocol="Curve", il_percentage=8.0),
+        _position("other", protocol="Uniswap V3", il_percentage=8.0),
+    ])
+    assert _transitions(events) == [("HIGH_IL", "other", "raised")]
+
+
+def test_disabled_rule_switches_alert_off():
+    rules = RuleTable([
+        MonitorRule("HIGH_IL", "il_percentage", ">", 5.0),
+        MonitorRule("HIGH_IL", "il_percentage", ">", 5.0, chain="Base", enabled=False),
+    ])
+    monitor = IncrementalMonitor(rules)
+    events = monitor.update([
+        _position("base", chain="Base", il_percentage=9.0),
+        _position("eth", chain="Ethereum", il_percentage=9.0),
+    ])
+    assert _transitions(events) == [("HIGH_IL", "eth", "raised")]
+
+
+def test_snapshot_restore_keeps_alert_state(monitor):
+    monitor.update([
+        _position("p1", il_percentage=5.2),
+        _position("p2", current_apy=3.0),
+    ])
+    snapshot = json.loads(json.dumps(monitor.snapshot()))
+
+    restored = IncrementalMonitor(hysteresis=monitor.hysteresis)
+    restored.restore(snapshot)
+    assert restored.active_alerts() == monitor.active_alerts()
+    # Still raised, so inside the band nothing is re-emitted
+    assert restored.update([_position("p1", il_percentage=4.8)]) == []
+    events = restored.update([_position("p1", il_percentage=4.0)])
+    assert _transitions(events) == [("HIGH_IL", "p1", "cleared")]
+
+
+def test_restore_replaces_existing_state(monitor):
+    monitor.update([_position("p1", il_percentage=6.0)])
+    monitor.restore(IncrementalMonitor().snapshot())
+    assert monitor.active_alerts() == []
+
+
+def test_restore_rejects_other_versions(monitor):
+    snapshot = monitor.snapshot()
+    snapshot["version"] = IncrementalMonitor.SNAPSHOT_VERSION + 1
+    with pytest.raises(ValueError):
+        monitor.restore(snapshot)
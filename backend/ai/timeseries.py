@@ -0,0 +1,265 @@
+"""
+Historical APY store for OpusAIAgent
+Append-only, memory-mapped fixed-width record streams, one file per pool or strategy
+"""
+
+import hashlib
+import logging
+import math
+import os
+import re
+import struct
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"AHTS"
+VERSION = 1
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"),  # Unix seconds
+    ("apy", "<f8"),
+    ("tvl_usd", "<f8"),
+])
+
+# magic, version, record size, key length; the key follows, padded to 8 bytes
+_HEADER = struct.Struct("<4sHHI")
+_SUFFIX = ".series"
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]+")
+
+DEFAULT_ROOT = os.path.join(
+    os.path.dirname(__file__), "..", "data", "timeseries"
+)
+
+
+class SeriesStore:
+    """
+    One append-only file of RECORD_DTYPE rows per series key. Appends write
+    a single record at the end of the file; reads map the file and return
+    NumPy views, so windows and statistics never load whole files into RAM.
+    Timestamps must be non-decreasing within a series.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        self._writers: Dict[str, BinaryIO] = {}
+        self._last: Dict[str, int] = {}
+        # key -> (file size when mapped, records view)
+        self._maps: Dict[str, Tuple[int, np.ndarray]] = {}
+
+    def path(self, key: str) -> str:
+        # Readable prefix plus a hash, so distinct keys never share a file
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.root, f"{_UNSAFE.sub('_', key)[:64]}-{digest}{_SUFFIX}")
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def keys(self) -> List[str]:
+        """Series keys, read from the file headers"""
+        if not os.path.isdir(self.root):
+            return []
+        keys = []
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith(_SUFFIX):
+                with open(os.path.join(self.root, name), "rb") as f:
+                    keys.append(self._read_header(f)[0])
+        return keys
+
+    # Writing
+
+    def append(
+        self,
+        key: str,
+        timestamp: int,
+        apy: float,
+        tvl_usd: float = math.nan
+    ):
+        """Append one observation"""
+        last = self._last_timestamp(key)
+        if last is not None and timestamp < last:
+            raise ValueError(f"Out-of-order timestamp for {key}: {timestamp} < {last}")
+        self._writer(key).write(struct.pack("<qdd", timestamp, apy, tvl_usd))
+        self._last[key] = timestamp
+
+    def extend(self, key: str, records: np.ndarray):
+        """Append many observations, e.g. a backfill, as one write"""
+        records = np.asarray(records, dtype=RECORD_DTYPE)
+        if not len(records):
+            return
+        timestamps = records["timestamp"]
+        last = self._last_timestamp(key)
+        if np.any(np.diff(timestamps) < 0) or (last is not None and timestamps[0] < last):
+            raise ValueError(f"Out-of-order timestamps for {key}")
+        self._writer(key).write(records.tobytes())
+        self._last[key] = int(timestamps[-1])
+
+    def flush(self):
+        for writer in self._writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        self._maps.clear()
+
+    def _writer(self, key: str) -> BinaryIO:
+        writer = self._writers.get(key)
+        if writer is None:
+            path = self.path(key)
+            if not os.path.exists(path):
+                os.makedirs(self.root, exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(self._header(key))
+            else:
+                # Drop a record torn by a crash mid-append; appending after it
+                # would misalign every later record
+                with open(path, "rb") as f:
+                    _, offset = self._read_header(f)
+                size = os.path.getsize(path)
+                torn = (size - offset) % RECORD_DTYPE.itemsize
+                if torn:
+                    logger.warning(f"Truncating {torn} byte torn record from {path}")
+                    os.truncate(path, size - torn)
+            writer = self._writers[key] = open(path, "ab")
+        return writer
+
+    def _last_timestamp(self, key: str) -> Optional[int]:
+        if key not in self._last:
+            records = self.series(key)
+            self._last[key] = int(records["timestamp"][-1]) if len(records) else None
+        return self._last[key]
+
+    # Header
+
+    @staticmethod
+    def _header(key: str) -> bytes:
+        encoded = key.encode("utf-8")
+        header = _HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, len(encoded)) + encoded
+        return header + b"\0" * (-len(header) % 8)
+
+    @staticmethod
+    def _read_header(f: BinaryIO) -> Tuple[str, int]:
+        """(key, offset of the first record)"""
+        magic, version, record_size, key_length = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"Not a version {VERSION} series file: {f.name}")
+        key = f.read(key_length).decode("utf-8")
+        header_size = _HEADER.size + key_length
+        return key, header_size + (-header_size % 8)
+
+    # Reading
+
+    def series(self, key: str) -> np.ndarray:
+        """All records of a series as a read-only memory-mapped view"""
+        writer = self._writers.get(key)
+        if writer is not None:
+            writer.flush()
+        path = self.path(key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+
+        with open(path, "rb") as f:
+            _, offset = self._read_header(f)
+        count = (size - offset) // RECORD_DTYPE.itemsize
+        if count == 0:
+            records = np.empty(0, dtype=RECORD_DTYPE)
+        else:
+            # A record torn by a crash mid-append is ignored (and cut off by _writer)
+            records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=offset, shape=(count,))
+        self._maps[key] = (size, records)
+        return records
+
+    def window(
+        self,
+        key: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None
+    ) -> np.ndarray:
+        """Records with start <= timestamp < end, as a zero-copy slice"""
+        records = self.series(key)
+        timestamps = records["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, "left"))
+        hi = len(records) if end is None else int(np.searchsorted(timestamps, end, "left"))
+        return records[lo:hi]
+
+    def last(self, key: str, seconds: int) -> np.ndarray:
+        """Records from the trailing `seconds` of a series"""
+        records = self.series(key)
+        if not len(records):
+            return records
+        return self.window(key, start=int(records["timestamp"][-1]) - seconds)
+
+    # Statistics
+
+    def stats(
+        self,
+        key: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """APY mean, std and max drawdown over a window; None if it is empty"""
+        return apy_stats(self.window(key, start, end)["apy"])
+
+    def trailing_stats(self, key: str, seconds: int) -> Optional[Dict[str, Any]]:
+        """stats() over the trailing `seconds` of a series"""
+        return apy_stats(self.last(key, seconds)["apy"])
+
+    def rolling(
+        self,
+        key: str,
+        size: int,
+        start: Optional[int] = None,
+        end: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """Rolling APY mean, std and drawdown over `size` records"""
+        records = self.window(key, start, end)
+        return {
+            "timestamp": records["timestamp"][size - 1:],
+            **rolling_stats(records["apy"], size),
+        }
+
+
+def apy_stats(apy: np.ndarray) -> Optional[Dict[str, Any]]:
+    if not len(apy):
+        return None
+    return {
+        "count": len(apy),
+        "mean": float(apy.mean()),
+        "std": float(apy.std()),
+        "max_drawdown": max_drawdown(apy),
+    }
+
+
+def max_drawdown(values: np.ndarray) -> float:
+    """Largest peak-to-trough fall, in the values' own units (APY points)"""
+    if not len(values):
+        return 0.0
+    return float((np.maximum.accumulate(values) - values).max())
+
+
+def rolling_stats(values: np.ndarray, size: int) -> Dict[str, np.ndarray]:
+    """Mean, std and drawdown from the window peak for each trailing window"""
+    if len(values) < size:
+        empty = np.empty(0)
+        return {"mean": empty, "std": empty, "drawdown": empty}
+    # Mean and variance from running sums; the peak from a strided view
+    sums = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    squares = np.concatenate([[0.0], np.cumsum(np.square(values, dtype=np.float64))])
+    mean = (sums[size:] - sums[:-size]) / size
+    variance = (squares[size:] - squares[:-size]) / size - mean ** 2
+    windows = np.lib.stride_tricks.sliding_window_view(values, size)
+    return {
+        "mean": mean,
+        "std": np.sqrt(np.maximum(variance, 0.0)),
+        "drawdown": windows.max(axis=-1) - values[size - 1:],
+    }
@@ -1,6 +1,7 @@
 // backend/src/routes/strategy-ai.ts
 import { Router, Request, Response } from 'express';
 import StrategyAIService from '../services/StrategyAIService';
+import { ethers } from 'ethers';
 
 const router = Router();
 const strategyAI = new StrategyAIService();
@@ -11,7 +12,7 @@ const strategyAI = new StrategyAIService();
  */
 router.post('/recommend', async (req: Request, res: Response) => {
   try {
-    const { query, portfolio, riskTolerance = 'medium' } = req.body;
+    const { query, portfolio, riskTolerance = 'medium', walletAddress } = req.body;
 
     if (!query || typeof query !== 'string') {
       return res.status(400).json({
@@ -19,10 +20,17 @@ router.post('/recommend', async (req: Request, res: Response) => {
       });
     }
 
+    if (walletAddress && !ethers.isAddress(walletAddress)) {
+      return res.status(400).json({
+        error: 'Invalid wallet address'
+      });
+    }
+
     const strategy = await strategyAI.getAdvancedStrategy(
       query,
       portfolio,
-      riskTolerance as 'low' | 'medium' | 'high'
+      riskTolerance as 'low' | 'medium' | 'high',
+      walletAddress
     );
 
     res.json({
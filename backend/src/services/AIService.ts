@@ -3,6 +3,7 @@ import OpenAI from 'openai';
 import { prisma } from './PrismaService';
 import PortfolioService from './PortfolioService';
 import { ethers } from 'ethers';
+import { AgentMethod, agentClientFromEnv, toAgentPortfolio } from './AgentSocketClient';
 
 export interface ChatMessage {
   role: 'user' | 'assistant' | 'system';
@@ -47,6 +48,7 @@ export class AIService {
         try {
           const portfolio = await this.portfolioService.getUserPortfolio(walletAddress);
           userContext = this.buildUserContext(portfolio);
+          userContext += await this.getAgentAnalysis(walletAddress, portfolio);
         } catch (error) {
           console.warn('Could not fetch user portfolio:', error);
           userContext = 'User context: Unable to fetch portfolio data.';
@@ -204,6 +206,32 @@ Guidelines:
 - Current positions: ${positionsSummary}`;
   }
 
+  /**
+   * Portfolio analysis from the agent server (AI_SERVER_SOCKET) as extra
+   * context lines; empty if it is not configured or does not answer in time
+   */
+  private async getAgentAnalysis(walletAddress: string, portfolio: any): Promise<string> {
+    const agent = agentClientFromEnv();
+    if (!agent || !portfolio?.positions?.length) {
+      return '';
+    }
+    try {
+      const analysis = await agent.call<any>(AgentMethod.Analyze, {
+        portfolio: toAgentPortfolio(walletAddress, portfolio.positions, 'medium', portfolio.portfolio?.totalValue),
+      });
+      const ideas = (analysis.recommendations || [])
+        .map((r: any) => r.description)
+        .filter(Boolean)
+        .join('; ');
+      return `
+- Risk score: ${analysis.risk_score}/100, diversification: ${analysis.diversification_score}/100
+- Optimization potential: ${Number(analysis.optimization_potential).toFixed(2)}% APY${ideas ? `\n- Agent suggestions: ${ideas}` : ''}`;
+    } catch (error) {
+      console.warn('Agent server unavailable:', (error as Error).message);
+      return '';
+    }
+  }
+
   /**
    * Build pool context for AI
    */
@@ -0,0 +1,179 @@
+// backend/src/services/AgentSocketClient.ts
+import net from 'net';
+
+/**
+ * Client for the resident Python agent server (python -m backend.ai.server).
+ * One persistent connection; requests are pipelined and matched by id.
+ * Frame: u32 body length, u32 request id, u8 method/status (big-endian), JSON body.
+ * Every call has a timeout; pending calls fail as soon as the connection drops,
+ * and the next call reconnects.
+ */
+
+export enum AgentMethod {
+  Ping = 0,
+  Recommend = 1,
+  Analyze = 2,
+  Explain = 3,
+  Monitor = 4,
+  Risk = 5,
+}
+
+const HEADER_BYTES = 9;
+const STATUS_OK = 0;
+const DEFAULT_TIMEOUT_MS = Number(process.env.AI_SERVER_TIMEOUT_MS || 10000);
+
+interface Pending {
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+export interface AgentPosition {
+  protocol?: string;
+  chain?: string;
+  positionType?: string;
+  totalValueUSD?: number;
+  amountUSD?: number;
+  apy?: number;
+  healthFactor?: number;
+}
+
+/** Portfolio params in the shape backend/ai/server.py expects */
+export function toAgentPortfolio(
+  address: string,
+  positions: AgentPosition[],
+  riskTolerance: 'low' | 'medium' | 'high' = 'medium',
+  totalValueUSD?: number,
+  chains?: string[]
+): Record<string, unknown> {
+  const rows = positions.map((p) => ({
+    protocol: p.protocol || '',
+    chain: p.chain || '',
+    type: (p.positionType || '').toLowerCase(),
+    value_usd: Number(p.totalValueUSD ?? p.amountUSD ?? 0),
+    apy: Number(p.apy || 0),
+    // Positions without debt have no health factor; the agent defaults it
+    ...(p.healthFactor != null ? { health_factor: Number(p.healthFactor) } : {}),
+  }));
+  return {
+    address,
+    total_value_usd: totalValueUSD ?? rows.reduce((sum, row) => sum + row.value_usd, 0),
+    positions: rows,
+    // Callers that know the wallet's chains pass them; otherwise use the positions'
+    chains: chains ?? Array.from(new Set(rows.map((row) => row.chain).filter(Boolean))),
+    risk_tolerance: riskTolerance,
+  };
+}
+
+export class AgentSocketClient {
+  private socket: net.Socket | null = null;
+  private buffer: Buffer = Buffer.alloc(0);
+  private nextId = 0;
+  private pending = new Map<number, Pending>();
+
+  constructor(
+    private address: string = process.env.AI_SERVER_SOCKET || '/tmp/apyhub-ai.sock',
+    private timeoutMs: number = DEFAULT_TIMEOUT_MS
+  ) {}
+
+  call<T = any>(
+    method: AgentMethod,
+    params: Record<string, unknown> = {},
+    timeoutMs: number = this.timeoutMs
+  ): Promise<T> {
+    const socket = this.connect();
+    this.nextId = (this.nextId + 1) >>> 0;
+    const id = this.nextId;
+    const body = Buffer.from(JSON.stringify(params), 'utf8');
+    const header = Buffer.alloc(HEADER_BYTES);
+    header.writeUInt32BE(body.length, 0);
+    header.writeUInt32BE(id, 4);
+    header.writeUInt8(method, 8);
+    return new Promise<T>((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Agent server call ${AgentMethod[method]} timed out after ${timeoutMs}ms`));
+      }, timeoutMs);
+      this.pending.set(id, { resolve, reject, timer });
+      socket.write(Buffer.concat([header, body]));
+    });
+  }
+
+  close() {
+    this.socket?.end();
+    this.socket = null;
+  }
+
+  private connect(): net.Socket {
+    if (this.socket) {
+      return this.socket;
+    }
+    const [host, port] = this.address.includes(':') ? this.address.split(':') : [];
+    const socket = port ? net.connect(Number(port), host) : net.connect(this.address);
+    // Events from a socket that was already replaced must not touch the new one
+    socket.on('data', (chunk: Buffer) => this.socket === socket && this.onData(chunk));
+    socket.on('error', (error: Error) => this.socket === socket && this.fail(error));
+    socket.on('close', () => this.socket === socket && this.fail(new Error('Agent server connection closed')));
+    this.socket = socket;
+    return socket;
+  }
+
+  private onData(chunk: Buffer) {
+    this.buffer = Buffer.concat([this.buffer, chunk]);
+    while (this.buffer.length >= HEADER_BYTES) {
+      const length = this.buffer.readUInt32BE(0);
+      if (this.buffer.length < HEADER_BYTES + length) {
+        return;
+      }
+      const id = this.buffer.readUInt32BE(4);
+      const status = this.buffer.readUInt8(8);
+      let body: any;
+      try {
+        body = JSON.parse(this.buffer.subarray(HEADER_BYTES, HEADER_BYTES + length).toString('utf8'));
+      } catch (error) {
+        // Framing is lost; drop the connection rather than misread later frames
+        this.fail(new Error(`Malformed agent server frame: ${(error as Error).message}`));
+        return;
+      }
+      this.buffer = this.buffer.subarray(HEADER_BYTES + length);
+
+      const pending = this.pending.get(id);
+      this.pending.delete(id);
+      if (!pending) {
+        continue;
+      }
+      clearTimeout(pending.timer);
+      if (status === STATUS_OK) {
+        pending.resolve(body);
+      } else {
+        pending.reject(new Error(body.error));
+      }
+    }
+  }
+
+  private fail(error: Error) {
+    this.socket?.destroy();
+    this.socket = null;
+    this.buffer = Buffer.alloc(0);
+    for (const pending of this.pending.values()) {
+      clearTimeout(pending.timer);
+      pending.reject(error);
+    }
+    this.pending.clear();
+  }
+}
+
+let shared: AgentSocketClient | null | undefined;
+
+/**
+ * Shared client when AI_SERVER_SOCKET is configured, else null so callers keep
+ * their in-process behaviour
+ */
+export function agentClientFromEnv(): AgentSocketClient | null {
+  if (shared === undefined) {
+    shared = process.env.AI_SERVER_SOCKET ? new AgentSocketClient(process.env.AI_SERVER_SOCKET) : null;
+  }
+  return shared;
+}
+
+export default AgentSocketClient;
@@ -1,6 +1,7 @@
 // backend/src/services/StrategyAIService.ts
 import OpenAI from 'openai';
 import RAGService from './RAGService';
+import { AgentMethod, agentClientFromEnv, toAgentPortfolio } from './AgentSocketClient';
 import { ethers } from 'ethers';
 
 interface ChatMessage {
@@ -70,7 +71,8 @@ export class StrategyAIService {
   async getAdvancedStrategy(
     query: string,
     portfolio?: UserPortfolio,
-    riskTolerance: 'low' | 'medium' | 'high' = 'medium'
+    riskTolerance: 'low' | 'medium' | 'high' = 'medium',
+    walletAddress?: string
   ): Promise<StrategyResponse> {
     await this.initialize();
 
@@ -82,12 +84,18 @@ export class StrategyAIService {
       const userContext = this.buildUserContext(portfolio, riskTolerance);
       
       // Get recommendation from RAG
-      const recommendation = await this.ragService.getStrategyRecommendation(query, {
+      const recommendation: any = await this.ragService.getStrategyRecommendation(query, {
         asset: this.detectAsset(query),
         riskTolerance,
         capital: portfolio?.totalValue || 5000
       });
 
+      // Ranked strategies from the resident Python agent, when it is running
+      const agentStrategies = await this.getAgentStrategies(walletAddress, portfolio, riskTolerance);
+      if (agentStrategies.length > 0) {
+        recommendation.agentStrategies = agentStrategies;
+      }
+
       // If OpenAI available, enhance strategy with GPT
       if (this.openai) {
         return await this.enhanceWithGPT(
@@ -200,10 +208,54 @@ Format as JSON with: strategy, reasoning, expectedAPY, riskLevel, protocols, ste
     }
   }
 
+  /**
+   * Top strategies from the agent server (AI_SERVER_SOCKET); empty if it is
+   * not configured, does not answer in time, or there is no wallet address
+   * (the agent caches recommendations per wallet)
+   */
+  private async getAgentStrategies(
+    walletAddress: string | undefined,
+    portfolio: UserPortfolio | undefined,
+    riskTolerance: 'low' | 'medium' | 'high'
+  ): Promise<any[]> {
+    const agent = agentClientFromEnv();
+    if (!agent || !walletAddress) return [];
+    try {
+      const params = toAgentPortfolio(
+        walletAddress,
+        (portfolio?.positions || []).map(p => ({ protocol: p.protocol, amountUSD: p.amount, apy: p.apy })),
+        riskTolerance,
+        portfolio?.totalValue || 5000,
+        portfolio?.chains
+      );
+      const strategies = await agent.call<any[]>(AgentMethod.Recommend, { portfolio: params });
+      return strategies.slice(0, 3);
+    } catch (error) {
+      console.warn('Agent server unavailable, using RAG only:', (error as Error).message);
+      return [];
+    }
+  }
+
   /**
    * Build strategy from RAG
    */
   private buildStrategyFromRAG(recommendation: any): StrategyResponse {
+    const [top, ...others] = recommendation.agentStrategies || [];
+    if (top) {
+      return {
+        strategy: top.name,
+        reasoning: recommendation.reasoning,
+        expectedAPY: `${top.expected_apy}%`,
+        riskLevel: top.risk_level.charAt(0).toUpperCase() + top.risk_level.slice(1),
+        protocols: [top.protocol],
+        steps: top.steps,
+        warnings: [
+          `Minimum investment $${top.minimum_investment}`,
+          ...(top.exit_options || []).map((option: string) => `Exit route: ${option}`)
+        ],
+        alternatives: others.map((s: any) => s.name)
+      };
+    }
     return {
       strategy: recommendation.strategies[0] || 'Multi-Protocol Yield Strategy',
       reasoning: recommendation.reasoning,